@@ -1,43 +1,426 @@
-import yaml
 import os
+import re
+import json
+import hashlib
+import functools
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+from config import USER_CACHE_DIR_NAME
+from log_lib import SEVERITY_SUBTYPES
+
+config_path = os.path.join(os.path.dirname(__file__), "log_conf.yml")
+# Bumped whenever the cached form of log_conf.yml or the pattern analysis change, caches of another version are rebuilt
+LOG_CONFIG_CACHE_VERSION = 6
+
+##############################################################################
+# Compile the patterns of each log type into a single matching engine
+##############################################################################
+
+# Width of the glog line header before the thread id: "I0521 02:11:58.123456 "
+GLOG_HEADER_LENGTH = 22
+
+class PatternSet:
+    """
+    Compiled form of a {name: regex} mapping that is matched against log lines in a single scan.
+    All patterns are joined into one alternation, so a line that matches nothing (the common case)
+    is rejected by one regex search no matter how many patterns there are. Only the lines that hit
+    are checked against each pattern to report which of them matched.
+    When every pattern has a required literal (see getRequiredLiteral), a substring check for those
+    literals runs in front of the regexes, and only the patterns whose literal is in the line are run.
+    Patterns can be scoped to the source files that log them. The file:line token of a glog line is then
+    read once, and a lookup by its source file picks the patterns to run on the line: those of that source
+    file and the unscoped ones.
+    Args:
+        patterns (dict): Message name -> regex pattern.
+        flags (int): Flags used to compile the patterns. Defaults to re.IGNORECASE.
+        binary (bool): Compile the patterns as bytes regexes, to match undecoded lines. Case folding
+            is then ASCII only. Defaults to False.
+        sources (dict): Message name -> source file names (e.g. ["consensus_peers.cc"]) the pattern only
+            matches lines of. Patterns without any match lines of every source, or none. Defaults to None.
+        analysis (dict): Regex pattern -> analyzePattern(pattern, flags), from an earlier analysis of the patterns
+            with the same flags, so that they are not parsed again. Defaults to None.
+    Raises:
+        re.error: If any of the patterns is not a valid regex.
+    """
+    def __init__(self, patterns, flags=re.IGNORECASE, binary=False, sources=None, analysis=None):
+        self.names = list(patterns.keys())
+        self.patterns = [patterns[name] for name in self.names]
+        self.binary = binary
+        self.newline = b"\n" if binary else "\n"
+        encode = (lambda text: text.encode("utf-8")) if binary else (lambda text: text)
+        self.regexes = [re.compile(encode(pattern), flags) for pattern in self.patterns]
+        analysis = analysis or {}
+        analyses = [analysis.get(pattern) or self.analyzePattern(pattern, flags) for pattern in self.patterns]
+        self.combined = None
+        # Back references are numbered, so they break once the pattern is embedded in the alternation
+        if self.patterns and not any(re.search(r"\\\d|\(\?P=", pattern) for pattern in self.patterns):
+            try:
+                self.combined = re.compile(encode("|".join(branches for literal, branches in analyses)), flags & ~re.IGNORECASE)
+            except re.error:
+                self.combined = None
+        # Map each required literal to the patterns that contain it, for the substring prefilter
+        self.foldCase = bool(flags & re.IGNORECASE)
+        self.literals = {}
+        for i, (literal, branches) in enumerate(analyses):
+            if literal is None:
+                self.literals = None
+                break
+            literal = encode(literal)
+            literal = literal.lower() if self.foldCase else literal
+            self.literals[literal] = self.literals.get(literal, ()) + (i,)
+        if self.literals is not None:
+            self.literals = tuple(self.literals.items())
+        self.blockRegexes = None
+        # The ids of the patterns to run on the lines of each source file, None when no pattern is scoped
+        self.sourceIds = None
+        self.unscopedIds = frozenset()
+        sources = {name: files for name, files in (sources or {}).items() if name in patterns and files}
+        if sources:
+            self.sourceEnd, self.space, self.colon = (b"] ", b" ", b":") if binary else ("] ", " ", ":")
+            self.unscopedIds = frozenset(i for i, name in enumerate(self.names) if name not in sources)
+            sourceIds = {}
+            for i, name in enumerate(self.names):
+                for sourceFile in sources.get(name, ()):
+                    sourceIds.setdefault(encode(sourceFile), set(self.unscopedIds)).add(i)
+            self.sourceIds = {sourceFile: frozenset(ids) for sourceFile, ids in sourceIds.items()}
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def analyzePattern(pattern, flags=re.IGNORECASE):
+        """
+        Returns the (required literal, alternation branches) of a pattern, see getRequiredLiteral and getBranches.
+        Both are plain strings (the literal can be None), so the analysis can be cached with the configuration.
+        """
+        return PatternSet.getRequiredLiteral(pattern), PatternSet.getBranches(pattern, flags)
+
+    @staticmethod
+    def getBranches(pattern, flags):
+        """
+        Returns the pattern as alternation branches that start with a case-sensitive literal.
+        The regex engine skips positions that cannot start any branch and tests the first literal
+        of a branch before entering it, which is what keeps the combined alternation fast. Both
+        optimizations are lost with re.IGNORECASE, so the first letter is spelled out in both cases
+        and the rest of the pattern is matched case-insensitively through a scoped flag.
+        """
+        if not flags & re.IGNORECASE:
+            return "(?:%s)" % pattern
+        items = list(sre_parse.parse(pattern))
+        # sre_parse factors the common prefix out of a top-level alternation, so its first literal
+        # does not start every branch of the pattern text
+        if (items and items[0][0] == sre_parse.LITERAL and pattern[0] == chr(items[0][1]) and pattern[1:2] not in ("*", "+", "?", "{")
+                and not PatternSet.hasTopLevelBranch(pattern)):
+            first = pattern[0]
+            return "|".join("%s(?i:%s)" % (char, pattern[1:]) for char in sorted({first.lower(), first.upper()}))
+        return "(?i:%s)" % pattern
+
+    @staticmethod
+    def hasTopLevelBranch(pattern):
+        """
+        Returns True if the pattern is an alternation at the top level, e.g. "Table foo|Table bar",
+        and False if every "|" is escaped, in a character class or inside a group.
+        """
+        depth = 0
+        i = 0
+        while i < len(pattern):
+            char = pattern[i]
+            if char == "\\":
+                i += 1
+            elif char == "[":
+                # A "]" right after the opening "[" or "[^" is a literal
+                i += 2 if pattern[i + 1:i + 2] == "^" else 1
+                if pattern[i:i + 1] == "]":
+                    i += 1
+                while i < len(pattern) and pattern[i] != "]":
+                    i += 2 if pattern[i] == "\\" else 1
+            elif char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+            elif char == "|" and depth == 0:
+                return True
+            i += 1
+        return False
+
+    @staticmethod
+    def getRequiredLiteral(pattern, minLength=3):
+        """
+        Returns the longest run of literal characters that every match of the pattern must contain,
+        e.g. "dropped due to backpressure" for "UpdateConsensus request.*dropped due to backpressure".
+        Returns None if the pattern has no such run of at least minLength characters, for example
+        when it is an alternation at the top level.
+        """
+        try:
+            items = sre_parse.parse(pattern)
+        except re.error:
+            return None
+        # Groups are required as a whole and are read inline, anything else (repeats, branches, classes) ends the run
+        def flatten(items):
+            for op, av in items:
+                if op == sre_parse.SUBPATTERN:
+                    yield from flatten(av[-1])
+                else:
+                    yield op, av
+        runs = [""]
+        for op, av in flatten(items):
+            if op == sre_parse.LITERAL:
+                runs[-1] += chr(av)
+            else:
+                runs.append("")
+        literal = max(runs, key=len)
+        return literal if len(literal) >= minLength else None
+
+    def findLines(self, text):
+        """
+        Returns the start offsets of the lines in a multi-line buffer that may match one of the patterns.
+        The buffer is searched as a whole (substring search for the required literals, or the combined
+        regex with re.MULTILINE so ^ and $ keep their per-line meaning), so the loop over lines never
+        runs in Python. Every returned line must still be confirmed with matchLine.
+        """
+        lineStarts = set()
+        if self.literals is not None:
+            foldedText = text.lower() if self.foldCase else text
+            # Lowercasing a few non-ASCII characters changes the length and with it the offsets
+            if len(foldedText) == len(text):
+                for literal, ids in self.literals:
+                    position = foldedText.find(literal)
+                    while position != -1:
+                        lineStarts.add(text.rfind(self.newline, 0, position) + 1)
+                        lineEnd = text.find(self.newline, position)
+                        position = foldedText.find(literal, lineEnd + 1) if lineEnd != -1 else -1
+                return sorted(lineStarts)
+        if self.blockRegexes is None:
+            regexes = [self.combined] if self.combined is not None else self.regexes
+            self.blockRegexes = [re.compile(regex.pattern, regex.flags | re.MULTILINE) for regex in regexes]
+        for regex in self.blockRegexes:
+            match = regex.search(text)
+            while match:
+                lineStart = text.rfind(self.newline, 0, match.start()) + 1
+                lineStarts.add(lineStart)
+                # Continue after the line the match started on, a match may run past a newline (e.g. \s+)
+                lineEnd = text.find(self.newline, lineStart)
+                match = regex.search(text, lineEnd + 1) if lineEnd != -1 else None
+        return sorted(lineStarts)
+
+    def getLineSource(self, line):
+        """
+        Returns the source file of a glog line, e.g. "consensus_peers.cc" for
+        "W0521 02:11:58.123456  3601 consensus_peers.cc:123] ...", or None if the line has no file:line token.
+        The header before the thread id has a fixed width, the token is the last field before "] ".
+        """
+        end = line.find(self.sourceEnd, GLOG_HEADER_LENGTH)
+        if end == -1:
+            return None
+        start = line.rfind(self.space, GLOG_HEADER_LENGTH - 1, end) + 1
+        colon = line.rfind(self.colon, start, end)
+        return line[start:colon] if start and colon != -1 else None
+
+    def matchLine(self, line):
+        """
+        Returns the ids (indexes into self.names) of every pattern that matches the line, in pattern order.
+        """
+        allowedIds = None
+        if self.sourceIds is not None:
+            allowedIds = self.sourceIds.get(self.getLineSource(line), self.unscopedIds)
+            if not allowedIds:
+                return []
+        if self.literals is not None:
+            foldedLine = line.lower() if self.foldCase else line
+            candidates = [ids for literal, ids in self.literals if literal in foldedLine]
+            if not candidates:
+                return []
+            return sorted(i for ids in candidates for i in ids if (allowedIds is None or i in allowedIds) and self.regexes[i].search(line))
+        if self.combined is not None and self.combined.search(line) is None:
+            return []
+        return [i for i, regex in enumerate(self.regexes) if (allowedIds is None or i in allowedIds) and regex.search(line)]
 
 ##############################################################################
 # Read log_conf.yml and parse into patterns/solutions for universe & pg
 ##############################################################################
-config_path = os.path.join(os.path.dirname(__file__), "log_conf.yml")
-with open(config_path, "r") as f:
-	config = yaml.safe_load(f)
-
-universe_config = config["universe"]["log_messages"]
-pg_config = config["pg"]["log_messages"]
-
-universe_regex_patterns = {}
-universe_solutions = {}
-for msg_dict in universe_config:
-    name = msg_dict["name"]
-    pattern = msg_dict["pattern"]
-    solution = msg_dict["solution"]
-    universe_regex_patterns[name] = pattern
-    universe_solutions[name] = solution
-
-pg_regex_patterns = {}
-pg_solutions = {}
-for msg_dict in pg_config:
-    name = msg_dict["name"]
-    pattern = msg_dict["pattern"]
-    solution = msg_dict["solution"]
-    pg_regex_patterns[name] = pattern
-    pg_solutions[name] = solution
-
-# Merge them for easy usage in log_analyzer
-solutions = {**universe_solutions, **pg_solutions}
+
+# Processes a message can be scoped to with "processes", and those the messages of each section apply to by default
+PROCESSES = ("master", "tserver", "postgres", "controller")
+SECTION_PROCESSES = {"universe": ("master", "tserver"), "pg": ("postgres",)}
+
+def parseVersion(version):
+    """
+    Returns a YugabyteDB version such as "2.18.0.1" as a tuple of integers, for comparing versions, or None for None.
+    Raises:
+        ValueError: If the version is not made of integers separated by dots.
+    """
+    if version is None:
+        return None
+    return tuple(int(part) for part in str(version).split("."))
+
+class LogConfig:
+    """
+    The log messages of log_conf.yml: the patterns and solutions of the universe and pg logs, and their pattern sets.
+    Each message can be scoped to some processes ("processes", the processes of its section by default) and to a
+    range of YugabyteDB versions ("min_version" and "max_version", inclusive, "2.20" covers every 2.20.x.y). The
+    pattern set of each process, with only the messages in its scope, is compiled up front (see getPatterns).
+    Messages can also list the source files that log them ("sources"), see PatternSet.
+    Args:
+        config (dict): The parsed log_conf.yml.
+        analysis (dict): Regex pattern -> PatternSet.analyzePattern of the patterns, as cached by loadLogConfig.
+            The patterns missing from it are analyzed. Defaults to None.
+    Raises:
+        ValueError: If a message has an invalid severity, process or version.
+    """
+    def __init__(self, config, analysis=None):
+        self.universe_regex_patterns = {}
+        self.universe_solutions = {}
+        # Minimum severity of the lines each message is logged at, "I" unless given
+        self.universe_severities = {}
+        # {message: (processes, min version, max version)}
+        self.scopes = {}
+        # {message: source files}, for the messages scoped to source files
+        self.sources = {}
+        for msg_dict in config["universe"]["log_messages"]:
+            self.universe_regex_patterns[msg_dict["name"]] = msg_dict["pattern"]
+            self.universe_solutions[msg_dict["name"]] = msg_dict["solution"]
+            self.universe_severities[msg_dict["name"]] = msg_dict.get("severity", "I")
+            if self.universe_severities[msg_dict["name"]] not in SEVERITY_SUBTYPES:
+                raise ValueError("Invalid severity {} of message {}, expected one of {}".format(msg_dict["severity"], msg_dict["name"], ", ".join(SEVERITY_SUBTYPES)))
+            self.scopes[msg_dict["name"]] = self.getScope(msg_dict, "universe")
+            if msg_dict.get("sources"):
+                self.sources[msg_dict["name"]] = tuple(msg_dict["sources"])
+        self.pg_regex_patterns = {}
+        self.pg_solutions = {}
+        for msg_dict in config["pg"]["log_messages"]:
+            self.pg_regex_patterns[msg_dict["name"]] = msg_dict["pattern"]
+            self.pg_solutions[msg_dict["name"]] = msg_dict["solution"]
+            self.scopes[msg_dict["name"]] = self.getScope(msg_dict, "pg")
+            if msg_dict.get("sources"):
+                self.sources[msg_dict["name"]] = tuple(msg_dict["sources"])
+        # Merge them for easy usage in log_analyzer
+        self.solutions = {**self.universe_solutions, **self.pg_solutions}
+        self.regex_patterns = {**self.universe_regex_patterns, **self.pg_regex_patterns}
+        # Integer ids of the messages, counts are kept by id until they are reported
+        self.message_names = list(self.regex_patterns)
+        self.message_ids = {name: i for i, name in enumerate(self.message_names)}
+        # {regex pattern: (required literal, branches)}, shared by every pattern set built from the configuration
+        analysis = analysis or {}
+        self.pattern_analysis = {pattern: tuple(analysis[pattern]) if pattern in analysis else PatternSet.analyzePattern(pattern) for pattern in self.regex_patterns.values()}
+        self.universe_pattern_set = self.makePatternSet(self.universe_regex_patterns)
+        self.pg_pattern_set = self.makePatternSet(self.pg_regex_patterns)
+        # Pattern sets by the names of their patterns, shared by the scopes that select the same messages
+        self.scoped_pattern_sets = {}
+        self.scoped_patterns = {}
+        for process in PROCESSES:
+            self.getPatterns(process)
+
+    def makePatternSet(self, patterns):
+        """
+        Returns the binary PatternSet of some {message: regex} patterns of the configuration.
+        """
+        return PatternSet(patterns, binary=True, sources=self.sources, analysis=self.pattern_analysis)
+
+    @staticmethod
+    def getScope(msg_dict, section):
+        processes = tuple(msg_dict.get("processes", SECTION_PROCESSES[section]))
+        for process in processes:
+            if process not in PROCESSES:
+                raise ValueError("Invalid process {} of message {}, expected one of {}".format(process, msg_dict["name"], ", ".join(PROCESSES)))
+        versions = []
+        for key in ("min_version", "max_version"):
+            version = msg_dict.get(key)
+            if version is not None and not isinstance(version, str):
+                raise ValueError("The {} of message {} must be quoted, e.g. \"2.20\"".format(key, msg_dict["name"]))
+            versions.append(parseVersion(version))
+        return (processes,) + tuple(versions)
+
+    def inScope(self, name, process, version):
+        processes, minVersion, maxVersion = self.scopes[name]
+        if process not in processes:
+            return False
+        # A message is kept for all versions when the version is not known
+        if version is not None:
+            if minVersion is not None and version[:len(minVersion)] < minVersion:
+                return False
+            if maxVersion is not None and version[:len(maxVersion)] > maxVersion:
+                return False
+        return True
+
+    def getPatterns(self, process, version=None):
+        """
+        Returns the patterns of the messages in scope for a process at a YugabyteDB version, and their pattern set.
+        Args:
+            process (str): One of PROCESSES.
+            version (str): The YugabyteDB version, e.g. "2.18.0.1", or None if it is not known.
+        Returns:
+            tuple: ({message: regex}, PatternSet), or (None, None) if no message applies to the process.
+        """
+        if (process, version) not in self.scoped_patterns:
+            versionNumbers = parseVersion(version)
+            patterns = {name: pattern for name, pattern in self.regex_patterns.items() if self.inScope(name, process, versionNumbers)}
+            if patterns and tuple(patterns) not in self.scoped_pattern_sets:
+                self.scoped_pattern_sets[tuple(patterns)] = self.makePatternSet(patterns)
+            self.scoped_patterns[(process, version)] = patterns or None
+        patterns = self.scoped_patterns[(process, version)]
+        if patterns is None:
+            return None, None
+        return patterns, self.scoped_pattern_sets[tuple(patterns)]
+
+def getUserCacheDir():
+    """
+    Returns the directory of the per user cache, $XDG_CACHE_HOME/yb-log-analyzer or ~/.cache/yb-log-analyzer.
+    """
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"), USER_CACHE_DIR_NAME)
+
+@functools.lru_cache(maxsize=None)
+def loadLogConfig(path=config_path):
+    """
+    Loads log_conf.yml with its patterns compiled into pattern sets. The parsed configuration and the analysis of its
+    patterns (see PatternSet.analyzePattern) are cached as JSON in the per user cache directory (see getUserCacheDir),
+    keyed by a hash of the file content, so that PyYAML and the pattern analysis only run when the file changes.
+    The regexes themselves are compiled on every load.
+    Returns:
+        LogConfig: The log messages of the configuration.
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    key = [LOG_CONFIG_CACHE_VERSION, hashlib.sha1(content).hexdigest()]
+    cachePath = os.path.join(getUserCacheDir(), os.path.basename(path) + ".json")
+    try:
+        with open(cachePath, "r", encoding="utf-8") as f:
+            cached = json.load(f)
+        if cached["key"] == key:
+            return LogConfig(cached["config"], cached["analysis"])
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    import yaml
+    config = yaml.safe_load(content)
+    logConfig = LogConfig(config)
+    tmpPath = "{}.{}.tmp".format(cachePath, os.getpid())
+    try:
+        os.makedirs(os.path.dirname(cachePath), mode=0o700, exist_ok=True)
+        with open(tmpPath, "w", encoding="utf-8") as f:
+            json.dump({"key": key, "config": config, "analysis": logConfig.pattern_analysis}, f)
+        os.replace(tmpPath, cachePath)
+    except (OSError, TypeError, ValueError):
+        # Not cached, e.g. a read-only home directory or values JSON does not have
+        if os.path.exists(tmpPath):
+            os.unlink(tmpPath)
+    return logConfig
+
+def __getattr__(name):
+    # The configuration is only loaded by the first use of one of its names, e.g. "from analyzer_lib import solutions"
+    if name in ("universe_regex_patterns", "universe_solutions", "pg_regex_patterns", "pg_solutions", "solutions", "sources", "universe_pattern_set", "pg_pattern_set"):
+        return getattr(loadLogConfig(), name)
+    if name == "htmlHeader":
+        return htmlHeader1 + str(loadLogConfig().solutions) + htmlHeader2
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
 
 ##############################################################################
 # The rest of analyzer_lib code (HTML templates, etc.) remains the same
 ##############################################################################
 
 
-htmlHeader = """
+htmlHeader1 = """
 <!DOCTYPE html>
 <html>
 <head>
@@ -49,7 +432,9 @@ htmlHeader = """
  	<meta charset="utf-8">
 	<title>Log Analysis Results</title>
 	<script type="text/javascript">
-		var solutions =""" + str(solutions) + """ ;
+		var solutions ="""
+
+htmlHeader2 = """ ;
 		htmlGenerator = new showdown.Converter();
 		window.onload = function () {
 			var toc = document.getElementById("toc");
@@ -0,0 +1,499 @@
+import os
+import io
+import re
+import shutil
+import gzip
+import tempfile
+import base64
+import tarfile
+import functools
+import itertools
+import logging
+from collections import defaultdict
+
+from config import LINES_TO_CHECK
+from log_lib import getFileKey, getFileMetadata, getLogType, getLogSubtype, getNodeName, parseLogFileNameTime
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+formatter = logging.Formatter('%(asctime)s:%(levelname)s:- %(message)s')
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+
+# Support bundle members are addressed by their virtual path: the path they would have if the bundle, and every
+# nested archive in it, was extracted next to itself (as extractAllTarFiles does). Node names, log types and report
+# paths are therefore the same whether a bundle is analyzed in place or extracted.
+
+# Small files kept in the member index, for the node details and gflags
+KEPT_FILE_NAMES = ("server.conf", "instance")
+# Read buffer of the members, also how much of a log file is looked at for its first lines
+MEMBER_BUFFER_SIZE = 64 * 1024
+# Magic of the protobuf container files written by YugabyteDB, such as the instance files of the masters and tservers
+PB_CONTAINER_MAGIC = b"yugacntr"
+
+def isArchive(path):
+    return path.endswith(".tar.gz") or path.endswith(".tgz")
+
+def isLogFile(path):
+    # The INFO, WARNING and ERROR glog files, and the postgres logs
+    fileName = os.path.basename(path)
+    return fileName.__contains__("INFO") or fileName.__contains__(".WARNING.") or fileName.__contains__(".ERROR.") or fileName.__contains__("postgres") and fileName[0] != "."
+
+class MemberStream(io.RawIOBase):
+    """
+    A read-only, non-seekable view of a member of a tar archive read in streaming mode.
+    The file objects tarfile returns in streaming mode claim to be seekable but fail to, which io.TextIOWrapper trips over.
+    """
+    def __init__(self, stream):
+        self.stream = stream
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+def openMember(tar, member, path, decompress=True):
+    """
+    Returns a buffered binary stream of the content of a tar member, decompressed if it is a .gz file and decompress is set.
+    """
+    stream = tar.extractfile(member)
+    if decompress and path.endswith(".gz"):
+        stream = gzip.GzipFile(fileobj=stream, mode="rb")
+    return io.BufferedReader(MemberStream(stream), buffer_size=MEMBER_BUFFER_SIZE)
+
+def iterArchiveMembers(archivePath, fileobj=None, descend=None, archives=()):
+    """
+    Walks a tar archive in streaming mode, so that nothing is written to disk and every byte is read once.
+    Args:
+        archivePath (str): The (virtual) path of the archive.
+        fileobj: A binary stream of the archive, for nested archives. archivePath is opened if not given.
+        descend (callable): descend(path, archives) tells whether to walk into the nested archive at path. Defaults to all.
+            Nested archives that are not walked into are yielded like any other file.
+        archives (tuple): The nested archives archivePath is in, outermost first (not counting the bundle itself).
+    Yields:
+        tuple: (virtual path, archives, member, open) for every regular file, where archives are the nested archives the
+            file is in, member is its tarfile.TarInfo and open(decompress=True) returns a binary stream of its content.
+            The stream is only valid until the next member is yielded.
+    """
+    baseDir = os.path.dirname(archivePath)
+    with tarfile.open(archivePath if fileobj is None else None, mode="r|*", fileobj=fileobj) as tar:
+        for member in tar:
+            if not member.isfile():
+                continue
+            if os.path.isabs(member.name) or ".." in member.name.split("/"):
+                logger.warning("Skipping member {} of {}, it points outside of the archive".format(member.name, archivePath))
+                continue
+            path = os.path.join(baseDir, member.name)
+            if isArchive(path) and (descend is None or descend(path, archives)):
+                try:
+                    yield from iterArchiveMembers(path, tar.extractfile(member), descend, archives + (path,))
+                except (tarfile.TarError, EOFError, OSError) as e:
+                    logger.warning("Could not read nested archive {}, skipping the rest of it: {}".format(path, e))
+                continue
+            yield path, archives, member, functools.partial(openMember, tar, member, path)
+
+def buildBundleIndex(bundlePath):
+    """
+    Walks a support bundle once, without extracting it, and builds its member index and the metadata of its log files.
+    Args:
+        bundlePath (str): The path to the support bundle (.tar.gz or .tgz).
+    Returns:
+        tuple: (logFilesMetadata, memberIndex)
+            - logFilesMetadata (dict): {virtual path: getFileMetadata} for every log file, as built for extracted bundles.
+            - memberIndex (dict): With the following keys:
+                - bundle (str): The path to the support bundle.
+                - archives (dict): {log file: the top level nested archive holding it, or the bundle itself}.
+                - dirs (dict): {virtual directory: names of the files in it}, for every directory in the bundle.
+                - files (dict): {virtual path: base64 content} of the server.conf and instance files.
+                - heads (dict): {virtual path: first LINES_TO_CHECK lines} of the log files.
+    """
+    bundlePath = os.path.abspath(bundlePath)
+    logFilesMetadata = {}
+    memberIndex = {"bundle": bundlePath, "archives": {}, "dirs": defaultdict(list), "files": {}, "heads": {}}
+    for path, archives, member, openStream in iterArchiveMembers(bundlePath):
+        directory, fileName = os.path.split(path)
+        memberIndex["dirs"][directory].append(fileName)
+        if fileName in KEPT_FILE_NAMES:
+            with openStream() as stream:
+                memberIndex["files"][path] = base64.b64encode(stream.read()).decode("ascii")
+        elif isLogFile(path):
+            try:
+                logs = openStream()
+                memberIndex["heads"][path] = logs.peek(MEMBER_BUFFER_SIZE).decode("utf-8", errors="ignore").splitlines(True)[:LINES_TO_CHECK]
+                metadata = getFileMetadata(path, logs, member.size, logMtime=member.mtime)
+            except (OSError, EOFError) as e:
+                logger.error("Error reading {} from the support bundle: {}".format(path, e))
+                continue
+            if metadata:
+                logFilesMetadata[path] = metadata
+                memberIndex["archives"][path] = archives[0] if archives else bundlePath
+    # Make every parent directory known, down to the directory of the bundle
+    bundleDir = os.path.dirname(bundlePath)
+    for directory in list(memberIndex["dirs"]):
+        while directory.startswith(bundleDir + os.sep):
+            directory = os.path.dirname(directory)
+            memberIndex["dirs"].setdefault(directory, [])
+    memberIndex["dirs"] = dict(memberIndex["dirs"])
+    return logFilesMetadata, memberIndex
+
+def spoolBundleMembers(bundlePath, members, spoolDir):
+    """
+    Reads a support bundle once and copies the given top level members out of it as they come, as stored (a nested
+    archive stays compressed), so that each can be read by its own worker instead of every worker streaming the
+    bundle from its start to reach its member.
+    Args:
+        bundlePath (str): The path to the support bundle.
+        members (iterable): The virtual paths of the top level members to copy: nested archives (see buildBundleIndex)
+            and log files that are not in one.
+        spoolDir (str): The directory to copy the members to.
+    Yields:
+        tuple: (virtual path, path of the copy) for each member found, in bundle order, once it is copied. The caller
+            removes the copies.
+    """
+    remaining = set(members)
+    if not remaining:
+        return
+    os.makedirs(spoolDir, exist_ok=True)
+    for path, archives, member, openStream in iterArchiveMembers(bundlePath, descend=lambda path, archives: False):
+        if path not in remaining:
+            continue
+        remaining.discard(path)
+        fd, spooledFile = tempfile.mkstemp(suffix="." + os.path.basename(path), dir=spoolDir)
+        try:
+            with os.fdopen(fd, "wb") as f, openStream(decompress=False) as stream:
+                shutil.copyfileobj(stream, f, MEMBER_BUFFER_SIZE)
+        except BaseException:
+            os.remove(spooledFile)
+            raise
+        yield path, spooledFile
+        if not remaining:
+            break
+
+def iterSpooledLogFiles(member, spooledFile, logFiles):
+    """
+    Streams the given log files of a top level member of a support bundle copied out by spoolBundleMembers.
+    Args:
+        member (str): The virtual path of the member, a nested archive or one of logFiles itself.
+        spooledFile (str): The path of the copy of the member.
+        logFiles (list): The virtual paths of the log files to read.
+    Yields:
+        tuple: (virtual path, binary stream) for each of the log files, in bundle order.
+    """
+    if member in logFiles:
+        with open(spooledFile, "rb") as f, (gzip.GzipFile(fileobj=f, mode="rb") if member.endswith(".gz") else f) as stream:
+            yield member, stream
+        return
+    remaining = set(logFiles)
+    with open(spooledFile, "rb") as f:
+        for path, archives, tarMember, openStream in iterArchiveMembers(member, fileobj=f, archives=(member,)):
+            if path in remaining:
+                remaining.discard(path)
+                with openStream() as stream:
+                    yield path, stream
+                if not remaining:
+                    break
+
+class MemberSelector:
+    """
+    Decides which members of a support bundle a run needs: the log files of the selected types and nodes, except
+    the rotated log files created after the end time, and the files used for the node details and gflags.
+    Plain data, so that it can be sent to the extraction workers.
+    Args:
+        logTypes (list): The log types to keep (see log_lib.LOG_TYPES), or None for all.
+        nodes (list): The node names (or parts of them) to keep, as given to --nodes, or None for all.
+        endTime (datetime): The end of the analyzed time window, placed in its real year, or None to keep the rotated
+            log files whatever their creation time.
+    """
+    def __init__(self, logTypes=None, nodes=None, endTime=None):
+        self.logTypes = logTypes
+        self.nodes = nodes
+        self.endTime = endTime
+
+    def selectNode(self, path):
+        nodeName = getNodeName(path)
+        return self.nodes is None or nodeName == "unknown" or any(node in nodeName for node in self.nodes)
+
+    def selectArchive(self, path):
+        # Node archives are named after their node, e.g. yb-prod-univ-n1.tar.gz
+        return self.selectNode(re.sub(r"\.(tar\.gz|tgz)$", "/", path))
+
+    def selectFile(self, path):
+        if not self.selectNode(path):
+            return False
+        directory, fileName = os.path.split(path)
+        if fileName in KEPT_FILE_NAMES or os.path.basename(directory) == "tablet-meta":
+            return True
+        if not isLogFile(path):
+            return False
+        if self.logTypes is not None and getLogType(path) not in self.logTypes:
+            return False
+        createdAt = parseLogFileNameTime(fileName)
+        if createdAt and self.endTime:
+            return createdAt <= self.endTime
+        return True
+
+def extractArchive(archivePath, selector, walkNested=True):
+    """
+    Extracts the members of an archive that a run needs next to it, reading the archive once in streaming mode.
+    Args:
+        archivePath (str): The path to the archive.
+        selector (MemberSelector): Decides which members and nested archives are needed.
+        walkNested (bool): Walk the needed nested archives in place and extract their needed members.
+            Otherwise the needed nested archives are extracted as they are, e.g. to extract them in parallel afterwards.
+    Returns:
+        list: The paths of the extracted files.
+    """
+    extracted = []
+    if walkNested:
+        descend = lambda path, archives: selector.selectArchive(path)
+    else:
+        descend = lambda path, archives: False
+    try:
+        for path, archives, member, openStream in iterArchiveMembers(archivePath, descend=descend):
+            if not (selector.selectArchive(path) if isArchive(path) else selector.selectFile(path)):
+                continue
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with openStream(decompress=False) as stream, open(path, "wb") as f:
+                shutil.copyfileobj(stream, f, MEMBER_BUFFER_SIZE)
+            os.utime(path, (member.mtime, member.mtime))
+            extracted.append(path)
+    except (tarfile.TarError, EOFError, OSError) as e:
+        logger.warning("Error while extracting {}, {} files were extracted before it: {}".format(archivePath, len(extracted), e))
+    return extracted
+
+def readVarint(data, pos):
+    result = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            return result, pos
+        shift += 7
+
+def iterPBFields(message):
+    """
+    Decodes the top level fields of a serialized protobuf message, without its schema.
+    Yields:
+        tuple: (field number, wire type, value), the value is an int for varints and bytes otherwise.
+    """
+    pos = 0
+    while pos < len(message):
+        key, pos = readVarint(message, pos)
+        fieldNumber, wireType = key >> 3, key & 7
+        if wireType == 0:
+            value, pos = readVarint(message, pos)
+        elif wireType == 1:
+            value, pos = message[pos:pos + 8], pos + 8
+        elif wireType == 2:
+            length, pos = readVarint(message, pos)
+            value, pos = message[pos:pos + length], pos + length
+        elif wireType == 5:
+            value, pos = message[pos:pos + 4], pos + 4
+        else:
+            raise ValueError("Unsupported protobuf wire type {}".format(wireType))
+        if pos > len(message):
+            raise ValueError("Truncated protobuf message")
+        yield fieldNumber, wireType, value
+
+def iterPBContainerRecords(data):
+    """
+    Yields the serialized messages of a protobuf container file: the magic and a little endian uint32 version
+    (followed by a header checksum from version 2), then records made of a little endian uint32 length, the message
+    and a checksum. The first record is the supplemental header, which describes the message type.
+    """
+    if data[:len(PB_CONTAINER_MAGIC)] != PB_CONTAINER_MAGIC:
+        raise ValueError("Not a protobuf container file")
+    version = int.from_bytes(data[8:12], "little")
+    pos = 16 if version >= 2 else 12
+    while pos + 4 <= len(data):
+        length = int.from_bytes(data[pos:pos + 4], "little")
+        if pos + 4 + length + 4 > len(data):
+            raise ValueError("Truncated protobuf container record")
+        yield data[pos + 4:pos + 4 + length]
+        pos += 4 + length + 4
+
+def getInstanceUUID(data):
+    """
+    Returns the uuid of a master or tserver instance file (an InstanceMetadataPB, whose uuid is field 1), as
+    yb-pbc-dump prints it.
+    Args:
+        data (bytes): The content of the instance file.
+    Raises:
+        ValueError: If the file is not an instance file.
+    """
+    try:
+        for record in itertools.islice(iterPBContainerRecords(data), 1, None):
+            for fieldNumber, wireType, value in iterPBFields(record):
+                if fieldNumber == 1 and wireType == 2:
+                    return value.decode("utf-8", errors="replace")
+    except IndexError:
+        raise ValueError("Truncated protobuf message")
+    raise ValueError("No uuid in the instance file")
+
+class LocalFiles:
+    """
+    The files of an extracted support bundle, read from disk.
+    """
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def getKey(self, path):
+        # Changes whenever the file does (see log_lib.getFileKey)
+        return getFileKey(path)
+
+    def listdir(self, path):
+        return os.listdir(path)
+
+    def read(self, path):
+        with open(path, "rb") as f:
+            return f.read()
+
+    def readLines(self, path, numLines=LINES_TO_CHECK):
+        opener = gzip.open if path.endswith(".gz") else open
+        lines = []
+        with opener(path, "rt", errors="ignore") as f:
+            for line in f:
+                lines.append(line)
+                if len(lines) >= numLines:
+                    break
+        return lines
+
+class BundleFiles(LocalFiles):
+    """
+    The files of a support bundle analyzed in place, served from its member index (see buildBundleIndex).
+    Only directories, the kept small files and the first lines of the log files are available.
+    """
+    def __init__(self, memberIndex):
+        self.memberIndex = memberIndex
+
+    def exists(self, path):
+        return path in self.memberIndex["dirs"] or path in self.memberIndex["files"] or path in self.memberIndex["heads"]
+
+    def getKey(self, path):
+        # The member index, and what is kept with it, is rebuilt whenever the bundle changes
+        return None
+
+    def listdir(self, path):
+        return self.memberIndex["dirs"][path]
+
+    def read(self, path):
+        return base64.b64decode(self.memberIndex["files"][path])
+
+    def readLines(self, path, numLines=LINES_TO_CHECK):
+        return self.memberIndex["heads"].get(path, [])[:numLines]
+
+# Name of the directory of a node in a support bundle, e.g. yb-prod-univ-n1, and the same within a path (see log_lib.getNodeName)
+NODE_DIR_NAME = re.compile(r"yb-[^/]*n\d+")
+NODE_DIR_IN_PATH = re.compile(r"/(yb-[^/]*n\d+)/")
+# Files of a node directory read for the node details and gflags, relative to it
+NODE_FILES = ("master/instance", "tserver/instance", "master/conf/server.conf", "tserver/conf/server.conf")
+# Directory of a node holding one metadata file per tablet, named after the tablet id
+TABLET_META_DIR = "tserver/tablet-meta"
+TABLET_ID = re.compile(r"^[a-f0-9]{32}$", re.IGNORECASE)
+
+def getNodeDir(path):
+    """
+    Returns the directory of the node a file is in, the one log_lib.getNodeName takes the node name from, or None.
+    """
+    match = NODE_DIR_IN_PATH.search(path)
+    return path[:match.end(1)] if match else None
+
+class BundleInventory:
+    """
+    The index of the files of a support bundle that the later stages need, built in one pass over the bundle:
+    the log files by type and subtype, the archives, the directory of each node, the node files (see NODE_FILES)
+    and the number of tablets of each node.
+    Filled with scan for an extracted bundle or a log directory, or built with fromMemberIndex for a bundle analyzed in place.
+    """
+    def __init__(self):
+        self.logFiles = []
+        self.logFilesByType = defaultdict(list)
+        self.archives = []
+        self.nodeDirs = {}
+        self.nodeFiles = defaultdict(dict)
+        self.tabletCounts = defaultdict(int)
+        self.paths = set()
+
+    def scan(self, root):
+        """
+        Adds the files of a directory tree, listed once with os.scandir in the order os.walk would (files of a
+        directory first, then its subdirectories). Symbolic links to directories are not followed.
+        Args:
+            root (str): The directory to scan, the paths added start with it.
+        """
+        # (directory, directory of the node it is in)
+        stack = [(root, getNodeDir(root + "/"))]
+        while stack:
+            directory, nodeDir = stack.pop()
+            subdirs = []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        try:
+                            isDir = entry.is_dir() and not entry.is_symlink()
+                        except OSError:
+                            isDir = False
+                        if isDir:
+                            subdirs.append((entry.path, nodeDir or (entry.path if NODE_DIR_NAME.fullmatch(entry.name) else None)))
+                        else:
+                            self.addFile(entry.path, nodeDir)
+            except OSError as e:
+                logger.warning("Could not list {}: {}".format(directory, e))
+                continue
+            stack.extend(reversed(subdirs))
+
+    @classmethod
+    def fromMemberIndex(cls, memberIndex):
+        """
+        Builds the inventory of a support bundle analyzed in place from its member index (see buildBundleIndex).
+        The log files are listed in bundle order, as their metadata is.
+        """
+        inventory = cls()
+        inventory.addFiles(memberIndex["heads"])
+        inventory.addFiles(os.path.join(directory, fileName) for directory, fileNames in memberIndex["dirs"].items() for fileName in fileNames)
+        return inventory
+
+    def addFiles(self, paths):
+        """
+        Adds files to the inventory, e.g. the files extracted from the archives of a scanned directory.
+        """
+        for path in paths:
+            self.addFile(path)
+
+    def addFile(self, path, nodeDir=None):
+        """
+        Adds a file to the inventory, files already in it are skipped.
+        Args:
+            path (str): The path to the file.
+            nodeDir (str): The directory of the node the file is in, found from the path when not given.
+        """
+        if path in self.paths:
+            return
+        self.paths.add(path)
+        if nodeDir is None:
+            nodeDir = getNodeDir(path)
+        if nodeDir is not None:
+            self.nodeDirs.setdefault(os.path.basename(nodeDir), nodeDir)
+            relativePath = path[len(nodeDir) + 1:]
+            if relativePath in NODE_FILES:
+                self.nodeFiles[nodeDir][relativePath] = path
+            elif os.path.dirname(relativePath) == TABLET_META_DIR and TABLET_ID.match(os.path.basename(path)):
+                self.tabletCounts[nodeDir] += 1
+                return
+        if isLogFile(path):
+            self.logFiles.append(path)
+            self.logFilesByType[getLogType(path)].append(path)
+        elif isArchive(path):
+            self.archives.append(path)
+
+    def getLogFiles(self, logType, subtype=None):
+        """
+        Returns the log files of a type, and of a subtype if given, in inventory order.
+        """
+        return [logFile for logFile in self.logFilesByType.get(logType, []) if subtype is None or getLogSubtype(logFile) == subtype]
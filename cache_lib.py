@@ -0,0 +1,180 @@
+import os
+import json
+import gzip
+import sqlite3
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
+formatter = logging.Formatter('%(asctime)s:%(levelname)s:- %(message)s')
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.INFO)
+console_handler.setFormatter(formatter)
+logger.addHandler(console_handler)
+
+# Bumped whenever the tables or the meaning of the stored counts change, caches of another version are dropped
+RESULT_CACHE_VERSION = 2
+# Format version of the results files written next to the reports
+RESULTS_FILE_VERSION = 1
+
+def getPatternFingerprint(name, pattern, sources=None):
+    """
+    Returns the fingerprint of a log message pattern, which changes whenever its name, regex or source files change
+    in log_conf.yml.
+    """
+    key = "{}\n{}".format(name, pattern)
+    if sources:
+        key += "\n" + ",".join(sources)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+class ResultCache:
+    """
+    The analysis results of the log files, kept in SQLite so that a re-run only scans the files, and the patterns,
+    it has not seen before.
+    For every log file and pattern, the cache holds the number of matching lines per log minute, and the time window
+    (in log minutes, None when unbounded) the pattern was evaluated over. A file is identified by its path and by a
+    key that changes with its content (see log_lib.getFileKey), so a changed file starts over.
+    Args:
+        path (str): The path to the SQLite database. If it cannot be opened, the cache lives in memory for this run.
+    """
+    def __init__(self, path):
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.connection = sqlite3.connect(path)
+            self.createTables()
+        except (OSError, sqlite3.Error) as e:
+            logger.warning("Could not open the result cache {}, results will not be kept: {}".format(path, e))
+            self.connection = sqlite3.connect(":memory:")
+            self.createTables()
+
+    def createTables(self):
+        with self.connection:
+            if self.connection.execute("PRAGMA user_version").fetchone()[0] != RESULT_CACHE_VERSION:
+                for table in ("files", "scans", "counts"):
+                    self.connection.execute("DROP TABLE IF EXISTS {}".format(table))
+                self.connection.execute("PRAGMA user_version = {}".format(RESULT_CACHE_VERSION))
+            self.connection.execute("CREATE TABLE IF NOT EXISTS files (id INTEGER PRIMARY KEY, path TEXT UNIQUE, fileKey TEXT)")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS scans (fileId INTEGER, pattern TEXT, fromMinute INTEGER, toMinute INTEGER, PRIMARY KEY (fileId, pattern)) WITHOUT ROWID")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS counts (fileId INTEGER, pattern TEXT, minute INTEGER, count INTEGER, PRIMARY KEY (fileId, pattern, minute)) WITHOUT ROWID")
+
+    def getFileId(self, logFile, fileKey):
+        """
+        Returns the id of a log file in the cache, dropping what was cached for it if its key changed.
+        """
+        fileKey = json.dumps(fileKey)
+        row = self.connection.execute("SELECT id, fileKey FROM files WHERE path = ?", (logFile,)).fetchone()
+        with self.connection:
+            if row is None:
+                return self.connection.execute("INSERT INTO files (path, fileKey) VALUES (?, ?)", (logFile, fileKey)).lastrowid
+            fileId, cachedFileKey = row
+            if cachedFileKey != fileKey:
+                self.connection.execute("DELETE FROM scans WHERE fileId = ?", (fileId,))
+                self.connection.execute("DELETE FROM counts WHERE fileId = ?", (fileId,))
+                self.connection.execute("UPDATE files SET fileKey = ? WHERE id = ?", (fileKey, fileId))
+        return fileId
+
+    def getCoveredPatterns(self, fileId, startTime, endTime):
+        """
+        Returns the fingerprints of the patterns cached for a log file over a window that covers startTime to endTime.
+        """
+        rows = self.connection.execute(
+            "SELECT pattern FROM scans WHERE fileId = ? AND (fromMinute IS NULL OR fromMinute <= ?) AND (toMinute IS NULL OR toMinute >= ?)",
+            (fileId, startTime, endTime))
+        return {pattern for pattern, in rows}
+
+    def loadCounts(self, fileId, fingerprints, startTime, endTime):
+        """
+        Returns {fingerprint: {log minute: count}} of the given patterns for a log file, between startTime and endTime.
+        """
+        fingerprints = set(fingerprints)
+        counts = {}
+        rows = self.connection.execute(
+            "SELECT pattern, minute, count FROM counts WHERE fileId = ? AND minute BETWEEN ? AND ? ORDER BY minute",
+            (fileId, startTime, endTime))
+        for pattern, minute, count in rows:
+            if pattern in fingerprints:
+                counts.setdefault(pattern, {})[minute] = count
+        return counts
+
+    def storeCounts(self, fileId, counts, fromMinute, toMinute):
+        """
+        Replaces what is cached for the given patterns of a log file.
+        Args:
+            fileId (int): The id of the log file, see getFileId.
+            counts (dict): {fingerprint: {log minute: count}} for every pattern the file was scanned for, empty for the patterns that did not match.
+            fromMinute (int): The start of the window the file was scanned over, or None if it covers the start of the file.
+            toMinute (int): The end of the window the file was scanned over, or None if it covers the end of the file.
+        """
+        with self.connection:
+            for pattern, minuteCounts in counts.items():
+                self.connection.execute("DELETE FROM counts WHERE fileId = ? AND pattern = ?", (fileId, pattern))
+                self.connection.execute("INSERT OR REPLACE INTO scans (fileId, pattern, fromMinute, toMinute) VALUES (?, ?, ?, ?)", (fileId, pattern, fromMinute, toMinute))
+                self.connection.executemany("INSERT INTO counts (fileId, pattern, minute, count) VALUES (?, ?, ?, ?)",
+                                            ((fileId, pattern, minute, count) for minute, count in minuteCounts.items()))
+
+    def close(self):
+        self.connection.close()
+
+def saveResultsFile(path, fileMinuteCounts, logFilesMetadata, window, details):
+    """
+    Saves the results of a run next to its report, so that the report can be rendered again with narrower filters
+    without reading any logs (see loadResultsFile). The counts are stored as columns of integers, one entry per
+    log file, message and log minute, in gzipped JSON.
+    Args:
+        path (str): The path to the results file.
+        fileMinuteCounts (dict): {log file: {message: {log minute: count}}} for every analyzed log file.
+        logFilesMetadata (dict): {log file: metadata} of the analyzed log files.
+        window (tuple): The (start, end) log minutes the log files were analyzed over.
+        details (dict): The rest of what the report shows, e.g. the version, node details and gflags.
+    """
+    logFiles = list(fileMinuteCounts)
+    messages = sorted({message for minuteCounts in fileMinuteCounts.values() for message in minuteCounts})
+    messageIds = {message: i for i, message in enumerate(messages)}
+    metadataKeys = sorted({key for logFile in logFiles for key in logFilesMetadata[logFile]} - {"fileKey"})
+    counts = {"file": [], "message": [], "minute": [], "count": []}
+    for fileId, logFile in enumerate(logFiles):
+        for message, minuteCounts in fileMinuteCounts[logFile].items():
+            for minute, count in sorted(minuteCounts.items()):
+                counts["file"].append(fileId)
+                counts["message"].append(messageIds[message])
+                counts["minute"].append(minute)
+                counts["count"].append(count)
+    results = {
+        "version": RESULTS_FILE_VERSION,
+        "window": list(window),
+        "details": details,
+        "files": dict({"path": logFiles}, **{key: [logFilesMetadata[logFile].get(key) for logFile in logFiles] for key in metadataKeys}),
+        "messages": messages,
+        "counts": counts,
+    }
+    tmpPath = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        with open(tmpPath, "wb") as f, gzip.GzipFile(fileobj=f, mode="wb", mtime=0) as gz:
+            gz.write(json.dumps(results, separators=(",", ":")).encode("utf-8"))
+        os.replace(tmpPath, path)
+    except BaseException:
+        os.unlink(tmpPath)
+        raise
+
+def loadResultsFile(path):
+    """
+    Loads a results file written by saveResultsFile.
+    Returns:
+        tuple: (fileMinuteCounts, logFilesMetadata, window, details), as given to saveResultsFile.
+    Raises:
+        ValueError: If the file is not a results file, or one of another format version.
+    """
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        results = json.load(f)
+    if results.get("version") != RESULTS_FILE_VERSION:
+        raise ValueError("{} is not a results file of version {}".format(path, RESULTS_FILE_VERSION))
+    files = results["files"]
+    logFiles = files["path"]
+    logFilesMetadata = {logFile: {key: values[i] for key, values in files.items() if key != "path"} for i, logFile in enumerate(logFiles)}
+    fileMinuteCounts = {logFile: {} for logFile in logFiles}
+    messages = results["messages"]
+    counts = results["counts"]
+    for fileId, messageId, minute, count in zip(counts["file"], counts["message"], counts["minute"], counts["count"]):
+        fileMinuteCounts[logFiles[fileId]].setdefault(messages[messageId], {})[minute] = count
+    return fileMinuteCounts, logFilesMetadata, tuple(results["window"]), results["details"]
@@ -10,9 +10,33 @@ HOSTNAME_TRIGGER = "lincoln"
 LINCOLN_HOSTNAME = "lincoln"
 ANALYSIS_DUMP_DIR = "/home/support/logs_analyzer_dump/"
 ANALYSIS_DUMP_DIR = "/Users/vidigalp/Code/tools/yb-log-analyzer-py/output_files"
-TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates') # Assumes templates dir is one level up from utils
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates')
 
 # Compile the regex pattern once for efficiency
 REGEX_VERSION_PATTERN = re.compile(r'version\s+(\d+\.\d+\.\d+\.\d+)')
 LINES_TO_CHECK = 10 # Number of lines to check at the beginning of each file
-DEFAULT_VERSION = "Unknown"
\ No newline at end of file
+DEFAULT_VERSION = "Unknown"
+# Size of the blocks read by the log scanner, lines are never split across blocks
+SCAN_BLOCK_SIZE = 4 * 1024 * 1024
+# Binary search for --from_time in plain log files stops once the range is narrower than this many bytes
+TIME_INDEX_GRANULARITY = 64 * 1024
+# Typical compression ratio of gzipped logs, to weigh them against plain logs when scheduling the analysis
+GZIP_COMPRESSION_RATIO = 8
+# Plain log files larger than this are split into line aligned byte ranges of about this size, analyzed in parallel
+LOG_RANGE_SIZE = 256 * 1024 * 1024
+# Directory the metadata store and time index are kept in, next to the support bundle or inside the log directory
+CACHE_DIR_NAME = ".log_analyzer_cache"
+# Directory of the per user cache of the parsed log_conf.yml, under $XDG_CACHE_HOME (~/.cache by default)
+USER_CACHE_DIR_NAME = "yb-log-analyzer"
+# Format version of the log files metadata store, stores written in another version are rebuilt
+METADATA_STORE_VERSION = 4
+# Number of lines at the start and at the end of a log file searched for its start and end times
+METADATA_LINES = 10
+# Bytes read back from the end of a plain log file for its last lines, grown until enough lines are found
+METADATA_TAIL_SIZE = 64 * 1024
+# Size of the write buffer the report templates are generated into
+REPORT_WRITE_BUFFER_SIZE = 1024 * 1024
+# Resolutions, in minutes, of the levels of the report chart, finer levels are only loaded when zooming in
+CHART_LEVEL_MINUTES = [24 * 60, 60, 1]
+# The report chart shows the finest level with at most this many bars in the visible range
+CHART_MAX_BARS = 400
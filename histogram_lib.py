@@ -0,0 +1,165 @@
+import numpy
+
+class MinuteCounts:
+    """
+    The number of matching lines of a log file per message and log minute, as a dense array over the minutes
+    between the first and the last match of the file. The analyzer identifies the messages by their integer ids
+    (see LogConfig.message_ids), any hashable key works.
+    Args:
+        messages (list): The messages, one row of counts each.
+        offset (int): The log minute of the first column of counts.
+        counts (numpy.ndarray): The counts, of shape (len(messages), number of minutes).
+    """
+    __slots__ = ("messages", "offset", "counts")
+
+    def __init__(self, messages=(), offset=0, counts=None):
+        self.messages = list(messages)
+        self.offset = offset
+        self.counts = counts if counts is not None else numpy.zeros((len(self.messages), 0), dtype=numpy.int32)
+
+    @classmethod
+    def fromDict(cls, minuteCounts):
+        """
+        Builds the counts from {message: {log minute: count}}.
+        """
+        minutes = [minute for counts in minuteCounts.values() for minute in counts]
+        if not minutes:
+            return cls()
+        offset = min(minutes)
+        counts = numpy.zeros((len(minuteCounts), max(minutes) - offset + 1), dtype=numpy.int32)
+        for row, messageCounts in enumerate(minuteCounts.values()):
+            columns = numpy.fromiter(messageCounts.keys(), dtype=numpy.int64, count=len(messageCounts)) - offset
+            counts[row, columns] = numpy.fromiter(messageCounts.values(), dtype=numpy.int32, count=len(messageCounts))
+        return cls(minuteCounts.keys(), offset, counts)
+
+    def toDict(self):
+        """
+        Returns the counts as {message: {log minute: count}}, without the minutes that have none.
+        """
+        minuteCounts = {}
+        for row, message in enumerate(self.messages):
+            columns = numpy.flatnonzero(self.counts[row])
+            if len(columns):
+                minuteCounts[message] = dict(zip((columns + self.offset).tolist(), self.counts[row, columns].tolist()))
+        return minuteCounts
+
+    def merge(self, other):
+        """
+        Returns the sum of these counts and other's.
+        """
+        if not other.counts.size:
+            return self
+        if not self.counts.size:
+            return other
+        rows = {message: row for row, message in enumerate(self.messages)}
+        for message in other.messages:
+            rows.setdefault(message, len(rows))
+        messages = list(rows)
+        offset = min(self.offset, other.offset)
+        width = max(self.offset + self.counts.shape[1], other.offset + other.counts.shape[1]) - offset
+        counts = numpy.zeros((len(messages), width), dtype=numpy.int32)
+        for minuteCounts in (self, other):
+            start = minuteCounts.offset - offset
+            counts[[rows[message] for message in minuteCounts.messages], start:start + minuteCounts.counts.shape[1]] += minuteCounts.counts
+        return MinuteCounts(messages, offset, counts)
+
+    def between(self, startTime, endTime):
+        """
+        Returns the counts between the log minutes startTime and endTime, without the messages that have none there.
+        """
+        start = max(startTime - self.offset, 0)
+        end = max(min(endTime - self.offset + 1, self.counts.shape[1]), start)
+        counts = self.counts[:, start:end]
+        rows = numpy.flatnonzero(counts.any(axis=1))
+        return MinuteCounts([self.messages[row] for row in rows], self.offset + start, counts[rows])
+
+    def summarize(self):
+        """
+        Returns {message: (count, first log minute, last log minute)} for every message with matches.
+        """
+        if not self.counts.size:
+            return {}
+        hits = self.counts > 0
+        totals = self.counts.sum(axis=1)
+        firsts = self.offset + hits.argmax(axis=1)
+        lasts = self.offset + self.counts.shape[1] - 1 - hits[:, ::-1].argmax(axis=1)
+        return {message: (int(totals[row]), int(firsts[row]), int(lasts[row])) for row, message in enumerate(self.messages) if totals[row]}
+
+class HistogramCube:
+    """
+    The number of matching lines per message, node and log minute over the analyzed time window.
+    The counts are kept sparse, as the (message, node, minute, count) of every minute with matches, so that the memory
+    follows the matches found rather than the length of the window times the number of nodes.
+    Coarser views (per hour, per day) are derived by resampling the minutes.
+    Args:
+        nodes (list): The node names.
+        startTime (int): The first log minute of the window.
+        endTime (int): The last log minute of the window.
+    """
+    def __init__(self, nodes, startTime, endTime):
+        self.nodes = {node: i for i, node in enumerate(nodes)}
+        self.startTime = startTime
+        self.endTime = endTime
+        self.messages = {}
+        # (rows, nodes, log minutes, counts) arrays of the minutes with matches, one tuple per added log file
+        self.entries = []
+
+    def getRow(self, message):
+        return self.messages.setdefault(message, len(self.messages))
+
+    def add(self, node, minuteCounts):
+        """
+        Adds the MinuteCounts of a log file of node, only the minutes within the window are kept.
+        """
+        start = max(minuteCounts.offset, self.startTime)
+        end = min(minuteCounts.offset + minuteCounts.counts.shape[1], self.endTime + 1)
+        if start >= end:
+            return
+        rows = numpy.array([self.getRow(message) for message in minuteCounts.messages], dtype=numpy.int64)
+        counts = minuteCounts.counts[:, start - minuteCounts.offset:end - minuteCounts.offset]
+        fileRows, columns = numpy.nonzero(counts)
+        self.entries.append((rows[fileRows], numpy.full(len(columns), self.nodes[node], dtype=numpy.int64), columns + start, counts[fileRows, columns]))
+
+    @staticmethod
+    def sumByKey(keys, counts):
+        """
+        Returns the distinct keys, sorted, and the sum of the counts of each.
+        """
+        keys, inverse = numpy.unique(keys, return_inverse=True)
+        sums = numpy.zeros(len(keys), dtype=numpy.int64)
+        numpy.add.at(sums, inverse, counts)
+        return keys, sums
+
+    def resample(self, minutes):
+        """
+        Sums the counts into buckets of the given number of minutes, aligned on multiples of it (e.g. whole hours for 60).
+        Returns:
+            tuple: (the log minute each bucket starts at, (rows, nodes, bucket indexes, counts) of the buckets with
+                counts, sorted by row, node and bucket)
+        """
+        firstBucket = self.startTime - self.startTime % minutes
+        numBuckets = -(-(self.endTime + 1 - firstBucket) // minutes)
+        bucketStarts = range(firstBucket, firstBucket + numBuckets * minutes, minutes)
+        if not self.entries:
+            empty = numpy.zeros(0, dtype=numpy.int64)
+            return bucketStarts, (empty, empty, empty, empty)
+        rows, nodes, logMinutes, counts = (numpy.concatenate(column) for column in zip(*self.entries))
+        keys, counts = self.sumByKey((rows * len(self.nodes) + nodes) * numBuckets + (logMinutes - firstBucket) // minutes, counts)
+        rowNodes, buckets = numpy.divmod(keys, numBuckets)
+        rows, nodes = numpy.divmod(rowNodes, len(self.nodes))
+        return bucketStarts, (rows, nodes, buckets, counts)
+
+    def toChartLevel(self, minutes):
+        """
+        Returns one level of the report chart: the counts summed over the nodes in buckets of the given number of minutes.
+        Only the buckets with counts are listed, as {"start": log minute of the first bucket, "step": minutes,
+        "series": {message: [[bucket index, ...], [count, ...]]}}.
+        """
+        bucketStarts, (rows, nodes, buckets, counts) = self.resample(minutes)
+        keys, counts = self.sumByKey(rows * len(bucketStarts) + buckets, counts)
+        rows, buckets = numpy.divmod(keys, len(bucketStarts))
+        bounds = numpy.searchsorted(rows, numpy.arange(len(self.messages) + 1))
+        series = {}
+        for message, row in self.messages.items():
+            series[message] = [buckets[bounds[row]:bounds[row + 1]].tolist(), counts[bounds[row]:bounds[row + 1]].tolist()]
+        return {"start": bucketStarts.start, "step": minutes, "series": series}
@@ -8,6 +8,10 @@ from analyzer_lib import (
     universe_solutions,
     pg_regex_patterns,
     pg_solutions,
+    universe_pattern_set,
+    pg_pattern_set,
+    sources,
+    PatternSet,
     solutions,
     htmlHeader,
     htmlFooter,
@@ -26,6 +30,7 @@ import gzip
 import json
 
 from config import LINCOLN_HOSTNAME
+from log_lib import scanLogFile, LogTimeParser, toLogMinute, formatLogMinute, placeInYear, parseLogFileNameTime
 
 # Import helper functions
 from utils.helper import (
@@ -290,13 +295,13 @@ def getLogFilesFromDirectory(logDirectory):
     return logFiles
 
 # Function to get the time from the log line
-def getTimeFromLog(line,previousTime):
-    if line[0] in ['I','W','E','F']:
+def getTimeFromLog(line,previousTime=None):
+    if line[:1] in ['I','W','E','F']:
         try:
             timeFromLogStr = line.split(" ")[0][1:] + " " + line.split(" ")[1][:5]
             timestamp = datetime.datetime.strptime(timeFromLogStr, "%m%d %H:%M")
         except Exception as e:
-            timestamp = datetime.datetime.strptime(previousTime, "%m%d %H:%M")
+            timestamp = datetime.datetime.strptime(previousTime, "%m%d %H:%M") if previousTime else None
     else:
         try:
             timeFromLogStr = line.split(" ")[0] + " " + line.split(" ")[1]
@@ -304,7 +309,7 @@ def getTimeFromLog(line,previousTime):
             timestamp = timestamp.strftime("%m%d %H:%M")
             timestamp = datetime.datetime.strptime(timestamp, "%m%d %H:%M")
         except Exception as e:
-            timestamp = datetime.datetime.strptime(previousTime, "%m%d %H:%M")
+            timestamp = datetime.datetime.strptime(previousTime, "%m%d %H:%M") if previousTime else None
     return timestamp
 
 # Function to get all the tar files
@@ -390,6 +395,16 @@ def skipFileBasedOnTime(logFile, start_time, end_time):
         return True
     
 
+# Function to get the time a log file was created at, from its name or else its modification time
+def getLogFileCreationTime(logFile):
+    createdAt = parseLogFileNameTime(os.path.basename(logFile))
+    if createdAt:
+        return createdAt
+    try:
+        return datetime.datetime.fromtimestamp(os.path.getmtime(logFile))
+    except OSError:
+        return datetime.datetime.now()
+
 # Function to analyze the log files                
 # Function to analyze the log files
 def analyze_log_files(logFile, outputFile, start_time=None, end_time=None):
@@ -399,9 +414,9 @@ def analyze_log_files(logFile, outputFile, start_time=None, end_time=None):
     # ------------------------------------------------------------------
 
     if logFile.__contains__("postgresql"):
-        regex_patterns = pg_regex_patterns
+        patternSet = pg_pattern_set
     else:
-        regex_patterns = universe_regex_patterns
+        patternSet = universe_pattern_set
 
     # Check if histogram mode is enabled and set the patterns to analyze
     if args.histogram_mode:
@@ -418,77 +433,62 @@ def analyze_log_files(logFile, outputFile, start_time=None, end_time=None):
                  # Fallback or warning if the custom pattern isn't predefined
                  logger.warning(f"Custom pattern '{pattern}' not found in predefined lists. Using pattern as regex.")
                  regex_patterns[pattern] = pattern # Use the name as the regex pattern itself
-
-    previousTime = '0101 00:00' # Default time
+        try:
+            patternSet = PatternSet(regex_patterns, binary=True, sources=sources)
+        except re.error as re_err:
+            logger.error(f"Regex error in custom patterns {patternsToAnalyze}: {re_err}")
+            return listOfErrorsInFile, listOfFilesWithNoErrors, {}
+
+    # Timestamps are integer minutes. postgres lines carry their year and glog lines are placed in the year the file
+    # was created in, so the window ("MMDD HH:MM", without a year) is placed there too: the end next to the creation
+    # time, and the start before the end, in the previous year if the window runs over a new year
+    createdAt = getLogFileCreationTime(logFile)
+    if args.end_time:
+        end_time = placeInYear(end_time, createdAt)
+    start_time = placeInYear(start_time, end_time if args.end_time else createdAt)
+    if start_time > end_time:
+        start_time = start_time.replace(year=start_time.year - 1)
+    getTime = LogTimeParser(createdAt.year, createdAt.month)
+    startTime = toLogMinute(start_time)
+    endTime = toLogMinute(end_time)
+    previousTime = toLogMinute(datetime.datetime(createdAt.year, 1, 1)) # Default time
     logger.info("Analyzing file {}".format(logFile))
     barChartJSON = {}
-    if logFile.endswith(".gz"):
-        try:
-            logs = gzip.open(logFile, "rt", errors='ignore') # Added errors='ignore' for robustness
-        except EOFError:
-            logger.warning("Got EOF Exception while reading file {}, skipping the file".format(logFile))
-            # Return the initialized (empty) lists
-            return listOfErrorsInFile, listOfFilesWithNoErrors, barChartJSON
-        except Exception as e: # Catch other potential gzip errors
-             logger.error(f"Error opening gzipped file {logFile}: {e}")
-             return listOfErrorsInFile, listOfFilesWithNoErrors, barChartJSON
-    else:
-        try:
-            logs = open(logFile, "r", errors='ignore') # Added errors='ignore' for robustness
-        except Exception as e:
-            logger.error(f"Error opening file {logFile}: {e}")
-            return listOfErrorsInFile, listOfFilesWithNoErrors, barChartJSON
 
     try:
-        # Read line by line for potentially large files and better time filtering
+        # Scan the file block by block, only the matching lines are timestamped
         results = {}
-        for line in logs: # Iterate directly over the file object
-            try:
-                timeFromLog = getTimeFromLog(line, previousTime)
-                # Update previousTime for the *next* line's potential relative parsing
-                previousTime = timeFromLog.strftime("%m%d %H:%M")
-            except Exception as e:
-                 # If timestamp parsing fails for a line, log it and potentially skip the line
-                 logger.debug(f"Could not parse timestamp for line in {logFile}: {line.strip()}. Error: {e}")
-                 continue # Skip this line
-
+        for patternIds, timeFromLog in scanLogFile(logFile, patternSet, getTime, previousTime, endTime):
             # Filter based on time range
-            if timeFromLog > end_time:
+            if timeFromLog > endTime:
                 logger.debug("Reached end time {} in file {}, stopping analysis for this file.".format(end_time.strftime('%m%d %H:%M'), logFile))
                 break # Stop processing lines in this file
-            if timeFromLog < start_time:
+            if timeFromLog < startTime:
                 continue # Skip lines before the start time
+            time_str = formatLogMinute(timeFromLog) # Use consistent variable name
 
             # Process the line if within the time range
-            for message, pattern in regex_patterns.items():
-                try:
-                    match = re.search(pattern, line, re.IGNORECASE)
-                    if match:
-                        # Populate results
-                        if message not in results:
-                            results[message] = {
-                                "numOccurrences": 0,
-                                "firstOccurrenceTime": None,
-                                "lastOccurrenceTime": None,
-                            }
-                        results[message]["numOccurrences"] += 1
-                        time_str = timeFromLog.strftime('%m%d %H:%M') # Use consistent variable name
-                        if not results[message]["firstOccurrenceTime"]:
-                            results[message]["firstOccurrenceTime"] = time_str
-                        results[message]["lastOccurrenceTime"] = time_str
-                        # Use setdefault to avoid checking if message exists every time
-                        listOfErrorsInFile.append(message) # Append to the local list
-
-                        # Create JSON for bar chart
-                        hour = time_str[:-3] # Gets MMdd HH
-                        barChartJSON.setdefault(message, {})
-                        barChartJSON[message].setdefault(hour, 0)
-                        barChartJSON[message][hour] += 1
-                except re.error as re_err:
-                    logger.error(f"Regex error for pattern '{pattern}' on line in {logFile}: {re_err}")
-                    # Optionally remove the problematic pattern to avoid repeated errors
-                    # del regex_patterns[message]
-                    break # Stop checking patterns for this line
+            for patternId in patternIds:
+                message = patternSet.names[patternId]
+                # Populate results
+                if message not in results:
+                    results[message] = {
+                        "numOccurrences": 0,
+                        "firstOccurrenceTime": None,
+                        "lastOccurrenceTime": None,
+                    }
+                results[message]["numOccurrences"] += 1
+                if not results[message]["firstOccurrenceTime"]:
+                    results[message]["firstOccurrenceTime"] = time_str
+                results[message]["lastOccurrenceTime"] = time_str
+                # Use setdefault to avoid checking if message exists every time
+                listOfErrorsInFile.append(message) # Append to the local list
+
+                # Create JSON for bar chart
+                hour = time_str[:-3] # Gets MMdd HH
+                barChartJSON.setdefault(message, {})
+                barChartJSON[message].setdefault(hour, 0)
+                barChartJSON[message][hour] += 1
 
         # --- Processing after reading lines ---
         # Ensure listOfErrorsInFile contains unique errors if needed (depends on desired output)
@@ -531,8 +531,8 @@ def analyze_log_files(logFile, outputFile, start_time=None, end_time=None):
             # Append to the local list for this file if no errors were found
             listOfFilesWithNoErrors.append(logFile)
 
-    except UnicodeDecodeError as e:
-        logger.warning("Skipping file {} due to UnicodeDecodeError: {}".format(logFile, e))
+    except EOFError:
+        logger.warning("Got EOF Exception while reading file {}, skipping the file".format(logFile))
         # Return the initialized (empty) lists
         return [], [], {} # Return empty lists/dict explicitly
     except Exception as e:
@@ -540,13 +540,6 @@ def analyze_log_files(logFile, outputFile, start_time=None, end_time=None):
         logger.error(e, exc_info=True) # Log full traceback for debugging
         # Return the initialized (empty) lists
         return [], [], {} # Return empty lists/dict explicitly
-    finally:
-        if 'logs' in locals() and logs: # Ensure logs was opened and not already closed
-             try:
-                 logs.close()
-             except Exception as e:
-                 logger.warning(f"Error closing file {logFile}: {e}")
-
 
     logger.info("Finished analyzing file {}".format(logFile))
     # Return the populated local lists and the barchart data for this file
@@ -1,37 +1,63 @@
 #!/usr/bin/env python3
-from multiprocessing import Pool, Lock, Manager
+from multiprocessing import Pool
+from multiprocessing.pool import ThreadPool
 from colorama import Fore, Style
-from analyzer_lib import (
-    universe_regex_patterns,
-    universe_solutions,
-    pg_regex_patterns,
-    pg_solutions,
-    solutions,
-    htmlHeader,
-    htmlFooter,
-    barChart1,
-    barChart2,
-)
+from analyzer_lib import loadLogConfig
 from log_lib import (
-    getTimeFromLog,
     getFileMetadata,
     filterLogFilesByNode,
     filterLogFilesByTime,
     filterLogFilesByType,
+    scanLogFile,
+    LogTimeParser,
+    toLogMinute,
+    formatLogMinute,
+    findStartOffset,
+    getTimeIndexCheckpoints,
+    makeTimeIndexEntry,
+    LOG_TYPES,
+    LOG_TYPE_PROCESSES,
+    routePatternsBySeverity,
+    getLogFileWork,
+    getLineRanges,
+    formatEpochSeconds,
+    fromEpochSeconds,
+    placeInYear,
+    parseBundleNameTime,
+    getFileKey,
+    getStaleLogFiles,
+    getNextRotatedFiles,
+    writeJSONFile,
+    loadMetadataStore,
+    saveMetadataStore,
+)
+from bundle_lib import (
+    isArchive,
+    extractArchive,
+    MemberSelector,
+    buildBundleIndex,
+    spoolBundleMembers,
+    iterSpooledLogFiles,
+    LocalFiles,
+    BundleFiles,
+    BundleInventory,
+    getInstanceUUID,
 )
-from collections import OrderedDict
+from histogram_lib import MinuteCounts
+from config import LOG_RANGE_SIZE, CACHE_DIR_NAME, CHART_LEVEL_MINUTES, CHART_MAX_BARS
+from collections import OrderedDict, Counter
 import logging
 import datetime
 import argparse
 import re
 import os
-import tabulate
 import tarfile
-import gzip
+import shutil
 import colorama
 import json
 import sys
 import itertools
+import functools
 import time
 import threading
 
@@ -76,64 +102,81 @@ parser.add_argument("-n", "--nodes", metavar="LIST", help="List of nodes to anal
 parser.add_argument("-o", "--output", metavar="FILE", dest="output_file", help="Output file name")
 parser.add_argument("-p", "--parallel", metavar="N", dest='numThreads', default=5, type=int, help="Run in parallel mode with N threads")
 parser.add_argument("--skip_tar", action="store_true", help="Skip tar file")
+parser.add_argument("--in_place", action="store_true", help="Analyze the support bundle in place, without extracting it")
 parser.add_argument("-t", "--from_time", metavar= "MMDD HH:MM", dest="start_time", help="Specify start time in quotes")
 parser.add_argument("-T", "--to_time", metavar= "MMDD HH:MM", dest="end_time", help="Specify end time in quotes")
+parser.add_argument("--render", metavar="FILE", help="Render the report again from the results file of an earlier run, without reading any logs \n Filters (-t, -T, --nodes, --types) can only narrow the earlier run \n Example: --render 2024-04-12-15-12-37_analysis.results.json.gz")
 parser.add_argument("--histogram-mode", dest="histogram_mode", metavar="LIST", help="List of errors to generate histogram \n Example: --histogram-mode 'error1,error2,error3'")
-args = parser.parse_args()
 
-# Validated start and end time format
-if args.start_time:
-    try:
-        datetime.datetime.strptime(args.start_time, "%m%d %H:%M")
-    except ValueError as e:
-        print("Incorrect start time format, should be MMDD HH:MM")
+# Set by main(), and in the pool workers by initWorker()
+args = None
+start_time = None
+end_time = None
+logFilesMetadata = {}
+logConfig = None
+choosenTypes = None
+yugabyteVersion = None
+
+def parseArguments():
+    # Parses and validates the command line, returns the arguments and the start and end time
+    args = parser.parse_args()
+
+    if args.in_place and not args.support_bundle:
+        print("--in_place requires a support bundle (-s)")
         exit(1)
-if args.end_time:
-    try:
-        datetime.datetime.strptime(args.end_time, "%m%d %H:%M")
-    except ValueError as e:
-        print("Incorrect end time format, should be MMDD HH:MM")
+    if args.render and (args.support_bundle or args.directory):
+        print("--render reads the results of an earlier run, it cannot be combined with -s or -d")
         exit(1)
 
-# 7 days ago from today
-seven_days_ago = datetime.datetime.now() - datetime.timedelta(days=7)
-seven_days_ago = seven_days_ago.strftime("%m%d %H:%M")
-# If not start time then set it to today - 7 days in "MMDD HH:MM" format
-start_time = datetime.datetime.strptime(args.start_time, "%m%d %H:%M") if args.start_time else datetime.datetime.strptime(seven_days_ago, "%m%d %H:%M")
-end_time = datetime.datetime.strptime(args.end_time, "%m%d %H:%M") if args.end_time else datetime.datetime.now()
+    # Validated start and end time format
+    if args.start_time:
+        try:
+            datetime.datetime.strptime(args.start_time, "%m%d %H:%M")
+        except ValueError as e:
+            print("Incorrect start time format, should be MMDD HH:MM")
+            exit(1)
+    if args.end_time:
+        try:
+            datetime.datetime.strptime(args.end_time, "%m%d %H:%M")
+        except ValueError as e:
+            print("Incorrect end time format, should be MMDD HH:MM")
+            exit(1)
 
-# Define the lists to store the results
-listOfErrorsInAllFiles = []
-listOfErrorsInFile = []
-listOfFilesWithNoErrors = []
-listOfAllFilesWithNoErrors = []
+    # 7 days ago from today
+    seven_days_ago = datetime.datetime.now() - datetime.timedelta(days=7)
+    seven_days_ago = seven_days_ago.strftime("%m%d %H:%M")
+    # If not start time then set it to today - 7 days in "MMDD HH:MM" format
+    start_time = datetime.datetime.strptime(args.start_time, "%m%d %H:%M") if args.start_time else datetime.datetime.strptime(seven_days_ago, "%m%d %H:%M")
+    end_time = datetime.datetime.strptime(args.end_time, "%m%d %H:%M") if args.end_time else datetime.datetime.now()
+    return args, start_time, end_time
 
-# Define JSONs
-histogramJSON = {}
+# Setup a logger, its handlers are added by setupLogging
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.DEBUG)
 
-barChartJSONLock = Lock()
-hagenAIJSONLock = Lock()
+def setupLogging(args):
+    formatter = logging.Formatter('%(asctime)s:%(levelname)s:- %(message)s')
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    console_handler.setFormatter(formatter)
+    logger.addHandler(console_handler)
 
-# Define lock for writing to file
-lock = Lock()
+    if args.directory:
+        log_file = os.path.join(args.directory, 'analyzer.log')
+    else:
+        log_file = 'analyzer.log'
+    file_handler = logging.FileHandler(log_file)
+    file_handler.setLevel(logging.DEBUG)
+    file_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
 
-# Setup a logger
-logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
-formatter = logging.Formatter('%(asctime)s:%(levelname)s:- %(message)s')
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-console_handler.setFormatter(formatter)
-logger.addHandler(console_handler)
-
-if args.directory:
-    log_file = os.path.join(args.directory, 'analyzer.log')
-else:
-    log_file = 'analyzer.log'
-file_handler = logging.FileHandler(log_file)
-file_handler.setLevel(logging.DEBUG)
-file_handler.setFormatter(formatter)
-logger.addHandler(file_handler)
+def initWorker(workerState):
+    # Pool initializer, gives each analysis worker the command line, time window, log files metadata, compiled
+    # patterns and YugabyteDB version once, so that workers started with spawn or forkserver do not parse the command line and log_conf.yml again
+    global args, start_time, end_time, logFilesMetadata, logConfig, yugabyteVersion
+    args, start_time, end_time, logFilesMetadata, logConfig, yugabyteVersion = workerState
+    if not logger.handlers:
+        setupLogging(args)
 
 # Function to display the rotating spinner
 def spinner():
@@ -145,101 +188,71 @@ def spinner():
         time.sleep(0.1)
     sys.stdout.write('\rDone!     \n')
 
-# Function to write to file
-def writeToFile(file, content):
-    lock.acquire()
-    with open(file, "a") as f:
-        f.write(content)
-    lock.release()
-
-# Function to get all the tar files
-def getArchiveFiles(logDirectory):
-    archievedFiles = []
-    for root, dirs, files in os.walk(logDirectory):
-        for file in files:
-            if file.endswith(".tar.gz") or file.endswith(".tgz"):
-                archievedFiles.append(os.path.join(root,file))
-    return archievedFiles
-
-def extractTarFile(file):
-    logger.info("Extracting file {}".format(file))
-    with tarfile.open(file, "r:gz") as tar:
-        # extract to filename directory
-        tar.extractall(os.path.dirname(file))
-
-def getTserverMasterList(logFilesMetadata):
-    tserverList = []
-    masterList = []
-    for logFile in logFilesMetadata:
-        if logFilesMetadata[logFile]["logType"] == "yb-tserver":
-            tserverList.append(logFilesMetadata[logFile]["nodeName"])
-        elif logFilesMetadata[logFile]["logType"] == "yb-master":
-            masterList.append(logFilesMetadata[logFile]["nodeName"])
+def getTserverMasterList(logFilesMetadata, inventory):
+    tserverList = [logFilesMetadata[logFile]["nodeName"] for logFile in inventory.getLogFiles("yb-tserver") if logFile in logFilesMetadata]
+    masterList = [logFilesMetadata[logFile]["nodeName"] for logFile in inventory.getLogFiles("yb-master") if logFile in logFilesMetadata]
     return tserverList, masterList
 
-def getNodeDirectory(logFilesMetadata, nodeName):
-    for logFile in logFilesMetadata:
-        if logFilesMetadata[logFile]["nodeName"] == nodeName:
-            # Extract the directory path up to the node directory
-            nodeDir = os.path.dirname(logFile)
-            while nodeDir and not nodeDir.endswith(nodeName):
-                nodeDir = os.path.dirname(nodeDir)
-            if nodeDir.endswith(nodeName):
-                return nodeDir
-    return None
-
-def getNodeDetails(logFilesMetadata):
+def readInstanceUUID(instanceFile, files):
+    try:
+        return getInstanceUUID(files.read(instanceFile))
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read the uuid of {instanceFile}: {e}")
+        return "-"
+
+# Function to get the uuids of the instance files, decoded in the threads of a pool and cached in cachedUUIDs
+def getInstanceUUIDs(instanceFiles, files, cachedUUIDs):
+    instanceUUIDs = {}
+    uncachedFiles = []
+    for instanceFile in instanceFiles:
+        fileKey = files.getKey(instanceFile)
+        cached = cachedUUIDs.get(instanceFile)
+        if cached and cached[0] == fileKey:
+            instanceUUIDs[instanceFile] = cached[1]
+        else:
+            uncachedFiles.append((instanceFile, fileKey))
+    if uncachedFiles:
+        with ThreadPool(processes=args.numThreads) as pool:
+            uuids = pool.map(functools.partial(readInstanceUUID, files=files), [instanceFile for instanceFile, fileKey in uncachedFiles])
+        for (instanceFile, fileKey), uuid in zip(uncachedFiles, uuids):
+            cachedUUIDs[instanceFile] = [fileKey, uuid]
+            instanceUUIDs[instanceFile] = uuid
+    return instanceUUIDs
+
+def getNodeDetails(logFilesMetadata, inventory, files=LocalFiles(), cachedUUIDs=None):
     tserverUUID = masterUUID = placement  = numTablets = ''
     nodeDetails = {}
-    tserverList, masterList = getTserverMasterList(logFilesMetadata)
+    tserverList, masterList = getTserverMasterList(logFilesMetadata, inventory)
     nodeList = set(tserverList + masterList)
-    UUIDPattern = re.compile(r'^[a-f0-9]{32}$', re.IGNORECASE)
+    # Get the uuids of the instance files of all the nodes at once
+    instanceFiles = []
+    for node in nodeList:
+        nodeFiles = inventory.nodeFiles.get(inventory.nodeDirs.get(node), {})
+        instanceFiles += [nodeFiles[name] for name in ("tserver/instance", "master/instance") if name in nodeFiles]
+    instanceUUIDs = getInstanceUUIDs(instanceFiles, files, {} if cachedUUIDs is None else cachedUUIDs)
     for node in nodeList:
-        nodeDir = getNodeDirectory(logFilesMetadata, node)
-        if os.path.exists(nodeDir):
+        nodeDir = inventory.nodeDirs.get(node)
+        if nodeDir is not None:
+            nodeFiles = inventory.nodeFiles.get(nodeDir, {})
             # Get the number of tablets
-            tabletMetaDir = os.path.join(nodeDir, "tserver", "tablet-meta")
-            if os.path.exists(tabletMetaDir):
-                # Get the number of files with regex UUID
-                numTablets = len([f for f in os.listdir(tabletMetaDir) if UUIDPattern.match(f)])
-            else:
-                numTablets = 0
+            numTablets = inventory.tabletCounts.get(nodeDir, 0)
                 
-            # Get the tserver UUID
-            tserverInstanceFile = os.path.join(nodeDir, "tserver", "instance")
-            if os.path.exists(tserverInstanceFile):
-                rawData = os.popen("yb-pbc-dump " + tserverInstanceFile).readlines()
-                for line in rawData:
-                    if line.startswith("uuid:"):
-                        tserverUUID = line.split(":")[1].strip().replace('"','')
-                        break
-            else:
-                tserverUUID = "-"
-                
-            # Get the master UUID
-            masterInstanceFile = os.path.join(nodeDir, "master", "instance")
-            if os.path.exists(masterInstanceFile):
-                rawData = os.popen("yb-pbc-dump " + masterInstanceFile).readlines()
-                for line in rawData:
-                    if line.startswith("uuid:"):
-                        masterUUID = line.split(":")[1].strip().replace('"','')
-                        break
-            else:
-                masterUUID = "-"
+            # Get the tserver and master UUID
+            tserverUUID = instanceUUIDs.get(nodeFiles.get("tserver/instance"), "-")
+            masterUUID = instanceUUIDs.get(nodeFiles.get("master/instance"), "-")
             
             # Get the placement details
-            gflagsFile = os.path.join(nodeDir, "tserver", "conf", "server.conf")
+            gflagsFile = nodeFiles.get("tserver/conf/server.conf")
             cloud = region = zone = "-"
-            if os.path.exists(gflagsFile):
-                with open(gflagsFile, "r") as f:
-                    for line in f:
-                        if line.__contains__("placement_cloud"):
-                            cloud = line.split("=")[1].strip()
-                        if line.__contains__("placement_region"):
-                            region = line.split("=")[1].strip()
-                        if line.__contains__("placement_zone"):
-                            zone = line.split("=")[1].strip()
-                    placement = f"{cloud}.{region}.{zone}"
+            if gflagsFile:
+                for line in files.read(gflagsFile).decode().splitlines():
+                    if line.__contains__("placement_cloud"):
+                        cloud = line.split("=")[1].strip()
+                    if line.__contains__("placement_region"):
+                        region = line.split("=")[1].strip()
+                    if line.__contains__("placement_zone"):
+                        zone = line.split("=")[1].strip()
+                placement = f"{cloud}.{region}.{zone}"
             else:
                 placement = "-"
         else:
@@ -256,29 +269,26 @@ def getNodeDetails(logFilesMetadata):
         nodeDetails[node]["NumTablets"] = numTablets
     return nodeDetails
 
-def getGFlags(logFilesMetadata):
+def getGFlags(logFilesMetadata, inventory, files=LocalFiles()):
     masterGFlags = {}
     tserverGFlags = {}
-    masterNode = tserverNode = None
-    # Get the master and tserver node
-    for logFile in logFilesMetadata:
-        if logFilesMetadata[logFile]["logType"] == "yb-master":
-            masterNode = logFilesMetadata[logFile]["nodeName"]
-        elif logFilesMetadata[logFile]["logType"] == "yb-tserver":
-            tserverNode = logFilesMetadata[logFile]["nodeName"]
+    # Get the master and tserver node, the last ones in log file order
+    tserverList, masterList = getTserverMasterList(logFilesMetadata, inventory)
+    masterNode = masterList[-1] if masterList else None
+    tserverNode = tserverList[-1] if tserverList else None
     # Get the gflags for master and tserver
     if masterNode:
-        gFlagFile = getNodeDirectory(logFilesMetadata, masterNode) + "/master/conf/server.conf"
-        if os.path.exists(gFlagFile):
-            for line in open(gFlagFile, "r"):
+        gFlagFile = inventory.nodeFiles.get(inventory.nodeDirs.get(masterNode), {}).get("master/conf/server.conf")
+        if gFlagFile:
+            for line in files.read(gFlagFile).decode().splitlines():
                 if line.startswith("--"):
                     key = line.split("=")[0].strip().replace("--", "")
                     value = line.split("=")[1].strip()
                     masterGFlags[key] = value
     if tserverNode:
-        gFlagFile = getNodeDirectory(logFilesMetadata, tserverNode) + "/tserver/conf/server.conf"
-        if os.path.exists(gFlagFile):
-            for line in open(gFlagFile, "r"):
+        gFlagFile = inventory.nodeFiles.get(inventory.nodeDirs.get(tserverNode), {}).get("tserver/conf/server.conf")
+        if gFlagFile:
+            for line in files.read(gFlagFile).decode().splitlines():
                 if line.startswith("--"):
                     key = line.split("=")[0].strip().replace("--", "")
                     value = line.split("=")[1].strip()
@@ -291,174 +301,264 @@ def getGFlags(logFilesMetadata):
     allGFlags = {k: v for k, v in allGFlags.items() if not k.startswith("placement_")}
     return allGFlags
                 
-# Function to extract all the tar files    
-def extractAllTarFiles(logDirectory):
+def getMemberSelector():
+    # The support bundle members this run needs
+    logTypes = [LOG_TYPES[t] for t in choosenTypes if t in LOG_TYPES]
+    nodes = args.nodes.split(",") if args.nodes else None
+    # Rotated log files created after the end time are skipped only when the year of the end time is known, from the
+    # time the bundle was collected at
+    collectedAt = parseBundleNameTime(args.support_bundle or args.directory)
+    endTime = placeInYear(end_time, collectedAt) if args.end_time and collectedAt else None
+    return MemberSelector(logTypes, nodes, endTime)
+
+# Function to extract the needed files of the nested archives in parallel
+def extractArchives(archives):
+    extractArchiveWithSelector = functools.partial(extractArchive, selector=getMemberSelector())
+    logger.info("Extracting {} archives with {} workers".format(len(archives), args.numThreads))
     extractedFiles = []
-    extractedAll = False
-    while not extractedAll:
-        extractedAll = True
-        for file in getArchiveFiles(logDirectory):
-            extractedAll = False
-            if file not in extractedFiles:
-                logger.info("Extracting file {}".format(file))
-                with tarfile.open(file, "r:gz") as tar:
-                    try:
-                        tar.extractall(os.path.dirname(file))
-                    except EOFError:
-                        logger.warning("Got EOF Exception while extracting file {}, File might have still extracted. Please check {} for more information ".format(file, log_file))
-                        logger.error("EOF Exception while extracting file {}".format(file))
-                extractedFiles.append(file)
-        if len(extractedFiles) >= len(getArchiveFiles(logDirectory)):
-            extractedAll = True
-
-def getLogFilesToAnalyze():
-    logFiles = []
+    with Pool(processes=args.numThreads) as pool:
+        # In archive order, so that the extracted files are listed the same way on every run
+        for numExtracted, extracted in enumerate(pool.imap(extractArchiveWithSelector, archives), 1):
+            logger.info("Extracted {} of {} archives ({} files)".format(numExtracted, len(archives), len(extracted)))
+            extractedFiles.extend(extracted)
+    return extractedFiles
+
+# Function to list the log files and the node files of the logs to analyze, in one pass over them
+def getBundleInventory():
+    inventory = BundleInventory()
     if args.directory:
+        inventory.scan(args.directory)
         if not args.skip_tar:
-            extractAllTarFiles(args.directory)
-        for root, dirs, files in os.walk(args.directory):
-            for file in files:
-                if file.__contains__("INFO") or file.__contains__("postgres") and file[0] != ".":
-                    logFiles.append(os.path.join(root, file))
+            inventory.addFiles(extractArchives(list(inventory.archives)))
     if args.support_bundle:
         if args.support_bundle.endswith(".tar.gz") or args.support_bundle.endswith(".tgz"):
+            extractedDir = args.support_bundle.replace(".tar.gz", "").replace(".tgz", "")
             if not args.skip_tar:
-                extractTarFile(args.support_bundle)
-                extractedDir = args.support_bundle.replace(".tar.gz", "").replace(".tgz", "")
-                # Exctract the tar files in extracted directory
-                extractAllTarFiles(extractedDir)
-            for root, dirs, files in os.walk(extractedDir):
-                for file in files:
-                    if file.__contains__("INFO") or file.__contains__("postgres") and file[0] != ".":
-                        full_path = os.path.abspath(os.path.join(root, file))
-                        # Append the files with the absolute path
-                        logFiles.append(full_path)
+                # Extract the needed files and node archives of the bundle, then the node archives in parallel
+                logger.info("Extracting file {}".format(args.support_bundle))
+                extracted = extractArchive(args.support_bundle, getMemberSelector(), walkNested=False)
+                extractArchives([file for file in extracted if isArchive(file)])
+            # With absolute paths
+            inventory.scan(os.path.abspath(extractedDir))
         else:
             logger.error("Invalid support bundle file format. Please provide a .tar.gz or .tgz file")
             exit(1)
-    return logFiles
+    return inventory
 
-def getTimeFromLog(line,previousTime):
-    if line[0] in ['I','W','E','F']:
-        try:
-            timeFromLogStr = line.split(" ")[0][1:] + " " + line.split(" ")[1][:5]
-            timestamp = datetime.datetime.strptime(timeFromLogStr, "%m%d %H:%M")
-        except Exception as e:
-            timestamp = datetime.datetime.strptime(previousTime, "%m%d %H:%M")
-    else:
-        try:
-            timeFromLogStr = line.split(" ")[0] + " " + line.split(" ")[1]
-            timestamp = datetime.datetime.strptime(timeFromLogStr, "%Y-%m-%d %H:%M:%S.%f")
-            timestamp = timestamp.strftime("%m%d %H:%M")
-            timestamp = datetime.datetime.strptime(timestamp, "%m%d %H:%M")
-        except Exception as e:
-            timestamp = datetime.datetime.strptime(previousTime, "%m%d %H:%M")
-    return timestamp
+def getFileMetadataTask(task):
+    # Builds the metadata of a (logFile, nextLogFile) in a worker, keyed by the file state it was built from
+    logFile, nextLogFile = task
+    try:
+        fileKey = getFileKey(logFile)
+        metadata = getFileMetadata(logFile, nextLogFile=nextLogFile)
+    except Exception as e:
+        logger.error(f"Error getting metadata for file {logFile}: {e}")
+        return logFile, None
+    if metadata:
+        metadata["fileKey"] = fileKey
+    return logFile, metadata
+
+def getCacheFile(name):
+    # Caches are kept next to the support bundle, or inside the log directory, so that each bundle has its own
+    if args.support_bundle:
+        bundle = os.path.abspath(args.support_bundle)
+        return os.path.join(os.path.dirname(bundle), CACHE_DIR_NAME, os.path.basename(bundle) + "." + name)
+    return os.path.join(os.path.abspath(args.directory), CACHE_DIR_NAME, name)
+
+def getBundleKey():
+    # Identifies what the metadata store describes, a bundle analyzed in place is only described as a whole
+    if args.in_place:
+        bundle = os.path.abspath(args.support_bundle)
+        return [bundle] + getFileKey(bundle)
+    return [os.path.abspath(args.support_bundle or args.directory)]
 
 def getLogFileType(logFilesMetadata, logFile):
     return logFilesMetadata[logFile]["logType"]
 
-def openLogFile(logFile):
-    try:
-        if logFile.endswith(".gz"):
-            with gzip.open(logFile, "rt") as f:
-                lines = f.readlines()
-            return lines
-        else:
-            with open(logFile, "r") as f:
-                lines = f.readlines()
-            return lines
-    except Exception as e:
-        logger.error("Error opening log file {}: {}".format(logFile, e))
-        return []
+def getPatterns(logFile):
+    # Returns the {message: regex} patterns in scope for the process and YugabyteDB version of the log file, and their compiled pattern set
+    process = LOG_TYPE_PROCESSES.get(logFilesMetadata[logFile]["logType"])
+    return logConfig.getPatterns(process, yugabyteVersion)
 
-def analyzeLogFile(logFile, outputFile, logFilesMetadata):
-    barChartJSON = {}
-    results = {}
-    nodeName = logFilesMetadata[logFile]["nodeName"]
-    nodeDetails = {}
-    nodeDetails[nodeName] = {}
-    logFileName = os.path.basename(logFile)
-    if logFileName.__contains__("postgresql"):
-        regex_patterns = pg_regex_patterns
-    elif logFileName.__contains__("tserver") or logFileName.__contains__("master"):
-        regex_patterns = universe_regex_patterns
-    else:
+@functools.lru_cache(maxsize=None)
+def getPatternSubset(logFile, patternNames):
+    # Compiles the given patterns of the log file type only, for files whose other patterns are cached
+    patterns, patternSet = getPatterns(logFile)
+    return logConfig.makePatternSet({name: patterns[name] for name in patternNames})
+
+def getPatternSet(logFile, patternNames=None):
+    patterns, patternSet = getPatterns(logFile)
+    if patternSet is None or patternNames is None or len(patternNames) == len(patternSet):
+        return patternSet
+    return getPatternSubset(logFile, tuple(patternNames))
+
+def getLogTimeParser(logFile):
+    # glog timestamps have no year, they are placed in the year the log file starts in (from its metadata)
+    logStartsAt = fromEpochSeconds(logFilesMetadata[logFile]["logStartsAt"])
+    return LogTimeParser(logStartsAt.year, logStartsAt.month)
+
+def analyzeLogFile(logFile, timeIndexEntry=None, logStream=None, byteRange=None, patternNames=None):
+    # Finds the known errors in a log file, or in a (start, end) byte range of it, only for patternNames if given
+    # Returns the MinuteCounts of the matching lines, the updated time index entry, and the error that stopped reading
+    # the file or None, the counts then only cover the lines read before it
+    minuteCounts = {}
+    patternSet = getPatternSet(logFile, patternNames)
+    if patternSet is None:
         logger.error("Invalid log file type for file {}".format(logFile))
-        return listOfErrorsInFile, listOfFilesWithNoErrors, barChartJSON
+        return MinuteCounts(), timeIndexEntry, None
 
-    logger.info("Analyzing log file: {}".format(logFile))
-    previousTime = '0101 00:00'  # Default time
+    logger.info("Analyzing log file: {}{}".format(logFile, " bytes {}-{}".format(*byteRange) if byteRange else ""))
+    # Timestamps are integer minutes, glog timestamps are placed in the year the log file starts in
+    getTime = getLogTimeParser(logFile)
+    startTime = toLogMinute(start_time)
+    endTime = toLogMinute(end_time)
+    previousTime = toLogMinute(datetime.datetime(getTime.year, 1, 1))  # Default time
 
-    # Open the log file and process it line by line
-    try:
-        if logFile.endswith(".gz"):
-            logFileHandle = gzip.open(logFile, "rt")
-        else:
-            logFileHandle = open(logFile, "r")
-    except Exception as e:
-        logger.error("Error opening log file {}: {}".format(logFile, e))
-        return listOfErrorsInFile, listOfFilesWithNoErrors, barChartJSON
+    # Seek to the start_time using the time index, and record checkpoints for the next run
+    # Support bundle members read in place are streams, they are read from the top
+    checkpoints, startOffset, endOffset = None, 0, None
+    if logStream is None:
+        try:
+            checkpoints = getTimeIndexCheckpoints(timeIndexEntry, logFile, getTime.year)
+            startOffset = findStartOffset(logFile, startTime, getTime, checkpoints)
+        except (OSError, ValueError) as e:
+            logger.warning("Could not use the time index for file {}: {}".format(logFile, e))
+            checkpoints, startOffset = {}, 0
+        if startOffset:
+            logger.debug("Seeking to offset {} for start time {} in file {}".format(startOffset, formatLogMinute(startTime), logFile))
+    if byteRange:
+        startOffset, endOffset = max(startOffset, byteRange[0]), byteRange[1]
+        if startOffset >= endOffset:
+            return MinuteCounts(), timeIndexEntry, None
 
-    with logFileHandle as f:
-        for line in f:
-            timeFromLog = getTimeFromLog(line, previousTime)
-            previousTime = timeFromLog.strftime("%m%d %H:%M")
+    # The counts are returned by message id (see LogConfig.message_ids), the parent maps them to names once
+    messageIds = [logConfig.message_ids[name] for name in patternSet.names]
 
+    # Scan the log file block by block, only the matching lines are timestamped
+    try:
+        for patternIds, timeFromLog in scanLogFile(logStream or logFile, patternSet, getTime, previousTime, endTime, startOffset, checkpoints, endOffset):
             # Skip lines before the start_time
-            # if timeFromLog < start_time:       # TODO: Need to check if this is correct, For some reason, It is not working on lincoln 
-                # continue 
+            if timeFromLog < startTime:
+                continue
 
             # Stop processing after the end_time
-            if timeFromLog > end_time:
+            if timeFromLog > endTime:
                 logger.info("Reached end time: {}. Stopping analysis for file: {}".format(end_time.strftime("%m%d %H:%M"), logFile))
                 break
 
-            for message, regex in regex_patterns.items():
-                match = re.search(regex, line, re.IGNORECASE)
-                if match:
-                    if message not in results:
-                        results[message] = {
-                            "count": 0,
-                            "first_occurrence": None,
-                            "last_occurrence": None,
-                        }
-                    results[message]["count"] += 1
-                    time = timeFromLog.strftime("%m%d %H:%M")
-                    if results[message]["first_occurrence"] is None:
-                        results[message]["first_occurrence"] = time
-                    results[message]["last_occurrence"] = time
-                    listOfErrorsInFile.append(message)
-                    hour = time[:-3]
-                    barChartJSON.setdefault(message, {})
-                    barChartJSON[message].setdefault(hour, 0)
-                    barChartJSON[message][hour] += 1
-                    nodeDetails[nodeName][message] = {}
-                    nodeDetails[nodeName][message]["count"] = results[message]["count"]
-                    nodeDetails[nodeName][message]["first_occurrence"] = results[message]["first_occurrence"]
-                    nodeDetails[nodeName][message]["last_occurrence"] = results[message]["last_occurrence"]
-                    nodeDetails[nodeName][message]["solution"] = getSolution(message)
-
-    table = []
-    for message, details in results.items():
-        table.append([message, details["count"], details["first_occurrence"], details["last_occurrence"]])
-    if table:
-        formatLogFileHTMLId = logFile.replace("/", "_").replace(".", "_").replace(" ", "_").replace(":", "_")
-        content = f"""
-        <h4 id={formatLogFileHTMLId}> Log File: {logFile} </h4>
-        """
-        content += tabulate.tabulate(table, headers=["Error Message", "Count", "First Occurrence", "Last Occurrence"], tablefmt="html")
-        content = content.replace("$line-break$", "<br>").replace("$tab$", "&nbsp;&nbsp;&nbsp;&nbsp;").replace("$start-code$", "<code>").replace("$end-code$", "</code>").replace("$start-bold$", "<b>").replace("$end-bold$", "</b>").replace("$start-italic$", "<i>").replace("$end-italic$", "</i>").replace("<table>", "<table class='sortable' id='main-table'>")
-        writeToFile(outputFile, content)
-    else:
-        listOfFilesWithNoErrors.append(logFile)
+            for patternId in patternIds:
+                counts = minuteCounts.setdefault(patternId, {})
+                counts[timeFromLog] = counts.get(timeFromLog, 0) + 1
+    except (OSError, EOFError) as e:
+        logger.error("Error reading log file {}: {}".format(logFile, e))
+        return MinuteCounts.fromDict({messageIds[patternId]: counts for patternId, counts in minuteCounts.items()}), timeIndexEntry, str(e)
+    if logFile.endswith(".gz") and checkpoints is not None:
+        timeIndexEntry = makeTimeIndexEntry(logFile, getTime.year, checkpoints)
     logger.info("Finished analyzing log file: {}".format(logFile))
-    return listOfErrorsInFile, listOfFilesWithNoErrors, barChartJSON, nodeDetails
+    return MinuteCounts.fromDict({messageIds[patternId]: counts for patternId, counts in minuteCounts.items()}), timeIndexEntry, None
+
+def summarizeMinuteCounts(logFile, minuteCounts):
+    # Returns the results per message (count, first and last occurrence) of a log file, in order of first occurrence
+    patterns, patternSet = getPatterns(logFile)
+    patternOrder = {logConfig.message_ids[name]: i for i, name in enumerate(patternSet.names)} if patternSet else {}
+    results = {}
+    for messageId, (count, firstMinute, lastMinute) in sorted(minuteCounts.summarize().items(), key=lambda item: (item[1][1], patternOrder.get(item[0], 0))):
+        results[logConfig.message_names[messageId]] = {
+            "count": count,
+            "first_occurrence": formatLogMinute(firstMinute),
+            "last_occurrence": formatLogMinute(lastMinute),
+        }
+    return results
+
+def nameMinuteCounts(minuteCounts):
+    # Returns MinuteCounts kept by message id as {message name: {log minute: count}}
+    return {logConfig.message_names[messageId]: counts for messageId, counts in minuteCounts.toDict().items()}
+
+def nameChartLevel(chartLevel):
+    # The histogram is kept by message id, the report chart shows the message names
+    chartLevel["series"] = {logConfig.message_names[messageId]: series for messageId, series in chartLevel["series"].items()}
+    return chartLevel
+
+def getLogFileNodeDetails(logFile, logFilesMetadata, results):
+    # Returns the node details of the errors found in a log file, for hagenAIJSON
+    nodeName = logFilesMetadata[logFile]["nodeName"]
+    nodeDetails = {}
+    nodeDetails[nodeName] = {}
+    for message, details in results.items():
+        nodeDetails[nodeName][message] = dict(details)
+        nodeDetails[nodeName][message]["solution"] = getSolution(message)
+    return nodeDetails
+
+def analyzeBundleArchive(archive, logFiles, patternNames, spooledFile=None, readError=None):
+    # Analyze the log files of one node archive (or top level log file) of the support bundle, from its copy spooled
+    # out of the bundle by spoolBundleTasks, and remove the copy
+    # The log files an archive error kept from being read are returned with that error
+    results = []
+    if spooledFile is None:
+        return [(logFile, None, (MinuteCounts(), None, readError)) for logFile in logFiles]
+    logger.info("Analyzing {} log files in place from {}".format(len(logFiles), archive))
+    try:
+        for logFile, logStream in iterSpooledLogFiles(archive, spooledFile, logFiles):
+            results.append((logFile, None, analyzeLogFile(logFile, logStream=logStream, patternNames=patternNames[logFile])))
+    except (tarfile.TarError, OSError, EOFError) as e:
+        logger.error("Error reading {} from the support bundle: {}".format(archive, e))
+        readFiles = {logFile for logFile, byteRange, fileResults in results}
+        results.extend((logFile, None, (MinuteCounts(), None, "{}: {}".format(archive, e))) for logFile in logFiles if logFile not in readFiles)
+    finally:
+        os.remove(spooledFile)
+    return results
+
+def spoolBundleTasks(tasks):
+    # Reads the support bundle once, in the thread that hands the tasks to the pool, and gives each analyzeBundleArchive
+    # task the copy of its archive as soon as it is spooled out, so that the workers do not each read the bundle from its start
+    # The tasks of the archives an error kept from being spooled are given that error instead
+    bundle = os.path.abspath(args.support_bundle)
+    spoolDir = getCacheFile("spool")
+    shutil.rmtree(spoolDir, ignore_errors=True)
+    archiveTasks = {task[2][0]: task for task in tasks}
+    readError = "not found in the support bundle"
+    try:
+        for archive, spooledFile in spoolBundleMembers(bundle, list(archiveTasks), spoolDir):
+            work, function, functionArgs = archiveTasks.pop(archive)
+            yield work, function, functionArgs + (spooledFile,)
+    except (tarfile.TarError, OSError, EOFError) as e:
+        logger.error("Error reading the support bundle {}: {}".format(bundle, e))
+        readError = "{}: {}".format(bundle, e)
+    for work, function, functionArgs in archiveTasks.values():
+        yield work, function, functionArgs + (None, readError)
 
-def getVersion(logFilesMetadata):
+def analyzeLogFileTask(logFile, timeIndexEntry, byteRange=None, patternNames=None):
+    return [(logFile, byteRange, analyzeLogFile(logFile, timeIndexEntry, byteRange=byteRange, patternNames=patternNames))]
+
+def runAnalysisTask(task):
+    # Runs a scheduled (work, function, arguments) task in a worker, the function returns [(logFile, byteRange, results)]
+    work, function, functionArgs = task
+    return work, function(*functionArgs)
+
+def iterAnalysisResults(pool, tasks, numFileRanges, scheduleTasks=iter):
+    # Runs the analysis tasks in the pool, in the order scheduleTasks(tasks) hands them out as they can start, and
+    # yields (logFile, minuteCounts, timeIndexEntry, readError) for every log file as soon as it is analyzed. The byte
+    # ranges of split files are merged once they are all done, a file fails when any of its ranges does.
+    totalWork = sum(task[0] for task in tasks) or 1
+    doneWork = 0
+    fileRanges = {}
+    for numTasksDone, (work, fileResults) in enumerate(pool.imap_unordered(runAnalysisTask, scheduleTasks(tasks)), 1):
+        doneWork += work
+        logger.info("Analyzed {} of {} tasks ({}% of the log volume)".format(numTasksDone, len(tasks), doneWork * 100 // totalWork))
+        for logFile, byteRange, (minuteCounts, timeIndexEntry, readError) in fileResults:
+            if byteRange:
+                fileRanges.setdefault(logFile, []).append((minuteCounts, readError))
+                if len(fileRanges[logFile]) < numFileRanges[logFile]:
+                    continue
+                rangeResults = fileRanges.pop(logFile)
+                minuteCounts = functools.reduce(MinuteCounts.merge, (rangeCounts for rangeCounts, rangeError in rangeResults))
+                readError = next((rangeError for rangeCounts, rangeError in rangeResults if rangeError), None)
+            yield logFile, minuteCounts, timeIndexEntry, readError
+
+def getVersion(logFilesMetadata, files=LocalFiles()):
     version = None
     for logFile in logFilesMetadata:
-        lines = openLogFile(logFile)[:10]
+        lines = files.readLines(logFile)
         for line in lines:
             match = re.search(r'version\s+(\d+\.\d+\.\d+\.\d+)', line)
             if match:
@@ -475,32 +575,24 @@ def getSolution(message):
     if args.histogram_mode:
         return "No solution available for custom pattern"
     else:
-        return solutions[message]
+        return logConfig.solutions[message]
     
-if __name__ == "__main__":
-    # Add Command line options and current directory to the htmlFooter
+def main():
+    global args, start_time, end_time, logFilesMetadata, logConfig, choosenTypes, yugabyteVersion, done
+    # Only needed in the parent process, the pool workers do not import them
+    import tabulate
+    from cache_lib import ResultCache, getPatternFingerprint, saveResultsFile, loadResultsFile
+    from histogram_lib import HistogramCube
+    from report_lib import writeReport, getLogFileTables, formatHTMLMessage
+
+    args, start_time, end_time = parseArguments()
+    setupLogging(args)
+    logConfig = loadLogConfig()
+
+    # The command line options and current directory are listed at the end of the report
     cmdLineOptions = vars(args)
     logger.info("Command line options: {}".format(cmdLineOptions))
     currentDir = os.getcwd()
-    cmdLineDetails = """<h2 id=command-line-options> Command Line Options </h2>
-                        <table>
-                        <tr>
-                            <th>Command Line Options</th>
-                            <th>Value</th>
-                        </tr>"""
-    for key, value in cmdLineOptions.items():
-        cmdLineDetails += f"""
-                        <tr>
-                            <td>{key}</td>
-                            <td>{str(value)}</td>
-                        </tr>"""
-    cmdLineDetails += f"""
-                        <tr>
-                            <td>Current Directory</td>
-                            <td>{currentDir}</td>
-                        </tr>
-                    </table>"""
-    htmlFooter = cmdLineDetails + htmlFooter
     dirPaths = []
     outputFilePrefix = datetime.datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
     choosenTypes = args.types.split(",") if args.types else ["pg", "ts", "ms"]
@@ -509,34 +601,86 @@ if __name__ == "__main__":
         outputFile = outputFilePrefix + "_analysis.html"
     else:
         outputFile = args.output_file
-    writeToFile(outputFile, htmlHeader)
     
     # Get Log files to analyze
-    logFiles = getLogFilesToAnalyze()
-    if not logFiles:
-        logger.error("No log files found to analyze")
-        # exit(1)
-    if args.support_bundle or args.directory:
-        # Build one time metadata for all the log files
-        logFilesMetadataFile = 'log_files_metadata.json'
-        if not os.path.exists(logFilesMetadataFile):
-            done = False
-            spinner_thread = threading.Thread(target=spinner)
-            spinner_thread.start()
-            logFilesMetadata = {}
-            for logFile in logFiles:
+    if args.render:
+        # Listed from the results file below
+        logFiles = []
+    elif args.in_place:
+        # Listed from the support bundle member index below
+        logFiles = []
+    else:
+        inventory = getBundleInventory()
+        logFiles = inventory.logFiles
+        if not logFiles:
+            logger.error("No log files found to analyze")
+            # exit(1)
+    if args.support_bundle or args.directory or args.render:
+        if args.render:
+            try:
+                renderedMinuteCounts, logFilesMetadata, renderedWindow, renderedDetails = loadResultsFile(args.render)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading results file {args.render}: {e}")
+                exit(1)
+            logFiles = list(logFilesMetadata.keys())
+            files = LocalFiles()
+            logFilesTimeIndex = {}
+        else:
+            # Metadata of the log files, kept in a store next to the logs and only rebuilt for the files that changed
+            metadataStoreFile = getCacheFile("bundle_index.json" if args.in_place else "metadata.json")
+            bundleKey = getBundleKey()
+            store = loadMetadataStore(metadataStoreFile, bundleKey)
+            if args.in_place and "memberIndex" not in store:
+                # Walk the support bundle once for the log file metadata and the files needed for the node details
+                done = False
+                spinner_thread = threading.Thread(target=spinner)
+                spinner_thread.start()
                 try:
-                    metadata = getFileMetadata(logFile)
-                    if metadata:
-                        logFilesMetadata[logFile] = metadata
-                except Exception as e:
-                    logger.error(f"Error getting metadata for file {logFile}: {e}")
-            done = True
-            spinner_thread.join()
-            with open(logFilesMetadataFile, "w") as f:
-                json.dump(logFilesMetadata, f, default=str)
-        with open(logFilesMetadataFile, "r") as f:
-            logFilesMetadata = json.load(f)
+                    logFilesMetadata, memberIndex = buildBundleIndex(args.support_bundle)
+                except (tarfile.TarError, OSError, EOFError) as e:
+                    logger.error(f"Error reading support bundle {args.support_bundle}: {e}")
+                    exit(1)
+                finally:
+                    done = True
+                    spinner_thread.join()
+                store = {"files": logFilesMetadata, "memberIndex": memberIndex}
+                saveMetadataStore(metadataStoreFile, bundleKey, store)
+            elif not args.in_place:
+                logFilesMetadata = {logFile: store["files"][logFile] for logFile in logFiles if logFile in store["files"]}
+                staleLogFiles = getStaleLogFiles(logFiles, logFilesMetadata)
+                if staleLogFiles or len(logFilesMetadata) != len(store["files"]):
+                    logger.info(f"Building the metadata of {len(staleLogFiles)} of {len(logFiles)} log files")
+                    done = False
+                    spinner_thread = threading.Thread(target=spinner)
+                    spinner_thread.start()
+                    nextRotatedFiles = getNextRotatedFiles(logFiles)
+                    with Pool(processes=args.numThreads) as pool:
+                        for logFile, metadata in pool.imap_unordered(getFileMetadataTask, [(logFile, nextRotatedFiles.get(logFile)) for logFile in staleLogFiles]):
+                            logFilesMetadata.pop(logFile, None)
+                            if metadata:
+                                logFilesMetadata[logFile] = metadata
+                    done = True
+                    spinner_thread.join()
+                    # Keep the order of the log files, the node details and gflags depend on it
+                    logFilesMetadata = {logFile: logFilesMetadata[logFile] for logFile in logFiles if logFile in logFilesMetadata}
+                    store = {"files": logFilesMetadata}
+                    saveMetadataStore(metadataStoreFile, bundleKey, store)
+            logFilesMetadata = store["files"]
+            files = LocalFiles()
+            if args.in_place:
+                memberIndex = store["memberIndex"]
+                files = BundleFiles(memberIndex)
+                inventory = BundleInventory.fromMemberIndex(memberIndex)
+                logFiles = list(logFilesMetadata.keys())
+            # Time index of the log files, lets the analysis seek to the start time
+            logFilesTimeIndexFile = getCacheFile("time_index.json")
+            logFilesTimeIndex = {}
+            if os.path.exists(logFilesTimeIndexFile):
+                try:
+                    with open(logFilesTimeIndexFile, "r") as f:
+                        logFilesTimeIndex = json.load(f)
+                except ValueError as e:
+                    logger.warning(f"Ignoring invalid time index {logFilesTimeIndexFile}: {e}")
         
         logFilesToProcess = list(logFilesMetadata.keys())
         
@@ -557,8 +701,14 @@ if __name__ == "__main__":
             
         # Filter log files by time
         if start_time:
-            start_time = start_time.replace(year=datetime.datetime.now().year)
-            end_time = end_time.replace(year=datetime.datetime.now().year)  
+            # The time window has no year, place it in the year of the logs: the end next to the latest log entry, or
+            # at it without --to_time, and the start before the end, in the previous year if the window runs over a new year
+            latestLogTime = max((fromEpochSeconds(logFilesMetadata[logFile]["logEndsAt"]) for logFile in logFilesToProcess), default=None)
+            if latestLogTime:
+                end_time = placeInYear(end_time, latestLogTime) if args.end_time else latestLogTime
+            start_time = placeInYear(start_time, end_time)
+            if start_time > end_time:
+                start_time = start_time.replace(year=start_time.year - 1)
             logger.info(f"Filtering log files by time: {start_time} - {end_time}")
             includedLogFiles, removedFiles = filterLogFilesByTime(logFilesToProcess, logFilesMetadata, start_time, end_time)
             logFilesToProcess = [logFile for logFile in logFilesToProcess if logFile not in removedFiles]
@@ -570,14 +720,17 @@ if __name__ == "__main__":
             exit(1)
         table = []
         for file in logFilesToProcess:
-            table.append([file[-100:], logFilesMetadata[file]["logStartsAt"], logFilesMetadata[file]["logEndsAt"], logFilesMetadata[file]["logType"], logFilesMetadata[file]["nodeName"]])
+            table.append([file[-100:], formatEpochSeconds(logFilesMetadata[file]["logStartsAt"]), formatEpochSeconds(logFilesMetadata[file]["logEndsAt"]), logFilesMetadata[file]["logType"], logFilesMetadata[file]["nodeName"]])
         table.sort(key=lambda x: (x[4], x[3], x[1]))  # Sort by Node Name, Type, then Start Time
         print(tabulate.tabulate(table, headers=["File", "Start Time", "End Time", "Type", "Node Name"], tablefmt="simple_grid"))
         
         # Get version
-        version = getVersion(logFilesMetadata)
-        if version:
-            writeToFile(outputFile, f"<h2> YugabyteDB Version: {version} </h2>")
+        if args.render:
+            version = renderedDetails["version"]
+        else:
+            version = getVersion(logFilesMetadata, files)
+        # Selects the messages of log_conf.yml scoped to this version
+        yugabyteVersion = version
         
         # Writh version to localHagenAIJSON
         hagenAIJSON = {}
@@ -586,25 +739,19 @@ if __name__ == "__main__":
         # Get the node details
         logger.info("Getting node details")
         try:
-            nodeDetails = getNodeDetails(logFilesMetadata)
+            if args.render:
+                nodeDetails = renderedDetails["nodeDetails"]
+            else:
+                # The uuids of the instance files are kept in the metadata store
+                cachedUUIDs = store.setdefault("instanceUUIDs", {})
+                previousUUIDs = dict(cachedUUIDs)
+                nodeDetails = getNodeDetails(logFilesMetadata, inventory, files, cachedUUIDs)
+                if cachedUUIDs != previousUUIDs:
+                    saveMetadataStore(metadataStoreFile, bundleKey, store)
         except Exception as e:
             logger.error(f"Error getting node details: {e}")
             nodeDetails = None
         if nodeDetails is not None:
-            totalTablets = sum([details["NumTablets"] for details in nodeDetails.values()])
-            content = "<h2 id=node-details> Node Details </h2>"
-            content += "<table class='sortable' id='node-details-table'>"
-            content += "<tr><th>Node Name</th><th>Master UUID</th><th>TServer UUID</th><th>Placement</th><th>Num Tablets</th></tr>"
-            for node, details in nodeDetails.items():
-                # Calculate the percentage of tablets
-                try:
-                    percentage = round((int(details["NumTablets"]) / totalTablets) * 100)
-                except ZeroDivisionError:
-                    percentage = 0
-                content += f"<tr><td>{node}</td><td>{details['masterUUID']}</td><td>{details['tserverUUID']}</td><td>{details['placement']}</td><td>{details['NumTablets']} ({percentage}%)</td></tr>"
-            content += "</table>"
-            writeToFile(outputFile, content)
-            
             # Add the node details to localHagenAIJSON (default to empty with "")
             hagenAIJSON["nodeDetails"] = {}
             for node, details in nodeDetails.items():
@@ -619,7 +766,7 @@ if __name__ == "__main__":
         # Get the gflags
         logger.info("Getting gflags")
         try:
-            allGFlags = getGFlags(logFilesMetadata)
+            allGFlags = renderedDetails["gflags"] if args.render else getGFlags(logFilesMetadata, inventory, files)
         except Exception as e:
             logger.error(f"Error getting gflags: {e}")
             allGFlags = {"master": {}, "tserver": {}}
@@ -628,43 +775,130 @@ if __name__ == "__main__":
         hagenAIJSON["gflags"]["master"] = allGFlags["master"]
         hagenAIJSON["gflags"]["tserver"] = allGFlags["tserver"]
 
-        # Get the list of all only the gflags for master and tserver, the keys are the gflags and the values are the values
-        gFlagList = []
-        for gFlag in allGFlags["master"]:
-            gFlagList.append(gFlag)
-        for gFlag in allGFlags["tserver"]:
-            gFlagList.append(gFlag)
-        uniqueGFlags = list(set(gFlagList))
-        content = "<h2 id=gflags> GFlags </h2>"
-        content += "<table class='sortable' id='gflags-table'>"
-        content += "<tr><th>GFlag</th><th>Master Value</th><th>TServer Value</th></tr>"
-        for gFlag in uniqueGFlags:
-            masterValue = allGFlags["master"].get(gFlag, "-")
-            tserverValue = allGFlags["tserver"].get(gFlag, "-")
-            content += f"<tr><td>{gFlag}</td><td>{masterValue}</td><td>{tserverValue}</td></tr>"
-        content += "</table>"
-        writeToFile(outputFile, content)
+        # Get the list of all the gflags of master and tserver, sorted so that reports of the same logs are identical
+        gFlagNames = sorted(set(allGFlags["master"]) | set(allGFlags["tserver"]))
         
         logger.info("Number of files to analyze: {}".format(len(logFilesToProcess)))
                 
-        # Create a pool of workers
-        pool = Pool(processes=args.numThreads)
-        for listOfErrorsInFile, listOfFilesWithNoErrors, barChartJSON, nodeDetails in pool.starmap(analyzeLogFile, [(logFile, outputFile, logFilesMetadata) for logFile in logFilesToProcess]):
-            listOfErrorsInAllFiles = list(set(listOfErrorsInAllFiles + listOfErrorsInFile))
-            listOfAllFilesWithNoErrors = list(set(listOfAllFilesWithNoErrors + listOfFilesWithNoErrors))
-            for key, value in barChartJSON.items():
-                if key in histogramJSON:
-                    for subkey, subValue in value.items():
-                        if subkey in histogramJSON[key]:
-                            histogramJSON[key][subkey] += subValue
-                        else:
-                            histogramJSON[key][subkey] = subValue
-                else:
-                    histogramJSON[key] = value
+        # Kept in the results file, for rendering the report again
+        reportDetails = {"version": version, "nodeDetails": nodeDetails, "gflags": allGFlags}
+        startTime, endTime = toLogMinute(start_time), toLogMinute(end_time)
+        cachedFiles = {}
+        if args.render:
+            if startTime < renderedWindow[0] or endTime > renderedWindow[1]:
+                logger.warning("The results file only covers {} to {}, the report is limited to that window".format(formatLogMinute(renderedWindow[0]), formatLogMinute(renderedWindow[1])))
+            analysisResults = ((logFile, MinuteCounts.fromDict({logConfig.message_ids[message]: counts for message, counts in renderedMinuteCounts[logFile].items()}).between(startTime, endTime), None, None)
+                               for logFile in logFilesToProcess)
+        else:
+            # Scan the WARNING and ERROR files for the patterns of warnings and errors, and the INFO files for the rest
+            patternRoutes = routePatternsBySeverity(logFilesToProcess, logFilesMetadata, logConfig.universe_severities, (start_time, end_time))
+            for logFile, patternNames in patternRoutes.items():
+                # Of the patterns in scope for the process and version of the file
+                patterns, patternSet = getPatterns(logFile)
+                patternRoutes[logFile] = [name for name in patternNames if patterns and name in patterns]
+            logFilesToProcess = [logFile for logFile in logFilesToProcess if patternRoutes.get(logFile, True)]
+            # Only scan the files, and the patterns, the result cache has not seen over this time window
+            resultCache = ResultCache(getCacheFile("results.sqlite"))
+            scannedPatterns = {}
+            # Members of a bundle analyzed in place change with the bundle
+            bundleFileKey = getBundleKey() if args.in_place else None
+            for logFile in logFilesToProcess:
+                patterns, patternSet = getPatterns(logFile)
+                if patternSet is None:
+                    continue
+                try:
+                    fileId = resultCache.getFileId(logFile, bundleFileKey or getFileKey(logFile))
+                except OSError as e:
+                    logger.warning("Not caching the results of {}: {}".format(logFile, e))
+                    if logFile in patternRoutes:
+                        scannedPatterns[logFile] = patternRoutes[logFile]
+                    continue
+                patternNames = patternRoutes.get(logFile, patternSet.names)
+                fingerprints = {name: getPatternFingerprint(name, patterns[name], logConfig.sources.get(name)) for name in patternNames}
+                coveredPatterns = resultCache.getCoveredPatterns(fileId, startTime, endTime)
+                cachedFiles[logFile] = (fileId, fingerprints)
+                scannedPatterns[logFile] = [name for name in patternNames if fingerprints[name] not in coveredPatterns]
+            cachedLogFiles = [logFile for logFile in cachedFiles if not scannedPatterns[logFile]]
+            logger.info("Results of {} of {} log files are cached".format(len(cachedLogFiles), len(logFilesToProcess)))
+
+            # Schedule the largest tasks first, so that a huge file does not start last
+            tasks = []
+            # Large plain files are split into byte ranges analyzed by different workers, the results of the ranges are kept until all are done
+            numFileRanges = {}
+            logFilesToScan = [logFile for logFile in logFilesToProcess if scannedPatterns.get(logFile, True)]
+            if args.in_place:
+                # One task per node archive, and per log file outside of one, each reads its copy spooled out of the bundle
+                archiveLogFiles = OrderedDict()
+                for logFile in logFilesToScan:
+                    archive = memberIndex["archives"][logFile]
+                    archiveLogFiles.setdefault(logFile if archive == memberIndex["bundle"] else archive, []).append(logFile)
+                for archive, archiveFiles in archiveLogFiles.items():
+                    work = sum(getLogFileWork(logFile, logFilesMetadata) for logFile in archiveFiles)
+                    tasks.append((work, analyzeBundleArchive, (archive, archiveFiles, {logFile: scannedPatterns.get(logFile) for logFile in archiveFiles})))
+            else:
+                for logFile in logFilesToScan:
+                    byteRanges = None
+                    if not logFile.endswith(".gz") and getLogFileWork(logFile, logFilesMetadata) > LOG_RANGE_SIZE:
+                        try:
+                            byteRanges = getLineRanges(logFile, LOG_RANGE_SIZE, getLogTimeParser(logFile))
+                        except (OSError, ValueError) as e:
+                            logger.warning("Could not split log file {}: {}".format(logFile, e))
+                    if byteRanges and len(byteRanges) > 1:
+                        numFileRanges[logFile] = len(byteRanges)
+                        for byteRange in byteRanges:
+                            tasks.append((byteRange[1] - byteRange[0], analyzeLogFileTask, (logFile, None, byteRange, scannedPatterns.get(logFile))))
+                    else:
+                        work = getLogFileWork(logFile, logFilesMetadata)
+                        tasks.append((work, analyzeLogFileTask, (logFile, logFilesTimeIndex.get(logFile), None, scannedPatterns.get(logFile))))
+            tasks.sort(key=lambda task: task[0], reverse=True)
+
+            # Create a pool of workers, and merge the results of each file as soon as it is analyzed, the cached ones first
+            pool = Pool(processes=args.numThreads, initializer=initWorker, initargs=((args, start_time, end_time, logFilesMetadata, logConfig, yugabyteVersion),))
+            cachedResults = ((logFile, MinuteCounts(), None, None) for logFile in cachedLogFiles)
+            analysisResults = itertools.chain(cachedResults, iterAnalysisResults(pool, tasks, numFileRanges, spoolBundleTasks if args.in_place else iter))
+        fileMinuteCounts = {}
+        # Matching lines per message over all the files, and the files without any
+        errorCounts = Counter()
+        filesWithNoErrors = []
+        # Results of the log files with errors, for the report
+        logFileResults = {}
+        # Matching lines per message, node and minute of the window, the bar chart shows them per hour
+        histogramCube = HistogramCube(sorted({logFilesMetadata[logFile]["nodeName"] for logFile in logFilesToProcess}), startTime, endTime)
+        # Log files that could not be read to the end, their counts are incomplete and are not cached
+        unreadFiles = {}
+        # Occurrences are "MMDD HH:MM" within the window, those that sort before its start are in the next year
+        windowStart = formatLogMinute(startTime)
+        occurrenceOrder = lambda occurrence: (occurrence < windowStart, occurrence)
+        for logFile, minuteCounts, timeIndexEntry, readError in analysisResults:
+            if timeIndexEntry:
+                logFilesTimeIndex[logFile] = timeIndexEntry
+            if readError:
+                logger.warning("The results of {} are incomplete, it could not be read to the end: {}".format(logFile, readError))
+                unreadFiles[logFile] = readError
+            if logFile in cachedFiles:
+                fileId, fingerprints = cachedFiles[logFile]
+                if scannedPatterns[logFile] and not readError:
+                    # The window covers the whole file when it covers the start and end times of its metadata
+                    fromMinute = startTime if startTime > toLogMinute(fromEpochSeconds(logFilesMetadata[logFile]["logStartsAt"])) else None
+                    toMinute = endTime if endTime < toLogMinute(fromEpochSeconds(logFilesMetadata[logFile]["logEndsAt"])) else None
+                    scannedCounts = minuteCounts.toDict()
+                    resultCache.storeCounts(fileId, {fingerprints[name]: scannedCounts.get(logConfig.message_ids[name], {}) for name in scannedPatterns[logFile]}, fromMinute, toMinute)
+                messageIds = {fingerprints[name]: logConfig.message_ids[name] for name in fingerprints if name not in scannedPatterns[logFile]}
+                cachedCounts = resultCache.loadCounts(fileId, messageIds, startTime, endTime)
+                minuteCounts = minuteCounts.merge(MinuteCounts.fromDict({messageIds[fingerprint]: counts for fingerprint, counts in cachedCounts.items()}))
+            fileMinuteCounts[logFile] = nameMinuteCounts(minuteCounts)
+            histogramCube.add(logFilesMetadata[logFile]["nodeName"], minuteCounts)
+            results = summarizeMinuteCounts(logFile, minuteCounts)
+            fileNodeDetails = getLogFileNodeDetails(logFile, logFilesMetadata, results)
+            errorCounts.update({message: details["count"] for message, details in results.items()})
+            if results:
+                logFileResults[logFile] = results
+            else:
+                filesWithNoErrors.append(logFile)
             # Add the node details to hagenAIJSON
             try:
-                if nodeDetails:
-                    for node, details in nodeDetails.items():
+                if fileNodeDetails:
+                    for node, details in fileNodeDetails.items():
                         if node not in hagenAIJSON["nodeDetails"]:
                             hagenAIJSON["nodeDetails"][node] = {}
                         for message, messageDetails in details.items():
@@ -676,43 +910,54 @@ if __name__ == "__main__":
                             # Update first_occurrence
                             if (
                                 "first_occurrence" not in nodeMessages[message]
-                                or messageDetails["first_occurrence"] < nodeMessages[message]["first_occurrence"]
+                                or occurrenceOrder(messageDetails["first_occurrence"]) < occurrenceOrder(nodeMessages[message]["first_occurrence"])
                             ):
                                 nodeMessages[message]["first_occurrence"] = messageDetails["first_occurrence"]
                             # Update last_occurrence
                             if (
                                 "last_occurrence" not in nodeMessages[message]
-                                or messageDetails["last_occurrence"] > nodeMessages[message]["last_occurrence"]
+                                or occurrenceOrder(messageDetails["last_occurrence"]) > occurrenceOrder(nodeMessages[message]["last_occurrence"])
                             ):
                                 nodeMessages[message]["last_occurrence"] = messageDetails["last_occurrence"]
                             # Add or update solution
                             nodeMessages[message]["solution"] = getSolution(message)
             except Exception as e:
                 logger.error(f"Error getting node details: {e}")
-                nodeDetails = None
-        pool.close()
-        pool.join()
-        if listOfErrorsInAllFiles:
-            # Create the histogram
-            content = barChart1 + json.dumps(histogramJSON) + barChart2
-            solutionMarkdown = "`"
-            for error in listOfErrorsInAllFiles:
-                solution = getSolution(error)
-                solutionMarkdown += """###{}\n{} \n\n---\n\n""".format(error, solution).replace("`", "\`")
-            solutionMarkdown += "`"
-            content += """<script> htmlGenerateBar = new showdown.Converter();\n"""
-            content += """solutionHtml = htmlGenerator.makeHtml({})\n""".format(solutionMarkdown)
-            content += """document.write(solutionHtml); </script>"""
-            writeToFile(outputFile, content)
-        if listOfAllFilesWithNoErrors:
-            content = "<h2> List of files with no errors </h2>"
-            content += "<table>"
-            for file in listOfAllFilesWithNoErrors:
-                content += f"<tr><td>{file}</td></tr>"
-            content += "</table>"
-            writeToFile(outputFile, content)
-        # Write the footer
-        writeToFile(outputFile, htmlFooter)
+                fileNodeDetails = None
+        if not args.render:
+            pool.close()
+            pool.join()
+            resultCache.close()
+            writeJSONFile(logFilesTimeIndexFile, logFilesTimeIndex)
+        resultsFile = os.path.splitext(outputFile)[0] + ".results.json.gz"
+        saveResultsFile(resultsFile, {logFile: fileMinuteCounts[logFile] for logFile in logFilesToProcess if logFile in fileMinuteCounts}, logFilesMetadata, (startTime, endTime), reportDetails)
+        # Build the report once the analysis is done, the log files in the order they were listed
+        # The tables of the log files and the levels of the chart are kept compact, the report expands them on demand
+        logFileResults = [(logFile, logFileResults[logFile]) for logFile in logFilesToProcess if logFile in logFileResults]
+        messages, tables = getLogFileTables(logFileResults)
+        errors = sorted(errorCounts)
+        reportContext = {
+            "version": version,
+            "nodeDetails": nodeDetails,
+            "gflags": allGFlags,
+            "gFlagNames": gFlagNames,
+            "logFileResults": logFileResults,
+            "messages": messages,
+            "messagesHtml": [formatHTMLMessage(message) for message in messages],
+            "tables": tables,
+            "window": [startTime, endTime],
+            "chartLevels": [nameChartLevel(histogramCube.toChartLevel(minutes)) for minutes in CHART_LEVEL_MINUTES] if errorCounts else [],
+            "chartLevelMinutes": CHART_LEVEL_MINUTES,
+            "chartMaxBars": CHART_MAX_BARS,
+            "solutions": [(error, getSolution(error)) for error in errors],
+            "solutionIds": {error: i for i, error in enumerate(errors)},
+            "filesWithNoErrors": sorted(filesWithNoErrors),
+            "commandLineOptions": cmdLineOptions,
+            "currentDir": currentDir,
+        }
+        writeReport(outputFile, "log_analyser_report.html.j2", reportContext)
+        markdownFile = os.path.splitext(outputFile)[0] + ".md"
+        writeReport(markdownFile, "log_analyser_report.md.j2", reportContext)
         hagenAIJSONFile = "hagen_ai.json"
         with open(hagenAIJSONFile, "w") as f:
             json.dump(hagenAIJSON, f, indent=4)
@@ -751,12 +996,21 @@ if __name__ == "__main__":
             if missingNodes:
                 print(colorama.Fore.RED + f"Controller logs missing for nodes: {', '.join(missingNodes)}")
                 isLogMissing = True
+        # Log files that could not be read to the end
+        if unreadFiles:
+            print(colorama.Fore.RED + f"Could not read {len(unreadFiles)} log files to the end, their results are incomplete:")
+            for logFile, readError in unreadFiles.items():
+                print(colorama.Fore.RED + f"  {logFile}: {readError}")
+            isLogMissing = True
         
         if isLogMissing:
             print(colorama.Fore.YELLOW + "WARNING: If missing logs are reported and if it is suspicious, please check the logs manually.")
         print("=====================================")
         print(f"Log analysis completed. Output file: {outputFile}")
-        print(f"Log files metadata file: {logFilesMetadataFile}")
+        if not args.render:
+            print(f"Log files metadata file: {metadataStoreFile}")
+        print(f"Results file: {resultsFile}")
+        print(f"Markdown report: {markdownFile}")
         print(f"HagenAI JSON file: {hagenAIJSONFile}")
         
     if os.uname()[1] == "lincoln":
@@ -768,3 +1022,6 @@ if __name__ == "__main__":
         logger.info("⌘+Click 👉👉 http://lincoln:7777/" + htmlNameOnServer)
     else:
         logger.info("⌘+Click 👉👉 file://" + os.path.abspath(outputFile) + " to view the analysis")
+
+if __name__ == "__main__":
+    main()
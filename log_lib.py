@@ -2,9 +2,17 @@ import os
 import datetime
 import re
 import gzip
-from collections import deque
+import zlib
+import functools
+import contextlib
+import io
+import mmap
+import json
+from collections import deque, defaultdict
 import logging
 
+from config import SCAN_BLOCK_SIZE, TIME_INDEX_GRANULARITY, GZIP_COMPRESSION_RATIO, METADATA_STORE_VERSION, METADATA_LINES, METADATA_TAIL_SIZE
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 formatter = logging.Formatter('%(asctime)s:%(levelname)s:- %(message)s')
@@ -38,113 +46,679 @@ def getTimeFromLog(line):
     except Exception as e:
         raise ValueError(f"Error parsing timestamp from log line: {line} - {e}")
 
-def getFileMetadata(logFile):
+EPOCH = datetime.datetime(1970, 1, 1)
+# --types values and the log types they select
+LOG_TYPES = {"pg": "postgres", "ts": "yb-tserver", "ms": "yb-master", "ybc": "yb-controller"}
+# The process writing each log type, as the messages of log_conf.yml are scoped
+LOG_TYPE_PROCESSES = {"yb-master": "master", "yb-tserver": "tserver", "postgres": "postgres", "yb-controller": "controller"}
+# glog writes every line to the file of its severity and to the files of the lower severities (a warning goes to the
+# WARNING and INFO files), so the subtypes that hold all the lines of a severity, smallest first
+SEVERITY_SUBTYPES = {"I": ("INFO",), "W": ("WARNING", "INFO"), "E": ("ERROR", "WARNING", "INFO"), "F": ("ERROR", "WARNING", "INFO")}
+# Log types written by glog, with one file per severity
+GLOG_TYPES = ("yb-master", "yb-tserver")
+# glog file names end with the time the file was created at and the pid: ...log.INFO.20230521-144322.3601(.gz)
+GLOG_FILE_NAME_TIME = re.compile(r'\.(\d{8}-\d{6})\.\d+(?:\.gz)?$')
+# postgres log file names end with the time the file was created at: postgresql-2023-05-21_000000.log(.gz)
+POSTGRES_FILE_NAME_TIME = re.compile(r'-(\d{4}-\d{2}-\d{2}_\d{6})\.log(?:\.gz)?$')
+# Support bundle names end with the time the bundle was collected at: yb-support-bundle-<universe>-20240412151237.872-logs(.tar.gz)
+BUNDLE_NAME_TIME = re.compile(r'-(\d{8})(\d{6})?(?:\.\d+)?-logs(?:\.tar\.gz|\.tgz)?$')
+
+def toLogMinute(timestamp):
+    """
+    Converts a datetime to the integer minute used for log timestamps (minutes since 1970-01-01, seconds dropped).
+    """
+    return (timestamp.replace(second=0, microsecond=0) - EPOCH) // datetime.timedelta(minutes=1)
+
+def fromLogMinute(minute):
+    """
+    Converts an integer log minute back to a datetime.
+    """
+    return EPOCH + datetime.timedelta(minutes=minute)
+
+@functools.lru_cache(maxsize=65536)
+def formatLogMinute(minute):
+    """
+    Formats an integer log minute as "MMDD HH:MM", the format used in the reports.
+    """
+    return fromLogMinute(minute).strftime("%m%d %H:%M")
+
+def toEpochSeconds(timestamp):
+    """
+    Converts a datetime to whole seconds since 1970-01-01, the format of the log file start and end times in the metadata.
+    """
+    return (timestamp.replace(microsecond=0) - EPOCH) // datetime.timedelta(seconds=1)
+
+def fromEpochSeconds(seconds):
+    """
+    Converts seconds since 1970-01-01 back to a datetime.
+    """
+    return EPOCH + datetime.timedelta(seconds=seconds)
+
+def placeInYear(timestamp, reference):
+    """
+    Returns a timestamp whose year is unknown (e.g. from a glog line or a "MMDD HH:MM" argument) in the year,
+    around the year of the reference datetime, that puts it closest to the reference.
+    """
+    candidates = []
+    for year in (reference.year - 1, reference.year, reference.year + 1):
+        try:
+            candidates.append(timestamp.replace(year=year))
+        except ValueError:
+            # February 29th
+            continue
+    return min(candidates, key=lambda candidate: abs(candidate - reference), default=timestamp)
+
+def formatEpochSeconds(seconds):
+    """
+    Formats seconds since 1970-01-01 as "YYYY-MM-DD HH:MM:SS".
+    """
+    return fromEpochSeconds(seconds).strftime('%Y-%m-%d %H:%M:%S')
+
+class LogTimeParser:
+    """
+    Parses the timestamp prefix of raw (bytes) glog and postgres log lines into integer log minutes.
+    Both formats are fixed width, so the fields are sliced at fixed offsets instead of splitting the line:
+        glog:     IMMDD HH:MM:SS.ffffff ...    (e.g. I0923 14:23:45.123456 12345 file.cc:123] log message)
+        postgres: YYYY-MM-DD HH:MM:SS.fff ...  (e.g. 2023-09-23 14:23:45.123 UTC [12345] LOG:  log message)
+    Consecutive lines mostly share their minute, so the value parsed for each "MMDD HH:MM" / "YYYY-MM-DD HH:MM"
+    prefix is cached and most lines cost one slice and one dict lookup.
+    glog lines carry no year, so they are placed in the given year, or in the next one for the months before
+    startMonth, so that a log file started in December runs on into January. postgres lines keep their own year.
+    Args:
+        year (int): The year to place the glog timestamps in.
+        startMonth (int): The month the log file starts in.
+    """
+    def __init__(self, year, startMonth=1):
+        self.year = year
+        self.startMonth = startMonth
+        self.cache = {}
+
+    def __call__(self, line):
+        """
+        Returns the log minute of the line, or None if the line does not start with a timestamp.
+        """
+        if line[:1] in (b'I', b'W', b'E', b'F'):
+            prefix = line[1:11]
+        else:
+            prefix = line[:16]
+        try:
+            return self.cache[prefix]
+        except KeyError:
+            pass
+        minute = None
+        try:
+            if len(prefix) == 10 and prefix[4:5] == b' ' and prefix[7:8] == b':':
+                month = int(prefix[0:2])
+                year = self.year + 1 if month < self.startMonth else self.year
+                minute = toLogMinute(datetime.datetime(year, month, int(prefix[2:4]), int(prefix[5:7]), int(prefix[8:10])))
+            elif len(prefix) == 16 and prefix[4:5] == b'-' and prefix[10:11] == b' ' and prefix[13:14] == b':':
+                minute = toLogMinute(datetime.datetime(int(prefix[0:4]), int(prefix[5:7]), int(prefix[8:10]), int(prefix[11:13]), int(prefix[14:16])))
+        except ValueError:
+            minute = None
+        self.cache[prefix] = minute
+        return minute
+
+def readLogBlocks(logFile, blockSize=SCAN_BLOCK_SIZE, startOffset=0, endOffset=None):
+    """
+    Reads a plain or gzipped log file in blocks of about blockSize bytes that always end on a line boundary.
+    The partial line at the end of a read is carried over to the next block.
+    Args:
+        logFile (str): The path to the log file, or an already open binary (and decompressed) stream to read from its current position.
+        blockSize (int): The number of bytes to read at a time.
+        startOffset (int): The (uncompressed) offset of the line to start reading from, only for paths.
+        endOffset (int): The (uncompressed) offset of the line to stop reading at, or None to read to the end.
+    Yields:
+        bytes: The next block of complete lines.
+    """
+    if not isinstance(logFile, str):
+        opened = contextlib.nullcontext(logFile)
+    elif logFile.endswith('.gz'):
+        opened = gzip.open(logFile, 'rb')
+    else:
+        opened = open(logFile, 'rb')
+    with opened as logs:
+        if startOffset:
+            # gzip seeks forward by decompressing and discarding, which is still much cheaper than scanning
+            logs.seek(startOffset)
+        remainder = b''
+        remaining = endOffset - startOffset if endOffset is not None else None
+        while True:
+            chunk = logs.read(blockSize if remaining is None else min(blockSize, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            cut = chunk.rfind(b'\n')
+            if cut == -1:
+                remainder += chunk
+                continue
+            yield remainder + chunk[:cut + 1]
+            remainder = chunk[cut + 1:]
+        if remainder:
+            yield remainder
+
+def getLineTime(block, lineStart, getTime, previousTime):
+    """
+    Returns the timestamp of the line starting at lineStart in a bytes block, or of the closest line above it that has one.
+    Multi-line messages (stack traces, dumps) only carry the timestamp on their first line.
+    Falls back to previousTime if no line in the block back to its start has a timestamp.
+    """
+    while True:
+        lineEnd = block.find(b'\n', lineStart)
+        timestamp = getTime(block[lineStart:lineEnd if lineEnd != -1 else len(block)])
+        if timestamp is not None:
+            return timestamp
+        if lineStart == 0:
+            return previousTime
+        lineStart = block.rfind(b'\n', 0, lineStart - 1) + 1
+
+def getTimeIndexCheckpoints(timeIndexEntry, logFile, year):
+    """
+    Returns the checkpoints of the time index entry of a log file, or an empty dict if there are none or they are stale.
+    The time index maps a log file to {"size", "mtime", "year", "checkpoints"}, where checkpoints is a list of
+    [offset, time] pairs: every line before offset is at or before time (an integer log minute in year).
+    Args:
+        timeIndexEntry (dict): The time index entry of the log file, or None.
+        logFile (str): The path to the log file.
+        year (int): The year the log minutes are placed in.
+    Returns:
+        dict: {offset: time}
+    """
+    entry = timeIndexEntry
+    if not entry:
+        return {}
+    try:
+        stat = os.stat(logFile)
+    except OSError:
+        return {}
+    if entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime or entry["year"] != year:
+        return {}
+    return {offset: time for offset, time in entry["checkpoints"]}
+
+def makeTimeIndexEntry(logFile, year, checkpoints):
+    """
+    Builds the time index entry of a log file from the checkpoints recorded by scanLogFile.
+    """
+    stat = os.stat(logFile)
+    return {"size": stat.st_size, "mtime": stat.st_mtime, "year": year, "checkpoints": sorted(checkpoints.items())}
+
+def findStartOffset(logFile, startTime, getTime, checkpoints=None):
+    """
+    Finds the offset of a line at or before the first line of a log file logged at startTime, so that the
+    scan can start there instead of at the top of the file. Lines between the offset and startTime still have to be skipped by the caller.
+    Plain files are binary searched through mmap, gzipped files use the checkpoints recorded by an earlier scan.
+    Args:
+        logFile (str): The path to the log file.
+        startTime (int): The log minute to start from.
+        getTime (callable): Returns the timestamp of a line given as bytes, or None if the line has none.
+        checkpoints (dict): {offset: time} from getTimeIndexCheckpoints.
+    Returns:
+        int: The (uncompressed) offset to start scanning from.
+    """
+    if logFile.endswith('.gz'):
+        return max((offset for offset, time in (checkpoints or {}).items() if time < startTime), default=0)
+    with open(logFile, 'rb') as logs:
+        size = os.fstat(logs.fileno()).st_size
+        if size == 0:
+            return 0
+        with mmap.mmap(logs.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            low, high = 0, size
+            while high - low > TIME_INDEX_GRANULARITY:
+                middle = (low + high) // 2
+                # Timestamp of the first timestamped line after middle, lines without one belong to the line above
+                lineStart = buffer.find(b'\n', middle) + 1
+                timestamp = None
+                while 0 < lineStart < high and timestamp is None:
+                    timestamp = getTime(buffer[lineStart:lineStart + 32])
+                    lineStart = buffer.find(b'\n', lineStart) + 1
+                if timestamp is None or timestamp >= startTime:
+                    high = middle
+                else:
+                    low = middle
+            if low == 0:
+                return 0
+            return buffer.find(b'\n', low) + 1 or size
+
+def getLineRanges(logFile, rangeSize, getTime):
+    """
+    Splits a plain log file into byte ranges of about rangeSize bytes, to be scanned in parallel.
+    Every range starts on a line with a timestamp, so that multi-line messages are never split from their timestamp.
+    gzipped files cannot be started at an offset without decompressing everything before it, so they are not split.
+    Args:
+        logFile (str): The path to the plain log file.
+        rangeSize (int): The approximate size of the ranges in bytes.
+        getTime (callable): Returns the timestamp of a line given as bytes, or None if the line has none.
+    Returns:
+        list: (start, end) offsets of the ranges, in file order.
+    """
+    boundaries = [0]
+    with open(logFile, 'rb') as logs:
+        size = os.fstat(logs.fileno()).st_size
+        if size == 0:
+            return [(0, 0)]
+        with mmap.mmap(logs.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            for offset in range(rangeSize, size, rangeSize):
+                lineStart = buffer.find(b'\n', max(offset, boundaries[-1])) + 1
+                while 0 < lineStart < size and getTime(buffer[lineStart:lineStart + 32]) is None:
+                    lineStart = buffer.find(b'\n', lineStart) + 1
+                if 0 < lineStart < size:
+                    boundaries.append(lineStart)
+    boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+def scanLogFile(logFile, patternSet, getTime, previousTime=None, endTime=None, startOffset=0, checkpoints=None, endOffset=None):
+    """
+    Finds the lines of a log file that match a PatternSet, working on multi-megabyte blocks instead of line by line.
+    Each block is searched as a whole by PatternSet.findLines, and only the lines it returns are split out,
+    confirmed with PatternSet.matchLine and timestamped. The blocks are never decoded, so the PatternSet must
+    be compiled with binary=True.
+    Args:
+        logFile (str): The path to the plain or gzipped log file, or an open binary stream (see readLogBlocks).
+        patternSet (PatternSet): The compiled (binary) patterns to look for.
+        getTime (callable): Returns the timestamp of a line given as bytes, or None if the line has none.
+        previousTime: The timestamp to use for lines before the first timestamped line.
+        endTime: If given, stop reading once a whole block is past this time.
+        startOffset (int): The (uncompressed) offset of the line to start from, see findStartOffset.
+        checkpoints (dict): If given, {offset: time} is recorded in it for every block, see getTimeIndexCheckpoints.
+        endOffset (int): The (uncompressed) offset of the line to stop at, see getLineRanges.
+    Yields:
+        tuple: (pattern ids, timestamp) for every matching line, in file order.
+    """
+    offset = startOffset
+    for block in readLogBlocks(logFile, startOffset=startOffset, endOffset=endOffset):
+        if checkpoints is not None and offset > startOffset and previousTime is not None:
+            checkpoints[offset] = previousTime
+        offset += len(block)
+        for lineStart in patternSet.findLines(block):
+            lineEnd = block.find(b'\n', lineStart)
+            patternIds = patternSet.matchLine(block[lineStart:lineEnd + 1 if lineEnd != -1 else len(block)])
+            if patternIds:
+                yield patternIds, getLineTime(block, lineStart, getTime, previousTime)
+        if block:
+            previousTime = getLineTime(block, block.rfind(b'\n', 0, len(block) - 1) + 1, getTime, previousTime)
+        if endTime is not None and previousTime is not None and previousTime > endTime:
+            break
+
+def getLineDateTime(line, reference):
+    """
+    Returns the timestamp of a log line (str) as a datetime. glog lines carry no year, they are placed in the year
+    that puts them closest to the reference datetime (see placeInYear).
+    Raises:
+        ValueError: If the line does not start with a timestamp.
+    """
+    timestamp = getTimeFromLog(line)
+    if line[0] in ['I', 'W', 'E', 'F']:
+        timestamp = placeInYear(timestamp, reference)
+    return timestamp
+
+def readLogStartTime(logs, reference, numLines=METADATA_LINES):
+    """
+    Returns the timestamp of the first line that has one among the next numLines lines of a binary stream, or None.
+    """
+    for i in range(numLines):
+        line = logs.readline()
+        if not line:
+            break
+        try:
+            return getLineDateTime(line.decode('utf-8', errors='ignore'), reference)
+        except ValueError:
+            continue
+    return None
+
+# gzip member header: magic, deflate method
+GZIP_MEMBER_HEADER = b'\x1f\x8b\x08'
+
+def readLastGzipMember(gzipFile, blockSize=SCAN_BLOCK_SIZE):
+    """
+    Returns the end of the last member of a gzip file made of several members (e.g. appended to with `gzip -c >>`),
+    decoding only that member, or None if the file has a single member.
+    The members are not indexed: member headers are searched for from the end of the compressed file, and the last
+    member is the first candidate from the end that decodes to the end of the file.
+    Args:
+        gzipFile (str): The path to the gzipped file.
+        blockSize (int): About half of the decompressed bytes kept from the end of the member.
+    Returns:
+        bytes: The last blockSize to 2 * blockSize decompressed bytes of the last member (all of it if it is smaller), or None.
+    """
+    with open(gzipFile, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            position = buffer.rfind(GZIP_MEMBER_HEADER)
+            while position > 0:
+                # The reserved flag bits of a real header are 0
+                if not buffer[position + 3] & 0xE0:
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    lastBlocks = deque(maxlen=2)
+                    try:
+                        for start in range(position, len(buffer), blockSize):
+                            lastBlocks.append(decompressor.decompress(buffer[start:start + blockSize]))
+                            if decompressor.eof:
+                                break
+                        if decompressor.eof and not decompressor.unused_data and start + blockSize >= len(buffer):
+                            return b''.join(lastBlocks)
+                    except zlib.error:
+                        pass
+                position = buffer.rfind(GZIP_MEMBER_HEADER, 0, position)
+    return None
+
+def readLogTail(logFile, logs, numLines=METADATA_LINES, gzipFile=None):
+    """
+    Returns the last numLines lines (bytes) of a log file, from the current position of logs on.
+    Plain files are read backwards from the end, starting with the last METADATA_TAIL_SIZE bytes.
+    gzipped files and streams cannot be read backwards, they are read through in blocks and only the last ones are kept.
+    A gzipped file on disk made of several members only has its last member decoded (see readLastGzipMember), a
+    file of a single member is still decoded whole, as the start of a deflate stream is needed to decode its end.
+    Args:
+        logFile (str): The path to the log file.
+        logs: The binary (and decompressed) stream of the log file.
+        numLines (int): The number of lines to return.
+        gzipFile (str): The path of the gzipped log file, when logs decompresses it from disk.
+    Returns:
+        list: The lines, without their line ends.
+    """
+    if gzipFile is not None:
+        tail = readLastGzipMember(gzipFile)
+        if tail is not None:
+            lines = tail.splitlines()
+            if len(lines) > numLines:
+                return lines[-numLines:]
+    if not logFile.endswith('.gz') and logs.seekable():
+        position = logs.tell()
+        end = logs.seek(0, io.SEEK_END)
+        tailSize = METADATA_TAIL_SIZE
+        while True:
+            start = max(position, end - tailSize)
+            logs.seek(start)
+            lines = logs.read(end - start).splitlines()
+            if start > position:
+                # The first line is most likely cut
+                lines = lines[1:]
+            if len(lines) >= numLines or start == position:
+                return lines[-numLines:]
+            tailSize *= 4
+    lastBlocks = deque(readLogBlocks(logs), maxlen=2)
+    return b''.join(lastBlocks).splitlines()[-numLines:]
+
+def getFileMetadata(logFile, logs=None, logSize=None, nextLogFile=None, logMtime=None):
     """
     Extracts metadata from a given log file, including start time, end time, log type, and node name.
+    The times come from the file names when they can: a rotated log file starts at the creation time in its name
+    (see parseLogFileNameTime) and ends at the creation time of the next file of its rotation chain. Both are bounds
+    (at or before the first line, at or after the last one), which is all filtering by time needs, and they carry the year.
+    The file is only opened for the times its name does not tell, e.g. the end of the last file of a chain.
     Args:
         logFile (str): The path to the log file.
+        logs: An open binary (and decompressed) stream to read the log file from instead of opening logFile,
+            e.g. a support bundle member read in place. logFile is then only used for its name.
+        logSize (int): The size of the log file in bytes (as stored, so compressed for .gz files), when logs is given.
+        nextLogFile (str): The next file of the rotation chain of logFile (see getNextRotatedFiles), if any.
+        logMtime (float): The modification time of the log file, when logs is given. glog timestamps of files without
+            a creation time in their name are placed in the year of the modification time.
     Returns:
         dict: A dictionary containing the following keys:
-            - logStartsAt (datetime): The timestamp of the first log entry. Defaults to January 1st, 00:00 if not found.
-            - logEndsAt (datetime): The timestamp of the last log entry. Defaults to December 31st, 23:59 if not found.
+            - logStartsAt (int): The timestamp of the first log entry, in seconds since 1970 (see toEpochSeconds).
+                Defaults to January 1st, 00:00 if not found.
+            - logEndsAt (int): The timestamp of the last log entry, in seconds since 1970. Defaults to December 31st, 23:59 if not found.
             - logType (str): The type of log file (e.g., "postgres", "yb-controller", "yb-tserver", "yb-master", or "unknown").
             - nodeName (str): The name of the node extracted from the file path. Defaults to "unknown" if not found.
+            - logSize (int): The size of the log file in bytes, as stored.
     Raises:
         ValueError: If the log file contains invalid timestamps that cannot be parsed.
         Exception: For any unexpected errors during file processing.   
     """
-    logStartsAt, logEndsAt = None, None
-    if logFile.endswith('.gz'):
-        try:
-            logs = gzip.open(logFile, 'rt')
-        except:
-            print("Error opening file: " + logFile)
-            return None
+    createdAt = parseLogFileNameTime(os.path.basename(logFile))
+    logStartsAt = createdAt
+    logEndsAt = parseLogFileNameTime(os.path.basename(nextLogFile)) if nextLogFile else None
+    if createdAt:
+        reference = createdAt
     else:
         try:
-            logs = open(logFile, 'r')
-        except:
-            print("Error opening file: " + logFile)
-            return None
-    try:
-        # Read first 10 lines to get the start time
-        for i in range(10):
-            line = logs.readline()
-            try:
-                logStartsAt = getTimeFromLog(line)
-                break
-            except ValueError:
-                continue
-        # Read last 10 lines to get the end time
-        last_lines = deque(logs, maxlen=10)
-        for line in reversed(last_lines):
+            reference = datetime.datetime.fromtimestamp(logMtime if logMtime is not None else os.path.getmtime(logFile))
+        except OSError:
+            reference = datetime.datetime.now()
+    if logStartsAt is None or logEndsAt is None:
+        # The name does not tell, read the file
+        gzipFile = logFile if logs is None and logFile.endswith('.gz') else None
+        if logs is not None:
+            opened = contextlib.nullcontext(logs)
+        else:
             try:
-                logEndsAt = getTimeFromLog(line)
-                break
-            except ValueError:
-                continue
-    except Exception as e:
-        print(f"Error processing file: {logFile} - {e}")
-        return None
+                opened = gzip.open(logFile, 'rb') if logFile.endswith('.gz') else open(logFile, 'rb')
+            except OSError:
+                print("Error opening file: " + logFile)
+                return None
+        try:
+            with opened as logs:
+                # Read first 10 lines to get the start time
+                if logStartsAt is None:
+                    logStartsAt = readLogStartTime(logs, reference)
+                # Read last 10 lines to get the end time
+                if logEndsAt is None:
+                    for line in reversed(readLogTail(logFile, logs, gzipFile=gzipFile)):
+                        try:
+                            logEndsAt = getLineDateTime(line.decode('utf-8', errors='ignore'), reference)
+                            break
+                        except ValueError:
+                            continue
+        except Exception as e:
+            print(f"Error processing file: {logFile} - {e}")
+            return None
     
     if not logStartsAt:
-        logStartsAt = datetime.datetime.strptime('0101 00:00', '%m%d %H:%M')
+        logStartsAt = datetime.datetime(reference.year, 1, 1)
     if not logEndsAt:
-        logEndsAt = datetime.datetime.strptime('1231 23:59', '%m%d %H:%M')
-    try:
-        logStartsAt = logStartsAt.replace(year=datetime.datetime.now().year)
-        logEndsAt = logEndsAt.replace(year=datetime.datetime.now().year)
-    except Exception as e:
-        print("Error getting metadata for file: " + logFile + " " + str(e))
+        logEndsAt = datetime.datetime(reference.year, 12, 31, 23, 59)
     
+    if logSize is None:
+        logSize = os.path.getsize(logFile)
+
     # Get the log type
+    logType = getLogType(logFile)
+        
+    # Get the subtype
+    subtype = getLogSubtype(logFile)
+        
+    # Get the node name
+    nodeName = getNodeName(logFile)
+    
+    logger.debug(f"Metadata for file: {logFile} - {logStartsAt} - {logEndsAt} - {logType} - {subtype} - {nodeName}")
+    logStartsAt, logEndsAt = toEpochSeconds(logStartsAt), toEpochSeconds(logEndsAt)
+    return {"logStartsAt": logStartsAt, "logEndsAt": logEndsAt, "logType": logType, "subtype": subtype, "nodeName": nodeName, "logSize": logSize}
+
+def getLogFileWork(logFile, logFileMetadata):
+    """
+    Estimates how much work analyzing a log file is, in uncompressed bytes, for scheduling the largest files first.
+    """
+    logSize = logFileMetadata[logFile].get("logSize")
+    if logSize is None:
+        # Metadata built before the size was recorded
+        try:
+            logSize = os.path.getsize(logFile)
+        except OSError:
+            logSize = 0
+    if logFile.endswith('.gz'):
+        logSize *= GZIP_COMPRESSION_RATIO
+    return logSize
+
+def getFileKey(logFile):
+    """
+    Returns [size, mtime in nanoseconds, inode] of a file, which change whenever the file is replaced or written to.
+    """
+    stat = os.stat(logFile)
+    return [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+
+def getStaleLogFiles(logFiles, logFileMetadata):
+    """
+    Returns the log files that have no metadata yet, or whose size, mtime or inode changed since their metadata was built.
+    """
+    staleLogFiles = []
+    for logFile in logFiles:
+        metadata = logFileMetadata.get(logFile)
+        try:
+            if metadata is None or metadata.get("fileKey") != getFileKey(logFile):
+                staleLogFiles.append(logFile)
+        except OSError:
+            staleLogFiles.append(logFile)
+    return staleLogFiles
+
+def writeJSONFile(path, data):
+    """
+    Writes data as JSON to a temporary file next to path and renames it over path,
+    so that an interrupted run or a concurrent reader never sees a partially written file.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmpPath = "{}.{}.tmp".format(path, os.getpid())
+    try:
+        with open(tmpPath, "w") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmpPath, path)
+    except BaseException:
+        os.unlink(tmpPath)
+        raise
+
+def loadMetadataStore(storeFile, bundleKey):
+    """
+    Loads the metadata store of a support bundle or log directory.
+    Args:
+        storeFile (str): The path to the store.
+        bundleKey (list): Identifies the bundle or directory the store belongs to (see saveMetadataStore).
+    Returns:
+        dict: The saved store, with at least the "files" key holding {log file: metadata}. Empty if the store does not
+            exist, cannot be read, is in another format version or belongs to another bundle.
+    """
+    try:
+        with open(storeFile, "r") as f:
+            store = json.load(f)
+    except FileNotFoundError:
+        return {"files": {}}
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable metadata store {storeFile}: {e}")
+        return {"files": {}}
+    if store.get("version") != METADATA_STORE_VERSION or store.get("bundle") != bundleKey:
+        logger.info(f"Metadata store {storeFile} is stale, rebuilding it")
+        return {"files": {}}
+    return store
+
+def saveMetadataStore(storeFile, bundleKey, store):
+    """
+    Saves a metadata store atomically (see writeJSONFile).
+    Args:
+        storeFile (str): The path to the store.
+        bundleKey (list): Identifies the bundle or directory, e.g. its absolute path, followed by getFileKey of the bundle
+            when the store describes the bundle as a whole rather than the files extracted from it.
+        store (dict): The store, {"files": {log file: metadata}} and anything else to keep with it.
+    """
+    writeJSONFile(storeFile, dict(store, version=METADATA_STORE_VERSION, bundle=bundleKey))
+
+def getLogType(logFile):
+    """
+    Returns the type of a log file from its name: "postgres", "yb-controller", "yb-tserver", "yb-master", "YBA" or "unknown".
+    The directories are left out, a bundle extracted under e.g. /data/postgres-issue/ would otherwise make every file postgres.
+    """
+    logFile = os.path.basename(logFile)
     if "postgres" in logFile:
-        logType = "postgres"
+        return "postgres"
     elif "controller" in logFile:
-        logType = "yb-controller"
+        return "yb-controller"
     elif "tserver" in logFile:
-        logType = "yb-tserver"
+        return "yb-tserver"
     elif "master" in logFile:
-        logType = "yb-master"
+        return "yb-master"
     elif "application" in logFile:
-        logType = "YBA"
-    else:
-        logType = "unknown"
-        
-    # Get the subtype
+        return "YBA"
+    return "unknown"
+
+def getLogSubtype(logFile):
+    """
+    Returns the subtype of a log file from its name: "postgres", "INFO", "ERROR", "WARNING", "FATAL" or "unknown".
+    """
+    logFile = os.path.basename(logFile)
     if "postgres" in logFile:
-        subtype = "postgres"
+        return "postgres"
     elif "INFO" in logFile:
-        subtype = "INFO"
+        return "INFO"
     elif "ERROR" in logFile:
-        subtype = "ERROR"
+        return "ERROR"
     elif "WARNING" in logFile:
-        subtype = "WARNING"
+        return "WARNING"
     elif "FATAL" in logFile:
-        subtype = "FATAL"
-    else:
-        subtype = "unknown"
-        
-        
-    # Get the node name
+        return "FATAL"
+    return "unknown"
+
+def getNodeName(logFile):
+    """
+    Returns the name of the node a log file belongs to from its path, or "unknown".
+    """
     # /Users/pgyogesh/logs/log_analyzer_tests/yb-support-bundle-ybu-p01-bpay-20240412151237.872-logs/yb-prod-ybu-p01-bpay-n8/master/logs/yb-master.danpvvy00002.yugabyte.log.INFO.20230521-030902.3601
     nodeNameRegex = r"/(yb-[^/]*n\d+)/"
     nodeName = re.search(nodeNameRegex, logFile)
     if nodeName:
-        nodeName = nodeName.group().replace("/","")
-    else:
-        nodeName = "unknown"
-    
-    logger.debug(f"Metadata for file: {logFile} - {logStartsAt} - {logEndsAt} - {logType} - {subtype} - {nodeName}")
-    return {"logStartsAt": logStartsAt, "logEndsAt": logEndsAt, "logType": logType, "subtype": subtype, "nodeName": nodeName}
+        return nodeName.group().replace("/","")
+    return "unknown"
+
+def parseLogFileNameTime(fileName):
+    """
+    Returns the time a rotated log file was created at from its name, or None if the name does not have it. e.g.
+        yb-tserver.host.yugabyte.log.INFO.20230521-144322.3601(.gz) was created at 2023-05-21 14:43:22.
+        postgresql-2023-05-21_000000.log(.gz) was created at 2023-05-21 00:00:00.
+    """
+    match = GLOG_FILE_NAME_TIME.search(fileName)
+    timeFormat = '%Y%m%d-%H%M%S'
+    if not match:
+        match = POSTGRES_FILE_NAME_TIME.search(fileName)
+        timeFormat = '%Y-%m-%d_%H%M%S'
+    if not match:
+        return None
+    try:
+        return datetime.datetime.strptime(match.group(1), timeFormat)
+    except ValueError:
+        return None
+
+def parseBundleNameTime(bundlePath):
+    """
+    Returns the time a support bundle was collected at from its name, or None if the name does not have it. e.g.
+        yb-support-bundle-ybu-p01-bpay-20240412151237.872-logs.tar.gz was collected at 2024-04-12 15:12:37.
+        yb-support-bundle-ybu-p01-bpay-20240412-logs was collected by the end of 2024-04-12.
+    """
+    match = BUNDLE_NAME_TIME.search(os.path.basename(os.path.normpath(bundlePath)))
+    if not match:
+        return None
+    try:
+        return datetime.datetime.strptime(match.group(1) + (match.group(2) or '235959'), '%Y%m%d%H%M%S')
+    except ValueError:
+        return None
+
+def getNextRotatedFiles(logFiles):
+    """
+    Orders the log files into rotation chains, the files one process wrote one after the other. The files of a chain
+    are in the same directory and their names only differ by the creation time (and pid) at their end.
+    Args:
+        logFiles (list): The paths to the log files.
+    Returns:
+        dict: {log file: the next file of its rotation chain}, for every log file that is not the last of its chain.
+    """
+    chains = {}
+    for logFile in logFiles:
+        directory, fileName = os.path.split(logFile)
+        match = GLOG_FILE_NAME_TIME.search(fileName) or POSTGRES_FILE_NAME_TIME.search(fileName)
+        if match:
+            chains.setdefault((directory, fileName[:match.start()]), []).append((match.group(1), logFile))
+    nextRotatedFiles = {}
+    for chain in chains.values():
+        chain.sort()
+        for (createdAt, logFile), (nextCreatedAt, nextLogFile) in zip(chain, chain[1:]):
+            nextRotatedFiles[logFile] = nextLogFile
+    return nextRotatedFiles
 
 def filterLogFilesByTime(logFileList, logFileMetadata, start_time, end_time):
     filtered_files = []
     removed_files = []
+    # The metadata holds seconds since 1970, compare them as they are
+    start_time, end_time = toEpochSeconds(start_time), toEpochSeconds(end_time)
     for logFile in logFileList:
-        # Get the start and end time of the log file in datetime format
-        log_start = datetime.datetime.strptime(logFileMetadata[logFile]["logStartsAt"], '%Y-%m-%d %H:%M:%S')
-        log_end = datetime.datetime.strptime(logFileMetadata[logFile]["logEndsAt"], '%Y-%m-%d %H:%M:%S')
+        log_start = logFileMetadata[logFile]["logStartsAt"]
+        log_end = logFileMetadata[logFile]["logEndsAt"]
         if log_start >= end_time or log_end <= start_time:
             removed_files.append(logFile)
         else:
@@ -168,10 +742,8 @@ def filterLogFilesByNode(logFileList, logFileMetadata, nodes):
 def filterLogFilesByType(logFileList, logFileMetadata, types):
     filteredLogFiles = []
     removedLogFiles = []
-    type_map = {"pg": "postgres", "ts": "yb-tserver", "ms": "yb-master", "ybc": "yb-controller"}
-    
     # Get the log types to include
-    selectedTypes = [type_map[t] for t in types if t in type_map]
+    selectedTypes = [LOG_TYPES[t] for t in types if t in LOG_TYPES]
     for logFile in logFileList:
         if logFileMetadata[logFile]["logType"] in selectedTypes:
             filteredLogFiles.append(logFile)
@@ -181,4 +753,68 @@ def filterLogFilesByType(logFileList, logFileMetadata, types):
     filteredLogFiles = [logFile for logFile in filteredLogFiles if not logFile.startswith('.')]
     logger.debug(f"Included files by type: {filteredLogFiles}")
     logger.debug(f"Removed files by type: {removedLogFiles}")
-    return filteredLogFiles, removedLogFiles
\ No newline at end of file
+    return filteredLogFiles, removedLogFiles
+
+def routePatternsBySeverity(logFileList, logFileMetadata, severities, window=None):
+    """
+    Routes the patterns of the glog files to the smallest files that hold every line they can match. A pattern whose
+    minimum severity is W is only scanned for in the WARNING files, a fraction of the size of the INFO files, and the
+    INFO files are only scanned for the I-level patterns. The files of a process (node and log type) are grouped into
+    time ranges of overlapping files, and in a range that the files of a subtype do not cover (e.g. the WARNING files
+    of an old process were rotated away), the patterns fall back to the next larger subtype (see SEVERITY_SUBTYPES).
+    Args:
+        logFileList (list): The log files to analyze.
+        logFileMetadata (dict): {log file: metadata} of the log files.
+        severities (dict): {pattern name: minimum severity, "I", "W", "E" or "F"} of the glog patterns.
+        window (tuple): The (start, end) datetimes of the analysis, only the part of the files inside it has to be covered.
+    Returns:
+        dict: {log file: [names of the patterns to scan it for]} for the glog files, in the order of severities.
+    """
+    windowStart, windowEnd = (toEpochSeconds(window[0]), toEpochSeconds(window[1])) if window else (float('-inf'), float('inf'))
+    processFiles = defaultdict(list)
+    for logFile in logFileList:
+        if logFileMetadata[logFile]["logType"] in GLOG_TYPES:
+            processFiles[(logFileMetadata[logFile]["nodeName"], logFileMetadata[logFile]["logType"])].append(logFile)
+    routes = {}
+    for logFiles in processFiles.values():
+        for logFile in logFiles:
+            routes[logFile] = set()
+        for severity, candidates in SEVERITY_SUBTYPES.items():
+            # The (start, end, subtype, file) ranges of the files that can hold the lines of the severity, in the window
+            ranges = sorted((max(logFileMetadata[logFile]["logStartsAt"], windowStart), min(logFileMetadata[logFile]["logEndsAt"], windowEnd), logFileMetadata[logFile]["subtype"], logFile)
+                            for logFile in logFiles if logFileMetadata[logFile]["subtype"] in candidates)
+            for group in groupOverlappingRanges(ranges):
+                # The smallest subtype that covers the files of the largest one in this time range
+                subtypes = [subtype for subtype in candidates if any(groupSubtype == subtype for start, end, groupSubtype, logFile in group)]
+                reference = [(start, end) for start, end, groupSubtype, logFile in group if groupSubtype == subtypes[-1]]
+                target = next(subtype for subtype in subtypes if coversRanges([(start, end) for start, end, groupSubtype, logFile in group if groupSubtype == subtype], reference))
+                for start, end, groupSubtype, logFile in group:
+                    if groupSubtype == target:
+                        routes[logFile].add(severity)
+    return {logFile: [name for name, severity in severities.items() if severity in routes[logFile]] for logFile in routes}
+
+def groupOverlappingRanges(ranges):
+    """
+    Groups sorted (start, end, ...) ranges into the runs of ranges that overlap one another.
+    """
+    groups = []
+    groupEnd = None
+    for timeRange in ranges:
+        if groupEnd is None or timeRange[0] > groupEnd:
+            groups.append([])
+            groupEnd = timeRange[1]
+        groups[-1].append(timeRange)
+        groupEnd = max(groupEnd, timeRange[1])
+    return groups
+
+def coversRanges(ranges, reference):
+    """
+    Returns whether the union of the (start, end) ranges covers every (start, end) range of reference.
+    """
+    covered = []
+    for start, end in sorted(ranges):
+        if covered and start <= covered[-1][1]:
+            covered[-1][1] = max(covered[-1][1], end)
+        else:
+            covered.append([start, end])
+    return all(any(start <= referenceStart and referenceEnd <= end for start, end in covered) for referenceStart, referenceEnd in reference)
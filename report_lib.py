@@ -0,0 +1,112 @@
+import re
+import functools
+
+import markdown
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup, escape
+
+from config import TEMPLATE_DIR, REPORT_WRITE_BUFFER_SIZE
+
+# Placeholders used by the messages and solutions of log_conf.yml, and what they become in each report format
+MESSAGE_PLACEHOLDERS = {
+    "html": {
+        "$line-break$": "<br>",
+        "$tab$": "&nbsp;&nbsp;&nbsp;&nbsp;",
+        "$start-code$": "<code>",
+        "$end-code$": "</code>",
+        "$start-bold$": "<b>",
+        "$end-bold$": "</b>",
+        "$start-italic$": "<i>",
+        "$end-italic$": "</i>",
+    },
+    "md": {
+        "$line-break$": "<br>",
+        "$tab$": "&nbsp;&nbsp;&nbsp;&nbsp;",
+        "$start-code$": "`",
+        "$end-code$": "`",
+        "$start-bold$": "**",
+        "$end-bold$": "**",
+        "$start-italic$": "*",
+        "$end-italic$": "*",
+    },
+}
+
+def replacePlaceholders(text, markup):
+    for placeholder, replacement in MESSAGE_PLACEHOLDERS[markup].items():
+        text = text.replace(placeholder, replacement)
+    return text
+
+def formatHTMLMessage(message):
+    """
+    Escapes a message for HTML and replaces its placeholders (e.g. $start-code$) with the matching tags.
+    """
+    return Markup(replacePlaceholders(str(escape(message)), "html"))
+
+def formatMarkdownMessage(message):
+    """
+    Replaces the placeholders of a message with Markdown, so that it fits in a table cell.
+    """
+    return replacePlaceholders(str(message), "md").replace("|", "\\|")
+
+def formatHTMLId(logFile):
+    """
+    Returns the HTML id of the section of a log file in the report.
+    """
+    return logFile.replace("/", "_").replace(".", "_").replace(" ", "_").replace(":", "_")
+
+# A list item right after a line of text, Markdown needs a blank line between them to start the list
+LIST_AFTER_TEXT = re.compile(r"^([^\n]*\S[^\n]*)\n((?:[-*+]|\d+\.) )", re.MULTILINE)
+
+@functools.lru_cache(maxsize=None)
+def renderSolution(solution):
+    """
+    Renders the Markdown solution of a message to HTML, once per solution.
+    """
+    solution = LIST_AFTER_TEXT.sub(r"\1\n\n\2", solution)
+    return Markup(markdown.markdown(solution, extensions=["fenced_code", "tables"]))
+
+def getLogFileTables(logFileResults):
+    """
+    Returns the per file tables of the report in a compact form, expanded by the report when a file is opened.
+    Args:
+        logFileResults (list): (log file, {message: {"count", "first_occurrence", "last_occurrence"}}) of every log file with errors.
+    Returns:
+        tuple: (messages, tables), where tables has one list of [message index, count, first occurrence, last occurrence] rows per log file.
+    """
+    messageIds = {}
+    tables = []
+    for logFile, results in logFileResults:
+        tables.append([[messageIds.setdefault(message, len(messageIds)), details["count"], details["first_occurrence"], details["last_occurrence"]]
+                       for message, details in results.items()])
+    return list(messageIds), tables
+
+@functools.lru_cache(maxsize=None)
+def getTemplateEnvironment():
+    """
+    Returns the Jinja2 environment of the report templates, HTML templates are autoescaped.
+    """
+    environment = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        autoescape=select_autoescape(["html", "html.j2"]),
+        trim_blocks=True,
+        lstrip_blocks=True,
+    )
+    environment.filters["htmlMessage"] = formatHTMLMessage
+    environment.filters["markdownMessage"] = formatMarkdownMessage
+    environment.filters["htmlId"] = formatHTMLId
+    environment.filters["solution"] = renderSolution
+    return environment
+
+def writeReport(path, templateName, context):
+    """
+    Renders a report template to a file. The template is generated piece by piece into one buffered writer, so
+    that the report is never held in memory as a whole.
+    Args:
+        path (str): The path to the report.
+        templateName (str): The name of the template, in the templates directory.
+        context (dict): The variables of the template.
+    """
+    template = getTemplateEnvironment().get_template(templateName)
+    with open(path, "w", encoding="utf-8", buffering=REPORT_WRITE_BUFFER_SIZE) as f:
+        for chunk in template.generate(context):
+            f.write(chunk)
@@ -0,0 +1,120 @@
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import analyzer_lib
+from analyzer_lib import PatternSet, loadLogConfig
+
+# Alternations at the top level (with and without a common prefix), groups, classes and case differences
+PATTERNS = {
+    "shared_prefix": "Table foo|Table bar",
+    "no_shared_prefix": "Tablet not found|Leader not ready",
+    "grouped": "Tab(let|le) (split|moved)",
+    "escaped_bar": r"Pipe \| char",
+    "class_bar": "Class[|]bar",
+    "repeated_first": "a+bc",
+    "no_literal": r"\d+ms",
+}
+
+LINES = [
+    "I0521 02:11:58.123456  3601 catalog_manager.cc:10] Table foo created",
+    "I0521 02:11:58.123456  3601 catalog_manager.cc:10] Table bar created",
+    "I0521 02:11:58.123456  3601 catalog_manager.cc:10] TABLE BAR created",
+    "I0521 02:11:58.123456  3601 catalog_manager.cc:10] table baz created",
+    "W0521 02:11:58.123456  3601 tablet_service.cc:10] leader NOT ready",
+    "W0521 02:11:58.123456  3601 tablet_service.cc:10] tablet not found",
+    "I0521 02:11:58.123456  3601 tablet.cc:10] Tablet moved, took 12ms",
+    "I0521 02:11:58.123456  3601 tablet.cc:10] table split",
+    "I0521 02:11:58.123456  3601 tablet.cc:10] pipe | char and class|bar",
+    "I0521 02:11:58.123456  3601 tablet.cc:10] aaaBC",
+    "nothing to see here",
+]
+
+def naiveMatches(patterns, line, flags=re.IGNORECASE):
+    return [i for i, pattern in enumerate(patterns.values()) if re.search(pattern, line, flags)]
+
+class TestPatternSet(unittest.TestCase):
+    def assertMatchesLikeSearch(self, patterns, flags=re.IGNORECASE):
+        for binary in (False, True):
+            patternSet = PatternSet(patterns, flags=flags, binary=binary)
+            block = "\n".join(LINES) + "\n"
+            block = block.encode() if binary else block
+            foundLines = []
+            for lineStart in patternSet.findLines(block):
+                lineEnd = block.find(patternSet.newline, lineStart)
+                ids = patternSet.matchLine(block[lineStart:lineEnd])
+                if ids:
+                    foundLines.append((block[lineStart:lineEnd], ids))
+            expectedLines = []
+            for line in LINES:
+                expected = naiveMatches(patterns, line, flags)
+                self.assertEqual(patternSet.matchLine(line.encode() if binary else line), expected, line)
+                if expected:
+                    expectedLines.append((line.encode() if binary else line, expected))
+            self.assertEqual(foundLines, expectedLines)
+
+    def testMatchesLikeSearchWithoutPrefilter(self):
+        # The pattern without a required literal turns the substring prefilter off
+        self.assertMatchesLikeSearch(PATTERNS)
+
+    def testMatchesLikeSearchWithPrefilter(self):
+        patterns = {name: pattern for name, pattern in PATTERNS.items() if name != "no_literal"}
+        self.assertMatchesLikeSearch(patterns)
+
+    def testMatchesLikeSearchCaseSensitive(self):
+        self.assertMatchesLikeSearch(PATTERNS, flags=0)
+
+    def testTopLevelBranch(self):
+        self.assertTrue(PatternSet.hasTopLevelBranch("Table foo|Table bar"))
+        self.assertTrue(PatternSet.hasTopLevelBranch("a[]|]b|c"))
+        self.assertFalse(PatternSet.hasTopLevelBranch("Tab(let|le)"))
+        self.assertFalse(PatternSet.hasTopLevelBranch(r"a\|b"))
+        self.assertFalse(PatternSet.hasTopLevelBranch("a[|]b"))
+
+    def testSources(self):
+        patterns = {"table": "Table foo|Table bar", "tablet": "tablet not found"}
+        patternSet = PatternSet(patterns, sources={"table": ["catalog_manager.cc"]})
+        self.assertEqual(patternSet.matchLine(LINES[1]), [0])
+        self.assertEqual(patternSet.matchLine(LINES[1].replace("catalog_manager.cc", "tablet.cc")), [])
+        self.assertEqual(patternSet.matchLine(LINES[5]), [1])
+
+class TestLoadLogConfig(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "log_conf.yml")
+        shutil.copy(analyzer_lib.config_path, self.path)
+        self.environment = mock.patch.dict(os.environ, {"XDG_CACHE_HOME": os.path.join(self.directory.name, "cache")})
+        self.environment.start()
+
+    def tearDown(self):
+        self.environment.stop()
+        self.directory.cleanup()
+
+    def testCachedConfigMatchesTheFile(self):
+        parsed = loadLogConfig.__wrapped__(self.path)
+        cachePath = os.path.join(self.directory.name, "cache", "yb-log-analyzer", "log_conf.yml.json")
+        with open(cachePath) as f:
+            self.assertEqual(json.load(f)["key"][1:], [analyzer_lib.hashlib.sha1(open(self.path, "rb").read()).hexdigest()])
+        # The cache is plain data, it is loaded without PyYAML
+        with mock.patch.dict(sys.modules, {"yaml": None}):
+            cached = loadLogConfig.__wrapped__(self.path)
+        for name in ("regex_patterns", "solutions", "universe_severities", "scopes", "sources", "pattern_analysis"):
+            self.assertEqual(getattr(cached, name), getattr(parsed, name), name)
+        self.assertEqual(cached.universe_pattern_set.literals, parsed.universe_pattern_set.literals)
+        self.assertEqual(cached.universe_pattern_set.combined.pattern, parsed.universe_pattern_set.combined.pattern)
+
+    def testChangedFileIsParsedAgain(self):
+        loadLogConfig.__wrapped__(self.path)
+        with open(self.path, "a") as f:
+            f.write("\n# changed\n")
+        with mock.patch.dict(sys.modules, {"yaml": None}):
+            with self.assertRaises(ImportError):
+                loadLogConfig.__wrapped__(self.path)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import datetime
+import gzip
+import io
+import os
+import struct
+import tarfile
+import tempfile
+import unittest
+
+from bundle_lib import BundleInventory, MemberSelector, getInstanceUUID, isLogFile, isArchive, spoolBundleMembers, iterSpooledLogFiles
+
+def makeInstanceFile(uuid, version=1):
+    # A protobuf container holding the supplemental header and an InstanceMetadataPB with the uuid in field 1
+    message = b"\x0a" + bytes([len(uuid)]) + uuid.encode() + b"\x12\x05stamp"
+    header = b"\x0a\x03abc\x12\x15yb.InstanceMetadataPB"
+    data = b"yugacntr" + struct.pack("<I", version) + (b"\x00" * 4 if version >= 2 else b"")
+    for record in (header, message):
+        data += struct.pack("<I", len(record)) + record + struct.pack("<I", 0)
+    return data
+
+class TestInstanceUUID(unittest.TestCase):
+    def testContainerVersions(self):
+        uuid = "0123456789abcdef0123456789abcdef"
+        self.assertEqual(getInstanceUUID(makeInstanceFile(uuid)), uuid)
+        self.assertEqual(getInstanceUUID(makeInstanceFile(uuid, version=2)), uuid)
+
+    def testInvalidFiles(self):
+        with self.assertRaises(ValueError):
+            getInstanceUUID(b"not an instance file")
+        with self.assertRaises(ValueError):
+            getInstanceUUID(makeInstanceFile("0123456789abcdef0123456789abcdef")[:-12])
+
+class TestBundleInventory(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = os.path.join(self.directory.name, "yb-support-bundle-univ-20230521-logs")
+        files = [
+            "yb-prod-univ-n1/master/logs/yb-master.host1.yugabyte.log.INFO.20230521-030902.3601",
+            "yb-prod-univ-n1/master/logs/yb-master.host1.yugabyte.log.WARNING.20230521-030902.3601.gz",
+            "yb-prod-univ-n1/master/instance",
+            "yb-prod-univ-n1/master/conf/server.conf",
+            "yb-prod-univ-n1/tserver/logs/postgresql-2023-05-21_000000.log",
+            "yb-prod-univ-n1/tserver/tablet-meta/0123456789abcdef0123456789abcdef",
+            "yb-prod-univ-n1/tserver/tablet-meta/fedcba9876543210fedcba9876543210",
+            "yb-prod-univ-n2/tserver/logs/yb-tserver.host2.yugabyte.log.INFO.20230521-030902.3601",
+            "yb-prod-univ-n2/tserver/instance",
+            "yb-prod-univ-n3.tar.gz",
+            "README.txt",
+        ]
+        for path in files:
+            path = os.path.join(self.root, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb"):
+                pass
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testScanMatchesWalk(self):
+        inventory = BundleInventory()
+        inventory.scan(self.root)
+        walked = [os.path.join(directory, fileName) for directory, dirNames, fileNames in os.walk(self.root) for fileName in fileNames]
+        self.assertEqual(inventory.logFiles, [path for path in walked if isLogFile(path)])
+        self.assertEqual(inventory.archives, [path for path in walked if isArchive(path)])
+        node1, node2 = os.path.join(self.root, "yb-prod-univ-n1"), os.path.join(self.root, "yb-prod-univ-n2")
+        self.assertEqual(inventory.nodeDirs, {"yb-prod-univ-n1": node1, "yb-prod-univ-n2": node2})
+        self.assertEqual(inventory.nodeFiles[node1], {"master/instance": os.path.join(node1, "master/instance"), "master/conf/server.conf": os.path.join(node1, "master/conf/server.conf")})
+        self.assertEqual(inventory.nodeFiles[node2], {"tserver/instance": os.path.join(node2, "tserver/instance")})
+        self.assertEqual(dict(inventory.tabletCounts), {node1: 2})
+        self.assertEqual([os.path.basename(path) for path in inventory.getLogFiles("yb-master", "WARNING")], ["yb-master.host1.yugabyte.log.WARNING.20230521-030902.3601.gz"])
+        self.assertEqual([os.path.basename(path) for path in inventory.getLogFiles("postgres")], ["postgresql-2023-05-21_000000.log"])
+
+def addMember(tar, name, data):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+class TestSpoolBundleMembers(unittest.TestCase):
+    def testSpooledMembersReadLikeTheBundle(self):
+        with tempfile.TemporaryDirectory() as directory:
+            bundle = os.path.join(directory, "yb-support-bundle-univ-20230521-logs.tar.gz")
+            root = os.path.join(directory, "yb-support-bundle-univ-20230521-logs")
+            nodeArchive = io.BytesIO()
+            with tarfile.open(fileobj=nodeArchive, mode="w:gz") as tar:
+                addMember(tar, "yb-prod-univ-n1/tserver/logs/yb-tserver.host.yugabyte.log.INFO.20230521-030902.3601.gz", gzip.compress(b"I0521 03:09:02.000000  3601 tablet.cc:1] a\n"))
+                addMember(tar, "yb-prod-univ-n1/tserver/instance", b"instance")
+            with tarfile.open(bundle, "w:gz") as tar:
+                addMember(tar, "yb-support-bundle-univ-20230521-logs/yb-prod-univ-n1.tar.gz", nodeArchive.getvalue())
+                addMember(tar, "yb-support-bundle-univ-20230521-logs/postgresql-2023-05-21_000000.log", b"2023-05-21 03:09:02.000 UTC [1] LOG:  b\n")
+            node, postgres = os.path.join(root, "yb-prod-univ-n1.tar.gz"), os.path.join(root, "postgresql-2023-05-21_000000.log")
+            infoFile = os.path.join(root, "yb-prod-univ-n1/tserver/logs/yb-tserver.host.yugabyte.log.INFO.20230521-030902.3601.gz")
+            spoolDir = os.path.join(directory, "spool")
+            spooled = dict(spoolBundleMembers(bundle, [postgres, node], spoolDir))
+            self.assertEqual(set(spooled), {node, postgres})
+            with open(spooled[node], "rb") as f:
+                self.assertEqual(f.read(), nodeArchive.getvalue())
+            self.assertEqual([(path, stream.read()) for path, stream in iterSpooledLogFiles(node, spooled[node], [infoFile])],
+                             [(infoFile, b"I0521 03:09:02.000000  3601 tablet.cc:1] a\n")])
+            self.assertEqual([(path, stream.read()) for path, stream in iterSpooledLogFiles(postgres, spooled[postgres], [postgres])],
+                             [(postgres, b"2023-05-21 03:09:02.000 UTC [1] LOG:  b\n")])
+
+class TestMemberSelector(unittest.TestCase):
+    def testRotatedFilesAfterTheEndTime(self):
+        logs = "yb-support-bundle-univ-20230521-logs/yb-prod-univ-n1/tserver/logs/"
+        selector = MemberSelector(endTime=datetime.datetime(2023, 5, 21, 12, 0))
+        self.assertTrue(selector.selectFile(logs + "yb-tserver.host.yugabyte.log.INFO.20230521-030902.3601"))
+        self.assertFalse(selector.selectFile(logs + "yb-tserver.host.yugabyte.log.INFO.20230521-130902.3601"))
+        # In its real year, a file of the next January is after a December end time
+        selector = MemberSelector(endTime=datetime.datetime(2023, 12, 31, 12, 0))
+        self.assertFalse(selector.selectFile(logs + "yb-tserver.host.yugabyte.log.INFO.20240101-030902.3601"))
+        self.assertTrue(MemberSelector().selectFile(logs + "yb-tserver.host.yugabyte.log.INFO.20240101-030902.3601"))
+
+    def testTypesAndNodes(self):
+        node = "yb-support-bundle-univ-20230521-logs/yb-prod-univ-n1/"
+        selector = MemberSelector(logTypes=["yb-tserver"], nodes=["n2"])
+        self.assertFalse(selector.selectFile(node + "tserver/logs/yb-tserver.host.yugabyte.log.INFO.20230521-030902.3601"))
+        selector = MemberSelector(logTypes=["yb-tserver"], nodes=["n1"])
+        self.assertTrue(selector.selectFile(node + "tserver/logs/yb-tserver.host.yugabyte.log.INFO.20230521-030902.3601"))
+        self.assertFalse(selector.selectFile(node + "master/logs/yb-master.host.yugabyte.log.INFO.20230521-030902.3601"))
+        self.assertTrue(selector.selectFile(node + "master/instance"))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+
+from cache_lib import ResultCache, getPatternFingerprint, saveResultsFile, loadResultsFile
+
+class TestResultCache(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, ".log_analyzer_cache", "results.sqlite")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testCountsSurviveReopening(self):
+        cache = ResultCache(self.path)
+        fileId = cache.getFileId("n1/yb-tserver.INFO", "key1")
+        cache.storeCounts(fileId, {"a": {100: 2, 200: 1}, "b": {}}, 50, 300)
+        cache.close()
+        cache = ResultCache(self.path)
+        self.assertEqual(cache.getFileId("n1/yb-tserver.INFO", "key1"), fileId)
+        self.assertEqual(cache.getCoveredPatterns(fileId, 60, 290), {"a", "b"})
+        self.assertEqual(cache.loadCounts(fileId, ["a", "b"], 60, 150), {"a": {100: 2}})
+        cache.close()
+
+    def testWindowOutsideTheScanIsNotCovered(self):
+        cache = ResultCache(self.path)
+        fileId = cache.getFileId("n1/yb-tserver.INFO", "key1")
+        cache.storeCounts(fileId, {"a": {100: 2}}, 50, 300)
+        cache.storeCounts(fileId, {"b": {100: 1}}, None, None)
+        self.assertEqual(cache.getCoveredPatterns(fileId, 40, 290), {"b"})
+        self.assertEqual(cache.getCoveredPatterns(fileId, 60, 310), {"b"})
+        cache.close()
+
+    def testChangedFileStartsOver(self):
+        cache = ResultCache(self.path)
+        fileId = cache.getFileId("n1/yb-tserver.INFO", "key1")
+        cache.storeCounts(fileId, {"a": {100: 2}}, None, None)
+        fileId = cache.getFileId("n1/yb-tserver.INFO", "key2")
+        self.assertEqual(cache.getCoveredPatterns(fileId, 0, 1000), set())
+        self.assertEqual(cache.loadCounts(fileId, ["a"], 0, 1000), {})
+        cache.close()
+
+    def testFingerprints(self):
+        fingerprint = getPatternFingerprint("a", "Soft memory limit")
+        self.assertEqual(fingerprint, getPatternFingerprint("a", "Soft memory limit"))
+        self.assertNotEqual(fingerprint, getPatternFingerprint("a", "Soft memory limits"))
+        self.assertNotEqual(fingerprint, getPatternFingerprint("a", "Soft memory limit", ["log_cache.cc"]))
+
+class TestResultsFile(unittest.TestCase):
+    def testRoundTrip(self):
+        fileMinuteCounts = {
+            "n1/yb-tserver.INFO": {"a": {100: 2, 160: 1}, "b": {90: 5}},
+            "n2/postgresql.log": {},
+        }
+        logFilesMetadata = {
+            "n1/yb-tserver.INFO": {"nodeName": "n1", "logType": "yb-tserver", "fileKey": "k1"},
+            "n2/postgresql.log": {"nodeName": "n2", "logType": "postgres", "fileKey": "k2"},
+        }
+        details = {"version": "2.18.0.1", "gflags": {"master": {}, "tserver": {"a": "1"}}}
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "report.results.json.gz")
+            saveResultsFile(path, fileMinuteCounts, logFilesMetadata, (50, 300), details)
+            loaded = loadResultsFile(path)
+        self.assertEqual(loaded[0], fileMinuteCounts)
+        self.assertEqual(loaded[1], {logFile: {key: value for key, value in metadata.items() if key != "fileKey"} for logFile, metadata in logFilesMetadata.items()})
+        self.assertEqual(tuple(loaded[2]), (50, 300))
+        self.assertEqual(loaded[3], details)
+
+if __name__ == "__main__":
+    unittest.main()
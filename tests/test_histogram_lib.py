@@ -0,0 +1,76 @@
+import random
+import unittest
+from collections import defaultdict
+
+from histogram_lib import MinuteCounts, HistogramCube
+
+def naiveChartLevel(files, startTime, endTime, minutes):
+    # {message: {bucket index: count}} summed over the nodes, counting every minute within the window
+    firstBucket = startTime - startTime % minutes
+    series = {}
+    for node, minuteCounts in files:
+        for message, counts in minuteCounts.items():
+            buckets = series.setdefault(message, defaultdict(int))
+            for minute, count in counts.items():
+                if startTime <= minute <= endTime:
+                    buckets[(minute - firstBucket) // minutes] += count
+    return {message: [sorted(buckets), [buckets[bucket] for bucket in sorted(buckets)]] for message, buckets in series.items()}
+
+def overlaps(minuteCounts, startTime, endTime):
+    minutes = [minute for counts in minuteCounts.values() for minute in counts]
+    return min(minutes) <= endTime and max(minutes) >= startTime
+
+class TestMinuteCounts(unittest.TestCase):
+    def testDictRoundTrip(self):
+        minuteCounts = {"a": {100: 2, 160: 1}, "b": {90: 5}}
+        self.assertEqual(MinuteCounts.fromDict(minuteCounts).toDict(), minuteCounts)
+
+    def testMergeAndSummarize(self):
+        merged = MinuteCounts.fromDict({"a": {100: 2}}).merge(MinuteCounts.fromDict({"a": {90: 1}, "b": {120: 4}}))
+        self.assertEqual(merged.toDict(), {"a": {90: 1, 100: 2}, "b": {120: 4}})
+        self.assertEqual(merged.summarize(), {"a": (3, 90, 100), "b": (4, 120, 120)})
+        self.assertEqual(merged.between(95, 200).toDict(), {"a": {100: 2}, "b": {120: 4}})
+
+    def testMessageIds(self):
+        # The analyzer keeps the messages by integer id, merging them in any order
+        merged = MinuteCounts.fromDict({3: {100: 2}, 0: {101: 1}}).merge(MinuteCounts.fromDict({7: {90: 1}, 3: {100: 4}}))
+        self.assertEqual(merged.messages, [3, 0, 7])
+        self.assertEqual(merged.toDict(), {3: {100: 6}, 0: {101: 1}, 7: {90: 1}})
+
+    def testEmptyCounts(self):
+        # A file without any match
+        self.assertEqual(MinuteCounts.fromDict({}).summarize(), {})
+        self.assertEqual(MinuteCounts().merge(MinuteCounts()).summarize(), {})
+
+class TestHistogramCube(unittest.TestCase):
+    def testChartLevelsMatchNaiveSums(self):
+        rng = random.Random(7)
+        nodes = ["n1", "n2", "n3"]
+        startTime, endTime = 10_000_030, 10_000_030 + 3 * 24 * 60
+        files = []
+        for _ in range(12):
+            fileStart = rng.randrange(startTime - 600, endTime)
+            messages = rng.sample(["a", "b", "c", "d", "e"], rng.randrange(1, 4))
+            files.append((rng.choice(nodes), {message: {fileStart + rng.randrange(0, 2000): rng.randrange(1, 50) for _ in range(40)} for message in messages}))
+        cube = HistogramCube(nodes, startTime, endTime)
+        for node, minuteCounts in files:
+            cube.add(node, MinuteCounts.fromDict(minuteCounts))
+        for minutes in (24 * 60, 60, 1):
+            level = cube.toChartLevel(minutes)
+            self.assertEqual(level["start"], startTime - startTime % minutes)
+            # A file adds its messages when the minutes its counts span overlap the window, even without counts in it
+            expected = naiveChartLevel([(node, minuteCounts) for node, minuteCounts in files if overlaps(minuteCounts, startTime, endTime)], startTime, endTime, minutes)
+            self.assertEqual(level["series"], expected)
+
+    def testFilesOutsideTheWindowAddNoMessage(self):
+        cube = HistogramCube(["n1"], 100, 200)
+        cube.add("n1", MinuteCounts.fromDict({"a": {10: 1, 20: 2}}))
+        cube.add("n1", MinuteCounts.fromDict({"b": {150: 3}}))
+        self.assertEqual(cube.toChartLevel(60), {"start": 60, "step": 60, "series": {"b": [[1], [3]]}})
+
+    def testEmptyCube(self):
+        cube = HistogramCube(["n1"], 100, 200)
+        self.assertEqual(cube.toChartLevel(1)["series"], {})
+
+if __name__ == "__main__":
+    unittest.main()
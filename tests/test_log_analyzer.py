@@ -0,0 +1,51 @@
+import importlib.util
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+# The analyzer runs as a script, with the dependencies of requirements.txt
+MISSING_DEPENDENCIES = [module for module in ("colorama", "tabulate", "nbformat", "yaml") if importlib.util.find_spec(module) is None]
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "log_analyzer.py")
+
+def writeLogs(logs):
+    # A postgres log and a tserver log of 2023-05-21, with a message every 10 and every 60 minutes from 00:00 to 11:50
+    os.makedirs(logs, exist_ok=True)
+    with open(os.path.join(logs, "postgresql-2023-05-21_000000.log"), "w") as f:
+        for minute in range(0, 12 * 60, 10):
+            f.write("2023-05-21 {:02d}:{:02d}:00.000 UTC [1] LOG:  connection reset by peer\n".format(minute // 60, minute % 60))
+    with open(os.path.join(logs, "yb-tserver.host.yugabyte.log.INFO.20230521-000000.3601"), "w") as f:
+        for hour in range(12):
+            f.write("W0521 {:02d}:00:00.000000  3601 log_cache.cc:1] Soft memory limit exceeded (at 91% of capacity)\n".format(hour))
+
+@unittest.skipIf(MISSING_DEPENDENCIES, "the analyzer dependencies are not installed: {}".format(MISSING_DEPENDENCIES))
+class TestLogAnalyzer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def analyze(self, *arguments):
+        # The hourly counts of the bar chart of the report
+        process = subprocess.run([sys.executable, SCRIPT, "-o", "report.html", "-p", "2"] + list(arguments),
+                                 cwd=self.directory, capture_output=True, text=True)
+        self.assertEqual(process.returncode, 0, process.stdout + process.stderr)
+        with open(os.path.join(self.directory, "report.html")) as f:
+            return json.loads(re.search(r"var data =(\{.*\})\n", f.read()).group(1))
+
+    def testTimeWindowOverPostgresLogs(self):
+        # postgres lines carry their year, the "MMDD HH:MM" window is placed in it
+        writeLogs(os.path.join(self.directory, "logs", "n1", "tserver", "logs"))
+        counts = self.analyze("-d", "logs", "-t", "0521 01:00", "-T", "0521 08:00")
+        expectedHours = {"0521 {:02d}".format(hour): 6 for hour in range(1, 8)}
+        expectedHours["0521 08"] = 1
+        self.assertEqual(counts["connection reset by peer"], expectedHours)
+        self.assertEqual(counts["Soft memory limit exceeded"], {hour: 1 for hour in expectedHours})
+
+if __name__ == "__main__":
+    unittest.main()
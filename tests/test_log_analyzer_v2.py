@@ -0,0 +1,170 @@
+import datetime
+import gzip
+import importlib.util
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import unittest
+
+# The analyzer runs as a script, with the dependencies of requirements.txt
+MISSING_DEPENDENCIES = [module for module in ("colorama", "tabulate", "jinja2", "yaml", "numpy") if importlib.util.find_spec(module) is None]
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "log_analyzer_v2.py")
+BUNDLE_NAME = "yb-support-bundle-univ-20230521-logs"
+MESSAGES = [
+    ("W", "log_cache.cc", "Soft memory limit exceeded (at 91.2% of capacity)"),
+    ("W", "consensus_peers.cc", "UpdateConsensus request from peer dropped due to backpressure"),
+    ("W", "tablet.cc", "Stopping writes because we have 2 immutable memtables"),
+    ("E", "tcp_stream.cc", "Recv failed: Network error: recvmsg error: Connection reset by peer"),
+    ("I", "tablet.cc", "Flushing memtable"),
+    ("I", "heartbeater.cc", "Heartbeat sent"),
+]
+
+def writeGlog(path, process, start, numLines, rng, compress=False):
+    # A glog INFO file and the WARNING file with its warnings and errors
+    lines = ["Log file created at: {}".format(start.strftime("%Y/%m/%d %H:%M:%S")), "Running on machine: host",
+             "Application fingerprint: version 2.18.0.1 build 1", "Log line format: [IWEF]mmdd hh:mm:ss.uuuuuu threadid file:line] msg"]
+    warnings = list(lines)
+    timestamp = start
+    for _ in range(numLines):
+        timestamp += datetime.timedelta(seconds=rng.randrange(1, 30))
+        severity, source, message = rng.choice(MESSAGES)
+        line = "{}{}.{:06d}  3601 {}:{}] {}".format(severity, timestamp.strftime("%m%d %H:%M:%S"), rng.randrange(10**6), source, rng.randrange(1000), message)
+        lines.append(line)
+        if severity != "I":
+            warnings.append(line)
+    for logFile, logLines in ((path.format(process=process, severity="INFO"), lines), (path.format(process=process, severity="WARNING"), warnings)):
+        os.makedirs(os.path.dirname(logFile), exist_ok=True)
+        content = ("\n".join(logLines) + "\n").encode()
+        if compress:
+            with gzip.open(logFile + ".gz", "wb") as f:
+                f.write(content)
+        else:
+            with open(logFile, "wb") as f:
+                f.write(content)
+
+def makeBundle(root, bundleName=BUNDLE_NAME, rotated=datetime.datetime(2023, 5, 20, 22, 0)):
+    """
+    Writes a small support bundle directory under root: two nodes with rotated (gzipped) and current master and
+    tserver logs, the rotated ones starting at rotated and the current ones 8 hours later. Returns its path.
+    """
+    rng = random.Random(7)
+    bundle = os.path.join(root, bundleName)
+    current = rotated + datetime.timedelta(hours=8)
+    for node in (1, 2):
+        for process in ("master", "tserver"):
+            logs = os.path.join(bundle, "yb-prod-univ-n{}".format(node), process, "logs")
+            path = os.path.join(logs, "yb-{process}.host%d.yugabyte.log.{severity}.%s.3601" % (node, rotated.strftime("%Y%m%d-%H%M%S")))
+            writeGlog(path, process, rotated, 1000, rng, compress=True)
+            path = os.path.join(logs, "yb-{process}.host%d.yugabyte.log.{severity}.%s.3601" % (node, current.strftime("%Y%m%d-%H%M%S")))
+            writeGlog(path, process, current, 1000, rng)
+    return bundle
+
+def getMessageCounts(directory):
+    # {node: {message: [count, first occurrence, last occurrence]}} from the hagen_ai.json of a run
+    with open(os.path.join(directory, "hagen_ai.json")) as f:
+        nodeDetails = json.load(f)["nodeDetails"]
+    return {node: {message: [details["count"], details["first_occurrence"], details["last_occurrence"]]
+                   for message, details in messages.items() if isinstance(details, dict) and "count" in details}
+            for node, messages in nodeDetails.items()}
+
+@unittest.skipIf(MISSING_DEPENDENCIES, "the analyzer dependencies are not installed: {}".format(MISSING_DEPENDENCIES))
+class TestLogAnalyzer(unittest.TestCase):
+    """
+    Runs the analyzer on a generated support bundle and checks that its shortcuts (the result cache, --render,
+    the in place analysis of the bundle archive) give the same results as a fresh run.
+    """
+    window = ["-t", "0520 22:00", "-T", "0521 12:00"]
+    narrowWindow = ["-t", "0521 01:00", "-T", "0521 08:00"]
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def analyze(self, runDirectory, *arguments):
+        os.makedirs(runDirectory, exist_ok=True)
+        process = subprocess.run([sys.executable, SCRIPT, "-o", "report.html", "-p", "2"] + list(arguments),
+                                 cwd=runDirectory, capture_output=True, text=True)
+        self.assertEqual(process.returncode, 0, process.stdout + process.stderr)
+        return getMessageCounts(runDirectory), process.stderr
+
+    def testCachedRunMatchesFreshRun(self):
+        bundle = makeBundle(self.directory)
+        fresh, log = self.analyze(self.directory, "-d", bundle, *self.window)
+        self.assertTrue(fresh)
+        self.assertIn("Results of 0 of", log)
+        cached, log = self.analyze(self.directory, "-d", bundle, *self.window)
+        self.assertEqual(cached, fresh)
+        self.assertRegex(log, r"Results of (\d+) of \1 log files are cached")
+        # A narrower window is served from the cache of the wider one
+        narrowCached, log = self.analyze(self.directory, "-d", bundle, *self.narrowWindow)
+        self.assertRegex(log, r"Results of (\d+) of \1 log files are cached")
+        shutil.rmtree(os.path.join(bundle, ".log_analyzer_cache"))
+        narrowFresh, log = self.analyze(self.directory, "-d", bundle, *self.narrowWindow)
+        self.assertEqual(narrowCached, narrowFresh)
+        self.assertNotEqual(narrowFresh, fresh)
+
+    def testRenderMatchesFreshRun(self):
+        bundle = makeBundle(self.directory)
+        fresh, log = self.analyze(self.directory, "-d", bundle, *self.window)
+        rendered, log = self.analyze(os.path.join(self.directory, "render"), "--render", os.path.join(self.directory, "report.results.json.gz"), *self.window)
+        self.assertEqual(rendered, fresh)
+        narrowRendered, log = self.analyze(os.path.join(self.directory, "render"), "--render", os.path.join(self.directory, "report.results.json.gz"), *self.narrowWindow)
+        shutil.rmtree(os.path.join(bundle, ".log_analyzer_cache"))
+        narrowFresh, log = self.analyze(self.directory, "-d", bundle, *self.narrowWindow)
+        self.assertEqual(narrowRendered, narrowFresh)
+
+    def testBundleArchiveMatchesDirectory(self):
+        bundle = makeBundle(os.path.join(self.directory, "source"))
+        expected, log = self.analyze(os.path.join(self.directory, "source"), "-d", bundle, *self.window)
+        shutil.rmtree(os.path.join(bundle, ".log_analyzer_cache"))
+        with tarfile.open(os.path.join(self.directory, BUNDLE_NAME + ".tar.gz"), "w:gz") as tar:
+            tar.add(bundle, arcname=BUNDLE_NAME)
+        extracted, log = self.analyze(self.directory, "-s", BUNDLE_NAME + ".tar.gz", *self.window)
+        self.assertEqual(extracted, expected)
+        inPlace, log = self.analyze(os.path.join(self.directory, "in_place"), "-s", os.path.join(self.directory, BUNDLE_NAME + ".tar.gz"), "--in_place", *self.window)
+        self.assertEqual(inPlace, expected)
+        # Bundles collected by YugabyteDB Anywhere hold an archive per node
+        nested = os.path.join(self.directory, "nested")
+        os.makedirs(nested)
+        with tarfile.open(os.path.join(nested, BUNDLE_NAME + ".tar.gz"), "w:gz") as tar:
+            for node in sorted(os.listdir(bundle)):
+                nodeArchive = os.path.join(self.directory, node + ".tar.gz")
+                with tarfile.open(nodeArchive, "w:gz") as nodeTar:
+                    nodeTar.add(os.path.join(bundle, node), arcname=node)
+                tar.add(nodeArchive, arcname=os.path.join(BUNDLE_NAME, node + ".tar.gz"))
+        inPlace, log = self.analyze(nested, "-s", BUNDLE_NAME + ".tar.gz", "--in_place", *self.window)
+        self.assertEqual(inPlace, expected)
+        self.assertEqual(os.listdir(os.path.join(nested, ".log_analyzer_cache", BUNDLE_NAME + ".tar.gz.spool")), [])
+
+    def testWindowOverTheNewYear(self):
+        # Logs from 2023-12-31 20:00 to 2024-01-01 about 08:00, the window has no year
+        bundleName = "yb-support-bundle-univ-20240101-logs"
+        bundle = makeBundle(os.path.join(self.directory, "source"), bundleName, datetime.datetime(2023, 12, 31, 20, 0))
+        # Without --to_time the window ends at the latest log entry, in the next year
+        untilTheEnd, log = self.analyze(self.directory, "-d", bundle, "-t", "1231 22:00")
+        toTheEnd, log = self.analyze(self.directory, "-d", bundle, "-t", "1231 22:00", "-T", "0101 23:59")
+        self.assertEqual(untilTheEnd, toTheEnd)
+        for messages in untilTheEnd.values():
+            for count, firstOccurrence, lastOccurrence in messages.values():
+                self.assertTrue(firstOccurrence.startswith("1231 2"), firstOccurrence)
+                self.assertTrue(lastOccurrence.startswith("0101 0"), lastOccurrence)
+        shutil.rmtree(os.path.join(bundle, ".log_analyzer_cache"))
+        window = ["-t", "1231 22:00", "-T", "0101 02:00"]
+        expected, log = self.analyze(self.directory, "-d", bundle, *window)
+        self.assertTrue(any(lastOccurrence.startswith("0101 0") for messages in expected.values() for count, firstOccurrence, lastOccurrence in messages.values()))
+        self.assertNotEqual(expected, untilTheEnd)
+        # The files selected for extraction are placed in the year of the bundle name
+        with tarfile.open(os.path.join(self.directory, bundleName + ".tar.gz"), "w:gz") as tar:
+            tar.add(bundle, arcname=bundleName)
+        extracted, log = self.analyze(os.path.join(self.directory, "extracted"), "-s", os.path.join(self.directory, bundleName + ".tar.gz"), *window)
+        self.assertEqual(extracted, expected)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,206 @@
+import datetime
+import functools
+import gzip
+import os
+import random
+import re
+import tempfile
+import unittest
+from unittest import mock
+
+import log_lib
+from analyzer_lib import PatternSet
+from log_lib import (
+    LogTimeParser,
+    toLogMinute,
+    getLogType,
+    getLogSubtype,
+    readLogBlocks,
+    scanLogFile,
+    findStartOffset,
+    getLineRanges,
+    routePatternsBySeverity,
+    readLastGzipMember,
+    readLogTail,
+)
+
+PATTERNS = {
+    "soft_memory_limit": "Soft memory limit exceeded",
+    "backpressure": "UpdateConsensus request.*dropped due to backpressure",
+    "leader": "Unable to pick leader|Leader not ready",
+}
+MESSAGES = [
+    "Soft memory limit exceeded (at 91.2% of capacity)",
+    "UpdateConsensus request from peer dropped due to backpressure",
+    "Unable to pick leader for tablet",
+    "leader NOT ready to serve requests",
+    "Flushing memtable",
+    "Heartbeat sent",
+]
+# Small enough that the test logs span many blocks and the time search many steps
+BLOCK_SIZE = 997
+
+def makeGlogLines(start, numLines, seed=7):
+    """
+    Returns glog lines (bytes, with their newline) one to a few seconds apart from start, some followed by untimed
+    continuation lines such as a stack trace.
+    """
+    rng = random.Random(seed)
+    lines = []
+    timestamp = start
+    for _ in range(numLines):
+        timestamp += datetime.timedelta(seconds=rng.randrange(1, 4))
+        lines.append("{}{} {}.{:06d}  3601 tablet.cc:{}] {}\n".format(
+            rng.choice("IWE"), timestamp.strftime("%m%d %H:%M:%S"), 0, rng.randrange(10**6), rng.randrange(1000), rng.choice(MESSAGES)).encode())
+        if rng.random() < 0.05:
+            lines.append(b"    @ 0x7f00 yb::tablet::Tablet::Flush (dropped due to backpressure)\n")
+    return lines
+
+def naiveScan(lines, patterns, getTime, startTime=None, endTime=None):
+    # Line by line reference of scanLogFile: the matching lines with the timestamp of their closest timed line
+    results = []
+    previousTime = None
+    for line in lines:
+        lineTime = getTime(line)
+        previousTime = lineTime if lineTime is not None else previousTime
+        ids = [i for i, pattern in enumerate(patterns.values()) if re.search(pattern.encode(), line, re.IGNORECASE)]
+        if ids and (startTime is None or previousTime >= startTime) and (endTime is None or previousTime <= endTime):
+            results.append((ids, previousTime))
+    return results
+
+def scan(logFile, patternSet, getTime, startTime=None, **kwargs):
+    return [(ids, time) for ids, time in scanLogFile(logFile, patternSet, getTime, **kwargs) if startTime is None or time >= startTime]
+
+class TestLogTimeParser(unittest.TestCase):
+    def testGlogLinesRunIntoTheNextYear(self):
+        getTime = LogTimeParser(2023, 12)
+        self.assertEqual(getTime(b"I1231 23:59:59.000000  3601 tablet.cc:10] a"), toLogMinute(datetime.datetime(2023, 12, 31, 23, 59)))
+        self.assertEqual(getTime(b"W0101 00:05:00.000000  3601 tablet.cc:10] b"), toLogMinute(datetime.datetime(2024, 1, 1, 0, 5)))
+
+    def testPostgresLinesKeepTheirYear(self):
+        getTime = LogTimeParser(2023, 12)
+        self.assertEqual(getTime(b"2023-12-31 23:59:59.000 UTC [1] LOG:  a"), toLogMinute(datetime.datetime(2023, 12, 31, 23, 59)))
+        self.assertEqual(getTime(b"2024-01-01 00:05:00.000 UTC [1] LOG:  b"), toLogMinute(datetime.datetime(2024, 1, 1, 0, 5)))
+
+    def testLinesWithoutTimestamp(self):
+        getTime = LogTimeParser(2023)
+        self.assertIsNone(getTime(b"    at continuation line"))
+        self.assertIsNone(getTime(b""))
+
+class TestLogType(unittest.TestCase):
+    def testTypeComesFromTheFileName(self):
+        node = "/data/postgres-case/yb-support-bundle-univ-20230521-logs/yb-prod-univ-n1/"
+        self.assertEqual(getLogType(node + "tserver/logs/yb-tserver.host.yugabyte.log.INFO.20230521-030902.3601"), "yb-tserver")
+        self.assertEqual(getLogType(node + "master/logs/yb-master.host.yugabyte.log.WARNING.20230521-030902.3601.gz"), "yb-master")
+        self.assertEqual(getLogType(node + "tserver/logs/postgresql-2023-05-21_000000.log"), "postgres")
+        self.assertEqual(getLogSubtype(node + "tserver/logs/yb-tserver.host.yugabyte.log.WARNING.20230521-030902.3601"), "WARNING")
+
+class TestRoutePatternsBySeverity(unittest.TestCase):
+    severities = {"info": "I", "warning": "W", "error": "E"}
+
+    def route(self, files, window=None):
+        # files: {log file: (subtype, start hour, end hour)} of one tserver
+        metadata = {logFile: {"nodeName": "n1", "logType": "yb-tserver", "subtype": subtype, "logStartsAt": start * 3600, "logEndsAt": end * 3600}
+                    for logFile, (subtype, start, end) in files.items()}
+        return routePatternsBySeverity(list(files), metadata, self.severities, window)
+
+    def testWarningFilesCoverTheInfoFiles(self):
+        routes = self.route({"INFO.1": ("INFO", 0, 10), "WARNING.1": ("WARNING", 0, 10), "ERROR.1": ("ERROR", 0, 10)})
+        self.assertEqual(routes, {"INFO.1": ["info"], "WARNING.1": ["warning"], "ERROR.1": ["error"]})
+
+    def testFallBackOverTheUncoveredTimeRanges(self):
+        # The WARNING files of the first process were rotated away, the second one has them
+        files = {"INFO.1": ("INFO", 0, 10), "INFO.2": ("INFO", 12, 20), "WARNING.2": ("WARNING", 12, 20)}
+        routes = self.route(files)
+        self.assertEqual(routes, {"INFO.1": ["info", "warning", "error"], "INFO.2": ["info"], "WARNING.2": ["warning", "error"]})
+        # A WARNING file that covers part of the INFO file does not, it is left out to not count its lines twice
+        files["WARNING.1"] = ("WARNING", 5, 10)
+        self.assertEqual(self.route(files)["INFO.1"], ["info", "warning", "error"])
+        self.assertEqual(self.route(files)["WARNING.1"], [])
+        # Only the part inside the analysis window has to be covered
+        window = (datetime.datetime(1970, 1, 1, 6), datetime.datetime(1970, 1, 1, 20))
+        self.assertEqual(self.route(files, window)["INFO.1"], ["info"])
+        self.assertEqual(self.route(files, window)["WARNING.1"], ["warning", "error"])
+
+@mock.patch("log_lib.readLogBlocks", functools.partial(readLogBlocks, blockSize=BLOCK_SIZE))
+class TestScanLogFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.lines = makeGlogLines(datetime.datetime(2023, 5, 20, 22, 0), 6000)
+        self.content = b"".join(self.lines)
+        self.plainFile = os.path.join(self.directory.name, "yb-tserver.host.yugabyte.log.INFO.20230520-220000.3601")
+        with open(self.plainFile, "wb") as f:
+            f.write(self.content)
+        self.gzFile = self.plainFile + ".gz"
+        with gzip.open(self.gzFile, "wb") as f:
+            f.write(self.content)
+        self.patternSet = PatternSet(PATTERNS, binary=True)
+        self.getTime = LogTimeParser(2023, 5)
+        self.times = [time for time in map(self.getTime, self.lines) if time is not None]
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testBlocksAreWholeLines(self):
+        for logFile in (self.plainFile, self.gzFile):
+            blocks = list(log_lib.readLogBlocks(logFile))
+            self.assertGreater(len(blocks), 10)
+            self.assertEqual(b"".join(blocks), self.content)
+            self.assertTrue(all(block.endswith(b"\n") for block in blocks))
+            lineStart = len(b"".join(self.lines[:100]))
+            lineEnd = len(b"".join(self.lines[:200]))
+            self.assertEqual(b"".join(log_lib.readLogBlocks(logFile, startOffset=lineStart, endOffset=lineEnd)), b"".join(self.lines[100:200]))
+
+    def testScanMatchesLineByLine(self):
+        expected = naiveScan(self.lines, PATTERNS, self.getTime)
+        self.assertGreater(len(expected), 100)
+        for logFile in (self.plainFile, self.gzFile):
+            self.assertEqual(scan(logFile, self.patternSet, self.getTime), expected)
+            with open(logFile, "rb") as f, (gzip.open(f) if logFile.endswith(".gz") else open(logFile, "rb")) as logs:
+                self.assertEqual(scan(logs, self.patternSet, self.getTime), expected)
+
+    def testSeekMatchesLineByLine(self):
+        # gzipped files seek through the checkpoints recorded by an earlier scan
+        checkpoints = {}
+        scan(self.gzFile, self.patternSet, self.getTime, checkpoints=checkpoints)
+        self.assertTrue(checkpoints)
+        for startTime in (self.times[0] - 5, self.times[0], self.times[len(self.times) // 3], self.times[-1], self.times[-1] + 5):
+            expected = naiveScan(self.lines, PATTERNS, self.getTime, startTime=startTime)
+            for logFile in (self.plainFile, self.gzFile):
+                startOffset = findStartOffset(logFile, startTime, self.getTime, checkpoints)
+                self.assertTrue(startOffset == 0 or self.content[startOffset - 1:startOffset] == b"\n")
+                self.assertEqual(scan(logFile, self.patternSet, self.getTime, startTime, startOffset=startOffset), expected, (logFile, startTime))
+        # The plain file search does skip most of the file
+        self.assertGreater(findStartOffset(self.plainFile, self.times[-1], self.getTime), len(self.content) // 2)
+
+    def testEndTimeMatchesLineByLine(self):
+        endTime = self.times[len(self.times) // 2]
+        expected = naiveScan(self.lines, PATTERNS, self.getTime, endTime=endTime)
+        self.assertEqual([result for result in scan(self.plainFile, self.patternSet, self.getTime, endTime=endTime) if result[1] <= endTime], expected)
+
+    def testTailOfTheLastGzipMember(self):
+        # A stored member whose content holds a gzip header, to check that the member search skips it
+        half = len(self.lines) // 2
+        first, last = b"".join(self.lines[:half]), b"".join(self.lines[half:]) + b"\x1f\x8b\x08\x00 in a line\n"
+        multiMemberFile = os.path.join(self.directory.name, "multi.log.gz")
+        with open(multiMemberFile, "wb") as f:
+            f.write(gzip.compress(first) + gzip.compress(last, compresslevel=0))
+        self.assertTrue(last.endswith(readLastGzipMember(multiMemberFile, BLOCK_SIZE)))
+        self.assertIsNone(readLastGzipMember(self.gzFile))
+        for logFile, content in ((multiMemberFile, first + last), (self.gzFile, self.content)):
+            with gzip.open(logFile, "rb") as logs:
+                self.assertEqual(readLogTail(logFile, logs, gzipFile=logFile), content.splitlines()[-10:])
+
+    def testRangesMatchTheWholeFile(self):
+        ranges = getLineRanges(self.plainFile, 64 * 1024, self.getTime)
+        self.assertGreater(len(ranges), 2)
+        self.assertEqual([start for start, end in ranges[1:]], [end for start, end in ranges[:-1]])
+        self.assertEqual((ranges[0][0], ranges[-1][1]), (0, len(self.content)))
+        for start, end in ranges[1:]:
+            # Every range starts on a timed line, a continuation line stays with its message
+            self.assertIsNotNone(self.getTime(self.content[start:start + 32]))
+        results = [result for start, end in ranges for result in scan(self.plainFile, self.patternSet, self.getTime, startOffset=start, endOffset=end)]
+        self.assertEqual(results, naiveScan(self.lines, PATTERNS, self.getTime))
+
+if __name__ == "__main__":
+    unittest.main()